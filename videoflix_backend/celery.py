@@ -1,5 +1,8 @@
 import os
+import click
+from click.core import ParameterSource
 from celery import Celery
+from celery.signals import worker_init
 
 from videoflix_backend.settings import INSTALLED_APPS
 
@@ -18,3 +21,51 @@ app.autodiscover_tasks(lambda: INSTALLED_APPS)
 def debug_task(self):
     print(f'Request: {self.request!r}')
 
+
+# The entries of a queue profile, named like the "celery worker" command
+# line options and the worker attributes they set.
+QUEUE_PROFILE_OPTIONS = ('concurrency', 'prefetch_multiplier')
+
+
+def get_command_line_options():
+    """
+    Returns the names of the "celery worker" options given on the command line.
+
+    The command line fills options that were not given with the values of
+    the configuration, so only click can tell them apart. Returns an empty
+    set for workers started without the command line.
+    """
+    context = click.get_current_context(silent=True)
+    if context is None:
+        return set()
+    return {
+        name for name in QUEUE_PROFILE_OPTIONS
+        if context.get_parameter_source(name) not in (None, ParameterSource.DEFAULT)
+    }
+
+
+@worker_init.connect
+def configure_worker_for_queues(sender=None, **kwargs):
+    """
+    Applies the concurrency and prefetch profile of the queue a worker consumes.
+
+    A worker started with "-Q transcode" gets the "transcode" entry of
+    CELERY_WORKER_QUEUE_PROFILES, unless --concurrency or
+    --prefetch-multiplier are given on the command line. Workers consuming
+    several or unknown queues keep Celery's defaults.
+
+    The profile is set on the worker itself once it has resolved its
+    options and before its pool and consumer are created from them;
+    changing the configuration at this point would be ignored, as the
+    command line always passes both options.
+    """
+    queues = list(sender.app.amqp.queues.consume_from)
+    if len(queues) != 1:
+        return
+    profile = (sender.app.conf.worker_queue_profiles or {}).get(queues[0])
+    if profile is None:
+        return
+    command_line_options = get_command_line_options()
+    for name in QUEUE_PROFILE_OPTIONS:
+        if name not in command_line_options:
+            setattr(sender, name, profile[name])
@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from celery.schedules import crontab
+from kombu import Queue
 
 
 load_dotenv()
@@ -53,11 +54,149 @@ INSTALLED_APPS = [
 ]
 
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+
+# Transcode tasks are acknowledged late (see videos.tasks), so they stay
+# unacknowledged in Redis for the whole encode. Redis hands an
+# unacknowledged task to another worker once its visibility timeout has
+# passed, so CELERY_VISIBILITY_TIMEOUT must be longer than the longest
+# expected transcode, or a long video is encoded by two workers at once.
+# Tasks of a killed worker are requeued at once regardless.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', 24 * 60 * 60)),
+}
+
+# Long CPU-bound transcodes, latency-sensitive short tasks and periodic
+# maintenance run on separate queues, so a burst of uploads cannot delay the
+# short tasks. Start one worker per queue, e.g.
+#   celery -A videoflix_backend worker -Q transcode
+# and the worker picks up the concurrency and prefetch of its queue from
+# CELERY_WORKER_QUEUE_PROFILES (see videoflix_backend/celery.py).
+CELERY_TASK_DEFAULT_QUEUE = 'short'
+CELERY_TASK_QUEUES = (
+    Queue('transcode'),
+    Queue('short'),
+    Queue('maintenance'),
+)
+CELERY_TASK_ROUTES = {
+    'videos.tasks.convert_video_task': {'queue': 'transcode'},
+    'videos.tasks.transcode_rendition_task': {'queue': 'transcode'},
+    'videos.tasks.transcode_segment_task': {'queue': 'transcode'},
+    'videos.tasks.generate_thumbnail_task': {'queue': 'transcode'},
+    'videos.tasks.finalize_conversion_task': {'queue': 'transcode'},
+    'videos.tasks.concat_segments_task': {'queue': 'transcode'},
+    'users.tasks.cleanup_inactive_users': {'queue': 'maintenance'},
+}
+CELERY_WORKER_QUEUE_PROFILES = {
+    'transcode': {
+        'concurrency': int(os.environ.get('CELERY_TRANSCODE_CONCURRENCY', 1)),
+        'prefetch_multiplier': 1,
+    },
+    'short': {
+        'concurrency': int(os.environ.get('CELERY_SHORT_CONCURRENCY', 8)),
+        'prefetch_multiplier': 4,
+    },
+    'maintenance': {
+        'concurrency': int(os.environ.get('CELERY_MAINTENANCE_CONCURRENCY', 1)),
+        'prefetch_multiplier': 1,
+    },
+}
+
+# "single_decode" decodes each upload once and writes every rendition from one
+# FFmpeg process, "sequential" runs one FFmpeg process per rendition and
+# "parallel" fans the renditions out as a Celery chord across all workers
+# (requires CELERY_RESULT_BACKEND). "segmented" also splits every upload into
+# chunks of VIDEO_SEGMENT_DURATION seconds that are transcoded in parallel.
+VIDEO_TRANSCODE_STRATEGY = os.environ.get('VIDEO_TRANSCODE_STRATEGY', 'single_decode')
+VIDEO_SEGMENT_DURATION = int(os.environ.get('VIDEO_SEGMENT_DURATION', 60))
+
+# Every conversion is also packaged as HLS with fMP4 segments of
+# VIDEO_HLS_SEGMENT_DURATION seconds, served with VIDEO_HLS_CACHE_MAX_AGE.
+VIDEO_HLS_ENABLED = os.environ.get('VIDEO_HLS_ENABLED', 'True') == 'True'
+VIDEO_HLS_SEGMENT_DURATION = int(os.environ.get('VIDEO_HLS_SEGMENT_DURATION', 6))
+VIDEO_HLS_CACHE_MAX_AGE = int(os.environ.get('VIDEO_HLS_CACHE_MAX_AGE', 31536000))
+
+# Hand video files to the server's wsgi.file_wrapper so it can send them with
+# sendfile instead of copying them through a Python generator. Requires a
+# server that honours Content-Length with its file wrapper, e.g. gunicorn.
+VIDEO_STREAM_FILE_WRAPPER = os.environ.get('VIDEO_STREAM_FILE_WRAPPER', 'True') == 'True'
+
+# Stream and thumbnail requests must carry a signed URL issued by
+# /api/videos/media-urls/<pk>/, valid for VIDEO_SIGNED_URL_TTL seconds.
+VIDEO_STREAM_SIGNATURE_REQUIRED = os.environ.get('VIDEO_STREAM_SIGNATURE_REQUIRED', 'True') == 'True'
+VIDEO_SIGNED_URL_TTL = int(os.environ.get('VIDEO_SIGNED_URL_TTL', 4 * 60 * 60))
+
+# Every web process keeps the resolved path, size, mtime and ETag of up to
+# VIDEO_STREAM_CACHE_MAX_ENTRIES renditions for VIDEO_STREAM_CACHE_TTL seconds.
+VIDEO_STREAM_CACHE_MAX_ENTRIES = int(os.environ.get('VIDEO_STREAM_CACHE_MAX_ENTRIES', 10000))
+VIDEO_STREAM_CACHE_TTL = int(os.environ.get('VIDEO_STREAM_CACHE_TTL', 60))
+
+# Keep the first VIDEO_HEAD_CACHE_HEAD_BYTES of every rendition and its moov
+# atom (up to VIDEO_HEAD_CACHE_MAX_MOOV_BYTES) in memory, at most
+# VIDEO_HEAD_CACHE_MAX_BYTES per process, so playback starts without disk
+# reads. Ranges that run past the cached bytes continue from disk through a
+# Python generator instead of sendfile.
+VIDEO_HEAD_CACHE_ENABLED = os.environ.get('VIDEO_HEAD_CACHE_ENABLED', 'False') == 'True'
+VIDEO_HEAD_CACHE_MAX_BYTES = int(os.environ.get('VIDEO_HEAD_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+VIDEO_HEAD_CACHE_HEAD_BYTES = int(os.environ.get('VIDEO_HEAD_CACHE_HEAD_BYTES', 1024 * 1024))
+VIDEO_HEAD_CACHE_MAX_MOOV_BYTES = int(os.environ.get('VIDEO_HEAD_CACHE_MAX_MOOV_BYTES', 4 * 1024 * 1024))
+
+# Serve the stream and thumbnail endpoints with asynchronous views. Only
+# enable this when running under ASGI (e.g. uvicorn videoflix_backend.asgi:application);
+# under WSGI Django would have to buffer the asynchronous bodies.
+VIDEO_ASYNC_STREAMING = os.environ.get('VIDEO_ASYNC_STREAMING', 'False') == 'True'
+# Number of threads that run the file reads of the asynchronous views. The
+# pool is shared by all requests; reads beyond it wait in its queue.
+VIDEO_ASYNC_IO_THREADS = int(os.environ.get('VIDEO_ASYNC_IO_THREADS', 8))
+
+# Thumbnails can be requested resized to one of VIDEO_THUMBNAIL_WIDTHS
+# pixels and as WebP or AVIF; the variants are cached on disk next to the
+# thumbnail. Versioned thumbnail URLs are cached by browsers for at most
+# VIDEO_THUMBNAIL_CACHE_MAX_AGE seconds.
+VIDEO_THUMBNAIL_WIDTHS = [int(width) for width in os.environ.get('VIDEO_THUMBNAIL_WIDTHS', '160,240,320').split(',')]
+VIDEO_THUMBNAIL_CACHE_MAX_AGE = int(os.environ.get('VIDEO_THUMBNAIL_CACHE_MAX_AGE', 31536000))
+
+# Let the reverse proxy send video, HLS, trickplay and thumbnail files:
+# "x-accel-redirect" (nginx, with an internal location that maps
+# VIDEO_OFFLOAD_INTERNAL_PREFIX to MEDIA_ROOT) or "x-sendfile" (Apache with
+# mod_xsendfile, lighttpd). Empty serves the files from Django.
+VIDEO_OFFLOAD_MODE = os.environ.get('VIDEO_OFFLOAD_MODE', '')
+VIDEO_OFFLOAD_INTERNAL_PREFIX = os.environ.get('VIDEO_OFFLOAD_INTERNAL_PREFIX', '/protected-media/')
+
+# Trickplay previews for the player timeline: one tile of
+# VIDEO_TRICKPLAY_TILE_WIDTH pixels every VIDEO_TRICKPLAY_INTERVAL seconds,
+# laid out in sprite sheets of VIDEO_TRICKPLAY_COLUMNS x VIDEO_TRICKPLAY_ROWS
+# tiles, saved as "jpg" or "webp" and indexed by a WebVTT file.
+VIDEO_TRICKPLAY_ENABLED = os.environ.get('VIDEO_TRICKPLAY_ENABLED', 'True') == 'True'
+VIDEO_TRICKPLAY_INTERVAL = int(os.environ.get('VIDEO_TRICKPLAY_INTERVAL', 10))
+VIDEO_TRICKPLAY_TILE_WIDTH = int(os.environ.get('VIDEO_TRICKPLAY_TILE_WIDTH', 160))
+VIDEO_TRICKPLAY_COLUMNS = int(os.environ.get('VIDEO_TRICKPLAY_COLUMNS', 10))
+VIDEO_TRICKPLAY_ROWS = int(os.environ.get('VIDEO_TRICKPLAY_ROWS', 10))
+VIDEO_TRICKPLAY_FORMAT = os.environ.get('VIDEO_TRICKPLAY_FORMAT', 'jpg')
 
 
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Page size of the cursor-paginated catalog; clients may ask for up to
+# VIDEO_CATALOG_MAX_PAGE_SIZE videos with the page_size query parameter.
+VIDEO_CATALOG_PAGE_SIZE = int(os.environ.get('VIDEO_CATALOG_PAGE_SIZE', 24))
+VIDEO_CATALOG_MAX_PAGE_SIZE = int(os.environ.get('VIDEO_CATALOG_MAX_PAGE_SIZE', 100))
+# Page size of the search results.
+VIDEO_SEARCH_PAGE_SIZE = int(os.environ.get('VIDEO_SEARCH_PAGE_SIZE', 20))
+# Title suggestions: default and maximum number per request, and the number
+# of seconds after which each process rebuilds its prefix index to pick up
+# changes made by other processes.
+VIDEO_SUGGEST_LIMIT = int(os.environ.get('VIDEO_SUGGEST_LIMIT', 10))
+VIDEO_SUGGEST_MAX_LIMIT = int(os.environ.get('VIDEO_SUGGEST_MAX_LIMIT', 25))
+VIDEO_SUGGEST_INDEX_TTL = int(os.environ.get('VIDEO_SUGGEST_INDEX_TTL', 300))
+# Number of videos per genre row of the home screen, adjustable per request
+# with the limit query parameter up to VIDEO_GENRE_ROW_MAX_SIZE.
+VIDEO_GENRE_ROW_SIZE = int(os.environ.get('VIDEO_GENRE_ROW_SIZE', 10))
+VIDEO_GENRE_ROW_MAX_SIZE = int(os.environ.get('VIDEO_GENRE_ROW_MAX_SIZE', 50))
+# Serialized catalog pages and genre rows are cached per catalog version for this many seconds.
+VIDEO_CATALOG_CACHE_TIMEOUT = int(os.environ.get('VIDEO_CATALOG_CACHE_TIMEOUT', 60 * 60 * 24))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication', 
@@ -119,6 +258,17 @@ DATABASES = {
     }
 }
 
+# Shared cache for data written by Celery workers and read by the API, such
+# as transcoding progress. Uses Redis if CACHE_URL is set, otherwise an
+# in-process memory cache (sufficient for development and tests).
+CACHE_URL = os.environ.get('CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if CACHE_URL else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_URL or 'videoflix',
+    }
+}
+
 MEDIA_URL = '/media/' 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
 
@@ -1,4 +1,36 @@
 from django.contrib import admin
-from .models import Video
+from django.db.models import Count
+from .models import Genre, Video, RenditionJob
 
-admin.site.register(Video)
\ No newline at end of file
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    """
+    Admin of the genres, listing the number of videos in each.
+    """
+    list_display = ['name', 'video_count']
+    search_fields = ['name']
+
+    def get_queryset(self, request):
+        """
+        Annotates the genres with their video counts in one query.
+        """
+        return super().get_queryset(request).annotate(video_count=Count('videos'))
+
+    @admin.display(ordering='video_count', description='Videos')
+    def video_count(self, genre):
+        return genre.video_count
+
+
+@admin.register(Video)
+class VideoAdmin(admin.ModelAdmin):
+    """
+    Admin of the videos, filterable by genre.
+    """
+    list_display = ['title', 'genre', 'upload_date']
+    list_filter = ['genre']
+    list_select_related = ['genre']
+    search_fields = ['title']
+
+
+admin.site.register(RenditionJob)
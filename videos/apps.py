@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videos'
+
+    def ready(self):
+        """
+        Connects the signal receivers of the app and checks the media offload setting.
+        """
+        from . import signals  # noqa: F401
+        from .streaming import validate_offload_mode
+        validate_offload_mode()
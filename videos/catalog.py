@@ -0,0 +1,112 @@
+from itertools import groupby
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from .models import Genre, Video
+
+# Newest first, with the id breaking ties like the catalog pagination.
+NEWEST_FIRST = [F('upload_date').desc(), F('id').desc()]
+
+# The columns each field of the video representation is read from. The id
+# is always loaded as the primary key.
+VIDEO_FIELD_COLUMNS = {
+    'id': [],
+    'title': ['title'],
+    'description': ['description'],
+    'video_file': ['video_file'],
+    'thumbnail': ['thumbnail'],
+    'resolutions': ['resolutions'],
+    'hls_url': ['hls_playlist'],
+    'trickplay_url': ['trickplay_index'],
+    'upload_date': ['upload_date'],
+    'genre': ['genre__name'],
+    'duration': ['duration'],
+}
+# The fields of a catalog item unless others are requested.
+VIDEO_LIST_FIELDS = ['id', 'title', 'thumbnail', 'genre']
+
+
+def parse_video_fields(value):
+    """
+    Returns the fields requested with a "fields" query parameter.
+
+    Args:
+        value (str or None): Comma-separated field names, or None for the default list fields.
+
+    Returns:
+        list: The field names.
+
+    Raises:
+        ValueError: If no or an unknown field is named.
+    """
+    if value is None:
+        return VIDEO_LIST_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in VIDEO_FIELD_COLUMNS]
+    if not fields or unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown) or '(none)'}. Available: {', '.join(VIDEO_FIELD_COLUMNS)}.")
+    return fields
+
+
+def select_video_fields(queryset, fields, ordering=()):
+    """
+    Restricts a video queryset to the columns the given fields are read from.
+
+    All other columns, like the description and the resolutions, are
+    deferred and never loaded. The genre is joined only if it is requested.
+
+    Args:
+        queryset (QuerySet): The videos.
+        fields (list): The field names, keys of VIDEO_FIELD_COLUMNS.
+        ordering (iterable, optional): Order expressions like "-upload_date"
+            whose columns must be loaded too, e.g. for cursor pagination.
+
+    Returns:
+        QuerySet: The restricted queryset.
+    """
+    columns = {column for field in fields for column in VIDEO_FIELD_COLUMNS[field]}
+    columns.update(field.lstrip('-') for field in ordering)
+    if 'genre' in fields:
+        queryset = queryset.select_related('genre')
+    return queryset.only('id', *columns)
+
+
+def get_genre_rows(limit, fields=VIDEO_LIST_FIELDS):
+    """
+    Returns the newest videos of every genre.
+
+    Only the columns of the given fields are loaded. Numbers the videos of each genre with ROW_NUMBER() over a window
+    partitioned by the genre foreign key and keeps the first limit of them,
+    so all rows come from one query that the genre index can answer. On
+    databases without window functions (SQLite before 3.25) it falls back
+    to one query per genre.
+
+    Args:
+        limit (int): The maximum number of videos per genre.
+        fields (list, optional): The fields the videos are serialized with,
+            keys of VIDEO_FIELD_COLUMNS.
+
+    Returns:
+        list: Tuples of the genre name and its videos, newest first, ordered by genre name.
+    """
+    videos = select_video_fields(Video.objects.all(), [*fields, 'genre'])
+    if connection.features.supports_over_clause:
+        rows = videos.filter(genre__isnull=False).annotate(
+            row_number=Window(RowNumber(), partition_by=[F('genre')], order_by=NEWEST_FIRST)
+        ).filter(row_number__lte=limit).order_by('genre__name', *NEWEST_FIRST)
+        return [(name, list(genre_videos)) for name, genre_videos in groupby(rows, key=lambda video: video.genre.name)]
+    rows = [(genre.name, list(videos.filter(genre=genre).order_by(*NEWEST_FIRST)[:limit])) for genre in Genre.objects.all()]
+    return [(name, genre_videos) for name, genre_videos in rows if genre_videos]
+
+
+def get_genres_with_counts():
+    """
+    Returns all genres with the number of their videos, ordered by name.
+
+    The counts are computed in one grouped query over the genre index of
+    the video table.
+
+    Returns:
+        QuerySet: The Genre instances, annotated with video_count.
+    """
+    return Genre.objects.annotate(video_count=Count('videos')).order_by('name')
@@ -0,0 +1,69 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """
+    Returns the current version of the catalog.
+
+    The version lives in the shared cache, so every web process sees a bump
+    at once. If it is missing, e.g. after the cache was flushed, it starts
+    from the current time in nanoseconds, so it never falls back to a
+    version whose responses may still be cached.
+
+    Returns:
+        int: The catalog version.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Moves the catalog to a new version, so all cached catalog responses become unreachable.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def get_catalog_cache_entry(request, version):
+    """
+    Returns the cache key and the ETag of a catalog request.
+
+    Both are derived from the catalog version and the absolute request URL,
+    which covers the host used in the pagination links, the cursor, the
+    filters and the ordering. The same URL at the same version always has
+    the same body, so the ETag is strong and needs no access to the body.
+
+    Args:
+        request (HttpRequest): The catalog request.
+        version (int): The current catalog version.
+
+    Returns:
+        tuple: The cache key and the quoted ETag.
+    """
+    url_digest = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()[:32]
+    return f'catalog:{version}:{url_digest}', f'"{version:x}-{url_digest}"'
+
+
+def get_cached_catalog_page(cache_key):
+    """
+    Returns the cached serialized catalog page, or None if it is not cached.
+    """
+    return cache.get(cache_key)
+
+
+def store_catalog_page(cache_key, data):
+    """
+    Caches a serialized catalog page for settings.VIDEO_CATALOG_CACHE_TIMEOUT seconds.
+    """
+    cache.set(cache_key, data, settings.VIDEO_CATALOG_CACHE_TIMEOUT)
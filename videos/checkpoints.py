@@ -0,0 +1,139 @@
+import os
+from django.core.files import File
+from django.utils import timezone
+from .models import RenditionJob
+from .progress import publish_progress
+from .stream_cache import stream_file_cache
+from .utils import compute_file_hash
+
+
+def get_partial_path(output_path):
+    """
+    Returns the temporary path an output is written to before it is complete.
+
+    The extension is kept so FFmpeg still picks the right muxer, e.g.
+    "720p.mp4" is written as "720p.part.mp4".
+
+    Args:
+        output_path (str): The final path of the output.
+
+    Returns:
+        str: The temporary path.
+    """
+    root, extension = os.path.splitext(output_path)
+    return f'{root}.part{extension}'
+
+
+def hash_output(output_path):
+    """
+    Computes the SHA-256 checksum of a finished output file.
+
+    Args:
+        output_path (str): The absolute path of the file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest.
+    """
+    with open(output_path, 'rb') as output_file:
+        return compute_file_hash(File(output_file))
+
+
+def is_rendition_complete(job, output_path):
+    """
+    Checks whether a rendition was finished earlier and is still intact on disk.
+
+    The size is compared first, so a truncated or replaced file is detected
+    without reading it; only then is the checksum verified.
+
+    Args:
+        job (RenditionJob): The job of the rendition, or None if there is none.
+        output_path (str): The absolute path of the rendition.
+
+    Returns:
+        bool: True if the rendition can be reused.
+    """
+    if job is None or job.status != RenditionJob.STATUS_DONE:
+        return False
+    if not os.path.exists(output_path) or os.path.getsize(output_path) != job.output_size:
+        return False
+    return hash_output(output_path) == job.checksum
+
+
+def get_pending_renditions(video, ladder, output_paths):
+    """
+    Returns the renditions of a ladder that still have to be transcoded.
+
+    Args:
+        video (Video): The Video instance.
+        ladder (list): Tuples of (resolution name, height, maximum bitrate).
+        output_paths (dict): The final output path of every resolution name.
+
+    Returns:
+        list: The ladder entries without a verified, complete rendition.
+    """
+    jobs = {job.resolution: job for job in RenditionJob.objects.filter(video=video)}
+    return [
+        rendition for rendition in ladder
+        if not is_rendition_complete(jobs.get(rendition[0]), output_paths[rendition[0]])
+    ]
+
+
+def start_renditions(video, resolution_names):
+    """
+    Marks renditions as running, in the database and in the progress store.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_names (list): The resolutions that are about to be transcoded.
+    """
+    for resolution_name in resolution_names:
+        RenditionJob.objects.update_or_create(
+            video=video, resolution=resolution_name,
+            defaults={
+                'status': RenditionJob.STATUS_RUNNING, 'started_at': timezone.now(),
+                'output_size': None, 'checksum': '', 'duration': None, 'error': '',
+            }
+        )
+        publish_progress(video.id, resolution_name, 'running', 0.0)
+
+
+def complete_rendition(video, resolution_name, output_path):
+    """
+    Publishes a finished rendition and records it as done.
+
+    The rendition is moved from its temporary path to its final path with an
+    atomic rename, so readers never see a partially written file, and the
+    cached stream files of the video are dropped. The duration is the time
+    since start_renditions marked it as running.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_name (str): The finished resolution.
+        output_path (str): The final path of the rendition.
+    """
+    os.replace(get_partial_path(output_path), output_path)
+    job, created = RenditionJob.objects.get_or_create(video=video, resolution=resolution_name)
+    job.status = RenditionJob.STATUS_DONE
+    job.output_size = os.path.getsize(output_path)
+    job.checksum = hash_output(output_path)
+    job.duration = (timezone.now() - job.started_at).total_seconds() if job.started_at else None
+    job.error = ''
+    job.save()
+    stream_file_cache.invalidate(video.id)
+    publish_progress(video.id, resolution_name, 'done', 100.0)
+
+
+def fail_renditions(video, resolution_names, error):
+    """
+    Marks renditions as failed, in the database and in the progress store.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_names (list): The resolutions whose transcoding failed.
+        error (Exception): The exception that caused the failure.
+    """
+    RenditionJob.objects.filter(video=video, resolution__in=resolution_names).update(
+        status=RenditionJob.STATUS_FAILED, error=str(error)
+    )
+    for resolution_name in resolution_names:
+        publish_progress(video.id, resolution_name, 'failed', 0.0)
@@ -0,0 +1,228 @@
+import os
+import struct
+import threading
+import time
+from django.conf import settings
+
+# Top-level MP4 boxes inspected when looking for the moov atom.
+MAX_TOP_LEVEL_BOXES = 64
+
+
+def find_moov_atom(file_descriptor, file_size):
+    """
+    Locates the moov atom among the top-level boxes of an MP4 file.
+
+    Args:
+        file_descriptor (int): An open descriptor of the file.
+        file_size (int): The size of the file in bytes.
+
+    Returns:
+        tuple: The offset and size of the moov atom, or None if there is none.
+    """
+    offset = 0
+    for _ in range(MAX_TOP_LEVEL_BOXES):
+        if offset + 8 > file_size:
+            return None
+        header = os.pread(file_descriptor, 16, offset)
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        if box_size == 1 and len(header) == 16:
+            box_size = struct.unpack('>Q', header[8:16])[0]
+        elif box_size == 0:
+            box_size = file_size - offset
+        if box_size < 8:
+            return None
+        if box_type == b'moov':
+            return offset, box_size
+        offset += box_size
+    return None
+
+
+class HeadCacheEntry:
+    """
+    The cached head and, if it lies outside the head, the moov atom of one rendition.
+    """
+
+    def __init__(self, mtime_ns, size, segments):
+        """
+        Args:
+            mtime_ns (int): The modification time of the file the data was read from.
+            size (int): The size of that file in bytes.
+            segments (list): Tuples of the file offset and the bytes cached from there.
+        """
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.segments = segments
+        self.nbytes = sum(len(data) for offset, data in segments)
+        self.hits = 0
+        self.last_used = time.monotonic()
+
+
+class HeadCache:
+    """
+    Bounded, thread-safe in-memory cache of the first bytes of every rendition.
+
+    Playback starts with a range request for the head of the file and, for
+    MP4 files without faststart, one for the moov atom at its end. Both are
+    kept in memory, so starting playback never waits for a cold disk. Entries
+    are keyed by path and checked against the size and modification time of
+    the file being served, so a replaced rendition is never answered from
+    stale data. When the cache is full, the entry with the fewest hits is
+    evicted; among equally popular entries the least recently used one goes.
+    """
+
+    def __init__(self, max_bytes, head_bytes, max_moov_bytes):
+        """
+        Args:
+            max_bytes (int): The total number of cached bytes.
+            head_bytes (int): The number of bytes cached from the start of each file.
+            max_moov_bytes (int): The largest moov atom that is cached.
+        """
+        self.max_bytes = max_bytes
+        self.head_bytes = head_bytes
+        self.max_moov_bytes = max_moov_bytes
+        self.entries = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def load(self, stream_file):
+        """
+        Reads the head and moov atom of a file and caches them.
+
+        Args:
+            stream_file (StreamFile): The path and validators of the file.
+
+        Returns:
+            HeadCacheEntry: The new entry.
+        """
+        file_descriptor = os.open(stream_file.path, os.O_RDONLY)
+        try:
+            segments = [(0, os.pread(file_descriptor, min(self.head_bytes, stream_file.size), 0))]
+            moov = find_moov_atom(file_descriptor, stream_file.size)
+            if moov and moov[0] + moov[1] > self.head_bytes and moov[1] <= self.max_moov_bytes:
+                segments.append((moov[0], os.pread(file_descriptor, moov[1], moov[0])))
+        finally:
+            os.close(file_descriptor)
+        entry = HeadCacheEntry(stream_file.mtime_ns, stream_file.size, segments)
+        with self.lock:
+            self.discard(stream_file.path)
+            while self.entries and self.total_bytes + entry.nbytes > self.max_bytes:
+                victim = min(self.entries, key=lambda path: (self.entries[path].hits, self.entries[path].last_used))
+                self.discard(victim)
+                self.evictions += 1
+            if entry.nbytes <= self.max_bytes:
+                self.entries[stream_file.path] = entry
+                self.total_bytes += entry.nbytes
+        return entry
+
+    def discard(self, path):
+        """
+        Drops the entry of a path. Must be called with the lock held.
+        """
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry.nbytes
+
+    def is_cacheable(self, stream_file, start):
+        """
+        Returns whether a range starting at start would be served from the cache.
+        """
+        return start < self.head_bytes or stream_file.size - start <= self.max_moov_bytes
+
+    def read(self, stream_file, start, end):
+        """
+        Returns the cached bytes of a range, loading the file's head on a miss.
+
+        Only ranges that start inside the head or the moov atom are served
+        from the cache. If a range extends past the cached bytes, the caller
+        answers with the cached part only and the client requests the rest.
+
+        Args:
+            stream_file (StreamFile): The path and validators of the file.
+            start (int): The first byte of the range.
+            end (int): The last byte of the range.
+
+        Returns:
+            bytes: The cached bytes from start on, at most up to end, or None
+                   if the range does not start inside cached data.
+        """
+        if not self.is_cacheable(stream_file, start):
+            return None
+        with self.lock:
+            entry = self.entries.get(stream_file.path)
+            if entry is not None and (entry.mtime_ns, entry.size) != (stream_file.mtime_ns, stream_file.size):
+                self.discard(stream_file.path)
+                entry = None
+            if entry is not None:
+                cached_bytes = self.slice(entry, start, end)
+                if cached_bytes is not None:
+                    self.hits += 1
+                    entry.hits += 1
+                    entry.last_used = time.monotonic()
+                return cached_bytes
+            self.misses += 1
+        return self.slice(self.load(stream_file), start, end)
+
+    def slice(self, entry, start, end):
+        """
+        Returns the cached bytes of an entry from start on, at most up to end,
+        or None if start is not inside a cached segment.
+        """
+        for offset, data in entry.segments:
+            if offset <= start < offset + len(data):
+                return data[start - offset:min(end, offset + len(data) - 1) - offset + 1]
+        return None
+
+    def prefetch(self, file_path):
+        """
+        Asks the kernel to read the head and moov atom of a file into the page cache.
+
+        Used by the Celery worker when a conversion completes. The worker
+        does not serve requests, so it does not keep the bytes itself; the
+        web processes on the same host then fill their caches from memory on
+        the first request.
+
+        Args:
+            file_path (str): The absolute path of the file.
+        """
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        file_descriptor = os.open(file_path, os.O_RDONLY)
+        try:
+            file_size = os.fstat(file_descriptor).st_size
+            os.posix_fadvise(file_descriptor, 0, min(self.head_bytes, file_size), os.POSIX_FADV_WILLNEED)
+            moov = find_moov_atom(file_descriptor, file_size)
+            if moov and moov[1] <= self.max_moov_bytes:
+                os.posix_fadvise(file_descriptor, moov[0], moov[1], os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(file_descriptor)
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the size of the cache.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        """
+        Drops all entries and resets the counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+head_cache = HeadCache(
+    settings.VIDEO_HEAD_CACHE_MAX_BYTES, settings.VIDEO_HEAD_CACHE_HEAD_BYTES, settings.VIDEO_HEAD_CACHE_MAX_MOOV_BYTES
+)
@@ -0,0 +1,109 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from videos.streaming import build_file_response
+
+
+class Command(BaseCommand):
+    """
+    Compares the generator and the sendfile serving paths of VideoStreamView.
+
+    For each number of concurrent streams, a temporary file is served through
+    build_file_response once with the buffered generator and once with the
+    file wrapper. Each stream writes into a local socket that is drained by a
+    reader thread, the way a WSGI server writes into the client connection.
+    The file wrapper path is sent like gunicorn does, with os.sendfile from
+    the descriptor, offset and Content-Length of the response. Throughput is
+    measured over all streams; CPU time is the thread time of the sending
+    threads only, so the readers do not distort the comparison.
+    """
+    help = 'Benchmarks throughput and CPU per stream of the generator and sendfile streaming paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256, help='Size of the served file in MiB.')
+        parser.add_argument('--streams', type=int, nargs='+', default=[1, 4, 16], help='Numbers of concurrent streams to test.')
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as video_file:
+            for _ in range(options['size_mb']):
+                video_file.write(os.urandom(1024 * 1024))
+            video_file.flush()
+            self.stdout.write(f"{'mode':<14}{'streams':>8}{'MiB/s':>12}{'CPU s/stream':>15}{'CPU ms/GiB':>13}")
+            for stream_count in options['streams']:
+                for mode in ('generator', 'file_wrapper'):
+                    throughput, cpu_per_stream, cpu_per_gib = self.run_streams(video_file.name, mode, stream_count)
+                    self.stdout.write(
+                        f"{mode:<14}{stream_count:>8}{throughput:>12.1f}{cpu_per_stream:>15.3f}{cpu_per_gib:>13.1f}"
+                    )
+
+    def run_streams(self, file_path, mode, stream_count):
+        """
+        Serves the file to stream_count concurrent readers and measures the senders.
+
+        Returns:
+            tuple: The total throughput in MiB/s, the sender CPU seconds per
+                   stream and the sender CPU milliseconds per GiB sent.
+        """
+        request = RequestFactory().get('/')
+        with override_settings(VIDEO_STREAM_FILE_WRAPPER=(mode == 'file_wrapper')):
+            responses = [build_file_response(request, file_path, 'video/mp4') for _ in range(stream_count)]
+
+        cpu_times = []
+        threads = []
+        for response in responses:
+            sender_socket, reader_socket = socket.socketpair()
+            threads.append(threading.Thread(target=self.drain, args=(reader_socket,)))
+            threads.append(threading.Thread(target=self.send, args=(response, sender_socket, cpu_times)))
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total_bytes = sum(int(response['Content-Length']) for response in responses)
+        total_cpu = sum(cpu_times)
+        return (
+            total_bytes / (1024 * 1024) / elapsed,
+            total_cpu / stream_count,
+            total_cpu * 1000 / (total_bytes / (1024 ** 3)),
+        )
+
+    def send(self, response, sender_socket, cpu_times):
+        """
+        Writes one response into a socket and records the thread's CPU time.
+        """
+        cpu_started = time.thread_time()
+        try:
+            file_to_stream = getattr(response, 'file_to_stream', None)
+            if file_to_stream is not None and hasattr(os, 'sendfile'):
+                file_descriptor = file_to_stream.fileno()
+                offset = os.lseek(file_descriptor, 0, os.SEEK_CUR)
+                remaining = int(response['Content-Length'])
+                while remaining > 0:
+                    sent = os.sendfile(sender_socket.fileno(), file_descriptor, offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+            else:
+                for chunk in response.streaming_content:
+                    sender_socket.sendall(chunk)
+        finally:
+            response.close()
+            sender_socket.close()
+            cpu_times.append(time.thread_time() - cpu_started)
+
+    def drain(self, reader_socket):
+        """
+        Reads and discards everything written to a socket until it is closed.
+        """
+        buffer = bytearray(1024 * 1024)
+        with reader_socket:
+            while reader_socket.recv_into(buffer):
+                pass
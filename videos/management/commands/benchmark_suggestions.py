@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from videos.suggestions import TitlePrefixIndex
+
+WORDS = [
+    'the', 'last', 'night', 'ocean', 'city', 'dark', 'love', 'war', 'secret', 'journey', 'shadow', 'river',
+    'mountain', 'kingdom', 'island', 'storm', 'winter', 'summer', 'fire', 'ice', 'lost', 'hidden', 'golden',
+    'silent', 'wild', 'broken', 'eternal', 'midnight', 'empire', 'legend', 'dragon', 'garden', 'stranger',
+    'über', 'café', 'mädchen', 'straße', 'nacht', 'liebe', 'himmel', 'wolf', 'star', 'planet', 'machine',
+]
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the title prefix index on a synthetic catalog.
+
+    Builds a TitlePrefixIndex from random titles of two to five words,
+    without touching the database, then measures lookups of random one- to
+    five-letter prefixes taken from the titles and incremental updates and
+    removals. Reports the build time and the median, 99th percentile and
+    maximum time per operation.
+    """
+    help = 'Benchmarks title suggestions on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100000, help='Number of synthetic titles.')
+        parser.add_argument('--queries', type=int, default=10000, help='Number of prefix lookups to time.')
+        parser.add_argument('--limit', type=int, default=10, help='Suggestions per lookup.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random catalog.')
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        titles = {
+            video_id: ' '.join(generator.choice(WORDS).capitalize() for _ in range(generator.randint(2, 5)))
+            for video_id in range(1, options['titles'] + 1)
+        }
+        index = TitlePrefixIndex(ttl=float('inf'))
+
+        started = time.perf_counter()
+        index.build(titles.items())
+        self.stdout.write(f"titles:         {len(titles)}")
+        self.stdout.write(f"build:          {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        prefixes = []
+        for _ in range(options['queries']):
+            title = titles[generator.randint(1, len(titles))]
+            word = generator.choice(title.split(' '))
+            prefixes.append(word[:generator.randint(1, min(5, len(word)))])
+        self.report('lookup', [self.time_call(index.suggest, prefix, options['limit']) for prefix in prefixes])
+
+        update_ids = [generator.randint(1, len(titles)) for _ in range(min(1000, options['queries']))]
+        self.report('update', [self.time_call(index.update, video_id, f'Renamed {video_id}') for video_id in update_ids])
+        self.report('remove', [self.time_call(index.remove, video_id) for video_id in update_ids])
+
+    def time_call(self, function, *args):
+        """
+        Returns the duration of one call in microseconds.
+        """
+        started = time.perf_counter()
+        function(*args)
+        return (time.perf_counter() - started) * 1000000
+
+    def report(self, label, durations):
+        """
+        Writes the median, 99th percentile and maximum of the durations.
+        """
+        durations.sort()
+        self.stdout.write(
+            f"{label + ':':<16}median {statistics.median(durations):.1f} µs, "
+            f"p99 {durations[int(len(durations) * 0.99) - 1]:.1f} µs, max {durations[-1]:.1f} µs"
+        )
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import resource
+import tempfile
+import threading
+import time
+from unittest import mock
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+from videos.streaming import MEDIA_IO_THREAD_PREFIX, aserve_media_file
+
+
+class ReadCounter:
+    """
+    Counts the file reads that are running at the same time.
+    """
+    lock = threading.Lock()
+    current = 0
+    peak = 0
+
+    @classmethod
+    def pread(cls, file_descriptor, length, offset):
+        with cls.lock:
+            cls.current += 1
+            cls.peak = max(cls.peak, cls.current)
+        try:
+            return original_pread(file_descriptor, length, offset)
+        finally:
+            with cls.lock:
+                cls.current -= 1
+
+
+original_pread = os.pread
+
+
+class LoadTestUrls:
+    """
+    URLconf of the load test: one asynchronous view serving the test file.
+    """
+    file_path = None
+
+    async def serve(request):
+        return await aserve_media_file(request, LoadTestUrls.file_path, 'video/mp4')
+
+    urlpatterns = [path('load-test/', serve)]
+
+
+class SlowClient:
+    """
+    Simulated ASGI client that reads the response at a limited pace.
+
+    Every body message is acknowledged only after delay seconds, which is how
+    an ASGI server applies backpressure from a slow connection. A client with
+    disconnect_after set sends http.disconnect after that many body messages.
+    """
+
+    def __init__(self, delay, disconnect_after=None):
+        self.delay = delay
+        self.disconnect_after = disconnect_after
+        self.disconnected = asyncio.Event()
+        self.request_sent = False
+        self.status = None
+        self.bytes_received = 0
+        self.messages = 0
+        self.messages_after_disconnect = 0
+        self.finished = False
+
+    async def receive(self):
+        """
+        Returns the empty request body once, then waits for the disconnect.
+        """
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        """
+        Receives one response message at the client's pace.
+        """
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            return
+        if self.disconnected.is_set():
+            self.messages_after_disconnect += 1
+            return
+        self.bytes_received += len(message.get('body', b''))
+        self.messages += 1
+        if not message.get('more_body', False):
+            self.finished = True
+            return
+        if self.disconnect_after is not None and self.messages >= self.disconnect_after:
+            self.disconnected.set()
+            return
+        await asyncio.sleep(self.delay)
+
+
+class Command(BaseCommand):
+    """
+    Load test of the asynchronous streaming path with many slow clients.
+
+    Drives Django's ASGI handler in-process with thousands of concurrent
+    simulated clients that read at a limited pace; a share of them disconnects
+    early. The test file is served through aserve_media_file, the same code
+    as AsyncVideoStreamView, including all middleware. Reports throughput,
+    peak memory, the peak number of file reads in flight and how many
+    messages were sent to a client after it had disconnected.
+
+    The peak thread count is reported twice: for the whole process and for
+    the media I/O pool that runs the file reads. Only the latter is bounded,
+    by VIDEO_ASYNC_IO_THREADS. Django's ASGI handler keeps one thread per
+    in-flight request for its synchronous request signal receivers; these
+    threads sit idle while the body is streamed, so the process total grows
+    with the number of clients.
+    """
+    help = 'Load-tests the asynchronous streaming path with many slow, partly disconnecting clients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000, help='Number of concurrent clients.')
+        parser.add_argument('--size-mb', type=int, default=1, help='Size of the served file in MiB.')
+        parser.add_argument('--delay', type=float, default=0.05, help='Seconds each client waits per received chunk.')
+        parser.add_argument('--disconnect-ratio', type=float, default=0.2, help='Share of clients that disconnect early.')
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as video_file:
+            video_file.write(os.urandom(options['size_mb'] * 1024 * 1024))
+            video_file.flush()
+            LoadTestUrls.file_path = video_file.name
+            with override_settings(ROOT_URLCONF=LoadTestUrls, VIDEO_OFFLOAD_MODE=''), \
+                    mock.patch('videos.streaming.os.pread', ReadCounter.pread):
+                results = asyncio.run(self.run_clients(options))
+        self.report(results, options)
+
+    async def run_clients(self, options):
+        """
+        Runs all clients concurrently and samples the thread count meanwhile.
+        """
+        application = ASGIHandler()
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')), 'localhost').lstrip('.')
+        disconnecting = int(options['clients'] * options['disconnect_ratio'])
+        clients = [
+            SlowClient(options['delay'], disconnect_after=2 if index < disconnecting else None)
+            for index in range(options['clients'])
+        ]
+        peak_threads = threading.active_count()
+        peak_io_threads = self.count_media_io_threads()
+        started = time.perf_counter()
+        requests = asyncio.gather(*[
+            application(self.get_scope(host, index), client.receive, client.send)
+            for index, client in enumerate(clients)
+        ])
+        while not requests.done():
+            peak_threads = max(peak_threads, threading.active_count())
+            peak_io_threads = max(peak_io_threads, self.count_media_io_threads())
+            await asyncio.sleep(0.01)
+        await requests
+        return clients, time.perf_counter() - started, peak_threads, peak_io_threads
+
+    def count_media_io_threads(self):
+        """
+        Returns the number of live threads of the media I/O pool.
+        """
+        return sum(thread.name.startswith(MEDIA_IO_THREAD_PREFIX) for thread in threading.enumerate())
+
+    def get_scope(self, host, index):
+        """
+        Returns the ASGI scope of one client's GET request.
+        """
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/load-test/', 'raw_path': b'/load-test/', 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', host.encode())], 'client': ('127.0.0.1', 10000 + index), 'server': (host, 80),
+        }
+
+    def report(self, results, options):
+        """
+        Writes the results of the load test.
+        """
+        clients, elapsed, peak_threads, peak_io_threads = results
+        completed = [client for client in clients if client.finished]
+        aborted = [client for client in clients if client.disconnected.is_set()]
+        failed = [client for client in clients if client.status not in (200, None)]
+        total_bytes = sum(client.bytes_received for client in clients)
+        peak_memory_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"clients:                    {len(clients)}")
+        self.stdout.write(f"completed / disconnected:   {len(completed)} / {len(aborted)}")
+        self.stdout.write(f"failed responses:           {len(failed)}")
+        self.stdout.write(f"wall time:                  {elapsed:.2f} s")
+        self.stdout.write(f"throughput:                 {total_bytes / (1024 * 1024) / elapsed:.1f} MiB/s")
+        self.stdout.write(f"peak threads:               {peak_threads}")
+        self.stdout.write(f"peak media I/O threads:     {peak_io_threads} (limit {settings.VIDEO_ASYNC_IO_THREADS})")
+        self.stdout.write(f"peak RSS:                   {peak_memory_mib:.0f} MiB")
+        self.stdout.write(f"peak reads in flight:       {ReadCounter.peak}")
+        self.stdout.write(
+            f"messages after disconnect:  max {max((client.messages_after_disconnect for client in aborted), default=0)} per client"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_videoviewing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_playlist',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-17 05:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_video_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenditionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('output_size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rendition_jobs', to='videos.video')),
+            ],
+            options={
+                'unique_together': {('video', 'resolution')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_renditionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='trickplay_index',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_trickplay_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-upload_date', '-id'], name='video_upload_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['title', 'id'], name='video_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['genre', '-upload_date', '-id'], name='video_genre_upload_date_idx'),
+        ),
+    ]
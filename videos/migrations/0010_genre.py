@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_video_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_genre_upload_date_idx',
+        ),
+        migrations.RenameField(
+            model_name='video',
+            old_name='genre',
+            new_name='genre_name',
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='genre',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='videos', to='videos.genre'),
+        ),
+    ]
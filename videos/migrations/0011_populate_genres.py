@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# The genres offered before they were moved to their own table.
+DEFAULT_GENRES = ['Action', 'Comedy', 'Documentary', 'Drama']
+
+
+def populate_genres(apps, schema_editor):
+    """
+    Creates the default genres and one genre per distinct free-text value,
+    and links every video to the genre of its former text value.
+    """
+    Genre = apps.get_model('videos', 'Genre')
+    Video = apps.get_model('videos', 'Video')
+    values = list(Video.objects.values_list('genre_name', flat=True).distinct())
+    for name in sorted(set(DEFAULT_GENRES) | {value.strip() for value in values if value.strip()}):
+        Genre.objects.get_or_create(name=name)
+    for value in values:
+        if value.strip():
+            Video.objects.filter(genre_name=value).update(genre=Genre.objects.get(name=value.strip()))
+
+
+def restore_genre_names(apps, schema_editor):
+    """
+    Writes the name of every video's genre back into the free-text column.
+    """
+    Genre = apps.get_model('videos', 'Genre')
+    Video = apps.get_model('videos', 'Video')
+    for genre in Genre.objects.all():
+        Video.objects.filter(genre=genre).update(genre_name=genre.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0010_genre'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_genres, restore_genre_names),
+    ]
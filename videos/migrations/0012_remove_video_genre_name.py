@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_populate_genres'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='video',
+            name='genre_name',
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['genre', '-upload_date', '-id'], name='video_genre_upload_date_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Kept in sync with videos.search, which queries these objects.
+POSTGRESQL_CREATE = [
+    """
+    ALTER TABLE videos_video ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX videos_video_search_idx ON videos_video USING GIN (search_vector)',
+]
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS videos_video_search_idx',
+    'ALTER TABLE videos_video DROP COLUMN IF EXISTS search_vector',
+]
+SQLITE_CREATE = [
+    'CREATE VIRTUAL TABLE videos_video_fts USING fts5(title, description)',
+    'INSERT INTO videos_video_fts (rowid, title, description) SELECT id, title, description FROM videos_video',
+]
+SQLITE_DROP = [
+    'DROP TABLE IF EXISTS videos_video_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the full-text index of video titles and descriptions.
+
+    PostgreSQL gets a generated, weighted tsvector column with a GIN index;
+    SQLite gets an FTS5 table filled with the existing videos, which
+    videos.signals keeps in sync. Other databases get no index.
+    """
+    statements = {'postgresql': POSTGRESQL_CREATE, 'sqlite': SQLITE_CREATE}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    """
+    Drops the full-text index created by create_search_index.
+    """
+    statements = {'postgresql': POSTGRESQL_DROP, 'sqlite': SQLITE_DROP}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0012_remove_video_genre_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
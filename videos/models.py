@@ -1,12 +1,37 @@
 from django.conf import settings
 from django.db import models
 
+class Genre(models.Model):
+    """
+    Model representing a genre of the catalog.
+
+    Videos refer to their genre by foreign key, so filtering, counting and
+    grouping by genre use the index on Video.genre instead of comparing strings.
+    """
+    name = models.CharField(max_length=64, unique=True)
+
+    class Meta:
+        """
+        Meta class for Genre model.
+
+        Orders genres by name.
+        """
+        ordering = ['name']
+
+    def __str__(self):
+        """
+        Returns the name of the genre as its string representation.
+        """
+        return self.name
+
+
 class Video(models.Model):
     """
     Model representing a video.
 
     Stores video details such as title, description, upload date, video file,
-    thumbnail, available resolutions, and genre.
+    thumbnail, available resolutions, HLS master playlist, trickplay index, and genre, as well
+    as the source metadata probed before conversion.
     """
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -14,7 +39,37 @@ class Video(models.Model):
     video_file = models.FileField(upload_to='videos/')
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
     resolutions = models.JSONField(null=True, blank=True)
-    genre = models.TextField(blank=True)
+    hls_playlist = models.CharField(max_length=255, blank=True)
+    trickplay_index = models.CharField(max_length=255, blank=True)
+    genre = models.ForeignKey(Genre, on_delete=models.PROTECT, null=True, blank=True, related_name='videos')
+    duration = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    bitrate = models.PositiveBigIntegerField(null=True, blank=True)
+    video_codec = models.CharField(max_length=32, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True)
+    keyframe_interval = models.FloatField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    CONVERSION_FIELDS = (
+        'video_file', 'thumbnail', 'resolutions', 'hls_playlist', 'trickplay_index', 'duration', 'width', 'height',
+        'frame_rate', 'bitrate', 'video_codec', 'audio_codec', 'keyframe_interval',
+    )
+
+    class Meta:
+        """
+        Meta class for Video model.
+
+        Defines the indexes behind the catalog orderings and the genre filter,
+        so every page of the cursor-paginated catalog, also within one genre,
+        is an index range scan.
+        """
+        indexes = [
+            models.Index(fields=['-upload_date', '-id'], name='video_upload_date_id_idx'),
+            models.Index(fields=['title', 'id'], name='video_title_id_idx'),
+            models.Index(fields=['genre', '-upload_date', '-id'], name='video_genre_upload_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -22,6 +77,62 @@ class Video(models.Model):
         """
         return self.title
 
+    def get_conversion_data(self):
+        """
+        Returns the stored file, converted renditions, thumbnail and source
+        metadata of the video.
+
+        Used to give a re-uploaded video with the same content hash the
+        results of the earlier conversion instead of converting it again.
+
+        Returns:
+            dict: The values of all fields in CONVERSION_FIELDS.
+        """
+        return {field: getattr(self, field) for field in self.CONVERSION_FIELDS}
+
+class RenditionJob(models.Model):
+    """
+    Model tracking the transcoding state of one rendition of a video.
+
+    A rendition that is done records the size and SHA-256 checksum of its
+    output file and how long it took to produce, so a retried or re-run
+    conversion can verify and skip it instead of transcoding it again.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='rendition_jobs')
+    resolution = models.CharField(max_length=16)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    started_at = models.DateTimeField(null=True, blank=True)
+    output_size = models.PositiveBigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """
+        Meta class for RenditionJob model.
+
+        Ensures that there is only one job per video and resolution.
+        """
+        unique_together = ('video', 'resolution')
+
+    def __str__(self):
+        """
+        Returns the video title, the resolution and the status of the job.
+        """
+        return f"{self.video.title} {self.resolution}: {self.status}"
+
 class VideoViewing(models.Model):
     """
     Model to track video viewing history for users.
@@ -0,0 +1,47 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+# Orderings a client can choose with the "ordering" query parameter. The id
+# breaks ties, so the order is stable and matches the catalog indexes.
+CATALOG_ORDERINGS = {
+    '-upload_date': ('-upload_date', '-id'),
+    'upload_date': ('upload_date', 'id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+}
+DEFAULT_CATALOG_ORDERING = '-upload_date'
+
+
+class VideoCatalogPagination(CursorPagination):
+    """
+    Cursor pagination of the video catalog.
+
+    Each page continues after the last row of the previous one with a
+    WHERE clause on the ordering column, which the database answers from an
+    index, so a page deep in the catalog costs the same as the first one.
+    Newest videos come first unless another entry of CATALOG_ORDERINGS is
+    requested with the "ordering" query parameter.
+    """
+    page_size = settings.VIDEO_CATALOG_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.VIDEO_CATALOG_MAX_PAGE_SIZE
+    ordering = CATALOG_ORDERINGS[DEFAULT_CATALOG_ORDERING]
+    ordering_param = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Returns the requested ordering, or the default one if the value is unknown.
+        """
+        return CATALOG_ORDERINGS.get(request.query_params.get(self.ordering_param), self.ordering)
+
+
+class VideoSearchPagination(PageNumberPagination):
+    """
+    Page number pagination of search results.
+
+    Results are ordered by relevance, which has no stable position to
+    continue from, so pages are numbered instead of using a cursor.
+    """
+    page_size = settings.VIDEO_SEARCH_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.VIDEO_CATALOG_MAX_PAGE_SIZE
@@ -0,0 +1,18 @@
+from rest_framework import permissions
+from .signing import THUMBNAIL_RESOLUTION, is_media_signature_valid
+
+
+class HasValidMediaSignature(permissions.BasePermission):
+    """
+    Allows stream and thumbnail requests that carry a valid, unexpired signature.
+
+    The signature is issued by SignedMediaURLView for one video, resolution
+    and user. Views whose files are all covered by one signature, like the
+    HLS package, name it in signed_resolution. Views using this permission
+    set authentication_classes = [], so the check needs no database access.
+    """
+    message = 'The media URL signature is missing, invalid or expired.'
+
+    def has_permission(self, request, view):
+        resolution_name = getattr(view, 'signed_resolution', None) or view.kwargs.get('resolution') or THUMBNAIL_RESOLUTION
+        return is_media_signature_valid(request.query_params, view.kwargs['pk'], resolution_name)
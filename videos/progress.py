@@ -0,0 +1,143 @@
+import time
+from django.core.cache import cache
+
+PROGRESS_TIMEOUT = 60 * 60 * 24
+PROGRESS_PUBLISH_INTERVAL = 1.0
+
+
+def get_progress_key(video_id, label=None):
+    """
+    Returns the cache key under which the transcoding progress of a video is stored.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+        label (str, optional): The rendition, e.g. "720p". Without a label the
+                               key of the index listing all renditions is returned.
+
+    Returns:
+        str: The cache key.
+    """
+    if label is None:
+        return f'transcode-progress:{video_id}'
+    return f'transcode-progress:{video_id}:{label}'
+
+
+def start_progress(video_id, labels):
+    """
+    Registers the renditions of a conversion so their progress can be polled.
+
+    Each rendition gets its own cache entry, so concurrent workers never
+    overwrite each other's progress.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+        labels (list): The renditions that are transcoded, e.g. ["120p", "360p"].
+    """
+    cache.set(get_progress_key(video_id), {'labels': list(labels), 'started_at': time.time()}, PROGRESS_TIMEOUT)
+    cache.delete_many([get_progress_key(video_id, f'{label}:segments') for label in labels])
+    cache.set_many({
+        get_progress_key(video_id, label): {'status': 'pending', 'percent': 0.0, 'speed': None, 'eta': None}
+        for label in labels
+    }, PROGRESS_TIMEOUT)
+
+
+def publish_progress(video_id, label, status, percent, speed=None, eta=None):
+    """
+    Stores the current progress of one rendition.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+        label (str): The rendition, e.g. "720p".
+        status (str): "pending", "running", "done" or "failed".
+        percent (float): The share of the video transcoded so far, 0 to 100.
+        speed (float, optional): The encode speed as a multiple of real time.
+        eta (float, optional): The estimated remaining time in seconds.
+    """
+    cache.set(get_progress_key(video_id, label), {
+        'status': status,
+        'percent': round(percent, 1),
+        'speed': speed,
+        'eta': round(eta, 1) if eta is not None else None,
+        'updated_at': time.time(),
+    }, PROGRESS_TIMEOUT)
+
+
+def publish_segment_done(video_id, label, segment_count):
+    """
+    Counts a finished segment of a segmented conversion and updates the
+    progress of its rendition.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+        label (str): The rendition the segment belongs to.
+        segment_count (int): The total number of segments of the rendition.
+    """
+    counter_key = get_progress_key(video_id, f'{label}:segments')
+    cache.add(counter_key, 0, PROGRESS_TIMEOUT)
+    done = cache.incr(counter_key)
+    publish_progress(video_id, label, 'running', min(100.0, 100.0 * done / max(segment_count, 1)))
+
+
+def get_progress(video_id):
+    """
+    Returns the progress of every rendition of a video's current conversion.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+
+    Returns:
+        dict: The start time and the progress of each rendition, or None if
+              no conversion has been registered for the video.
+    """
+    index = cache.get(get_progress_key(video_id))
+    if index is None:
+        return None
+    entries = cache.get_many([get_progress_key(video_id, label) for label in index['labels']])
+    return {
+        'started_at': index['started_at'],
+        'renditions': {label: entries.get(get_progress_key(video_id, label)) for label in index['labels']},
+    }
+
+
+class ProgressReporter:
+    """
+    Callback for run_ffmpeg that publishes the progress of one FFmpeg process.
+
+    One process may write several renditions at once, as in the single-decode
+    strategy; all of them share the same progress. Updates are throttled to
+    one per PROGRESS_PUBLISH_INTERVAL seconds. Marking renditions as done or
+    failed is left to the job state in videos.checkpoints.
+    """
+
+    def __init__(self, video_id, labels, duration):
+        """
+        Args:
+            video_id (int): The ID of the Video model instance.
+            labels (list): The renditions written by the FFmpeg process.
+            duration (float): The duration of the input in seconds, if known.
+        """
+        self.video_id = video_id
+        self.labels = labels
+        self.duration = duration
+        self.last_published = 0.0
+
+    def __call__(self, out_time, speed, finished):
+        """
+        Publishes a progress update reported by FFmpeg.
+
+        Args:
+            out_time (float): The position of the output in seconds.
+            speed (float): The encode speed as a multiple of real time, or None.
+            finished (bool): True for FFmpeg's last progress report.
+        """
+        now = time.monotonic()
+        if not finished and now - self.last_published < PROGRESS_PUBLISH_INTERVAL:
+            return
+        self.last_published = now
+        if finished:
+            percent, eta = 100.0, 0.0
+        else:
+            percent = min(100.0, 100.0 * out_time / self.duration) if self.duration else 0.0
+            eta = max((self.duration - out_time) / speed, 0.0) if self.duration and speed else None
+        for label in self.labels:
+            publish_progress(self.video_id, label, 'running', percent, speed, eta)
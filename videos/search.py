@@ -0,0 +1,125 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from .models import Video
+
+# Text search configuration of the generated search_vector column on
+# PostgreSQL (see migration 0013_video_search). Titles and descriptions are
+# in several languages, so words are not stemmed.
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'videos_video_fts'
+# bm25() weights of the title and description columns of the FTS5 table,
+# ranking title matches above description matches like the A and B weights
+# of the tsvector.
+FTS_COLUMN_WEIGHTS = (10.0, 1.0)
+
+
+class RankedVideoList:
+    """
+    Sequence of videos in the order of a ranked list of ids.
+
+    Slicing loads only the videos of the slice, so Django's Paginator
+    fetches one page of videos per request.
+    """
+
+    def __init__(self, video_ids, queryset):
+        """
+        Args:
+            video_ids (list): The ids of the matching videos, best match first.
+            queryset (QuerySet): The queryset the videos are loaded from.
+        """
+        self.video_ids = video_ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        video_ids = self.video_ids[index]
+        videos = self.queryset.in_bulk(video_ids)
+        return [videos[video_id] for video_id in video_ids if video_id in videos]
+
+
+def build_fts_query(text):
+    """
+    Turns user input into an FTS5 query that matches all of its words.
+
+    Every word is quoted, so FTS5 operators and syntax in the input are
+    treated as plain text.
+
+    Args:
+        text (str): The search text.
+
+    Returns:
+        str: The FTS5 query, or an empty string if the text has no words.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def search_videos(text, queryset=None):
+    """
+    Returns the videos whose title or description matches the search text, best match first.
+
+    On PostgreSQL the text is parsed with websearch_to_tsquery (quoted
+    phrases, "or" and "-word" work), matched against the GIN-indexed
+    search_vector column and ordered by ts_rank. On SQLite it is matched
+    against the FTS5 table and ordered by bm25; the ranked ids are read in
+    one query and the videos loaded page by page. Title matches rank above
+    description matches on both.
+
+    Args:
+        text (str): The search text.
+        queryset (QuerySet, optional): The videos to search, all by default.
+
+    Returns:
+        QuerySet or RankedVideoList: The matching videos, ready for pagination.
+    """
+    if queryset is None:
+        queryset = Video.objects.all()
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search=RawSQL('"videos_video"."search_vector"', (), output_field=SearchVectorField()),
+            rank=SearchRank(F('search'), search_query),
+        ).filter(search=search_query).order_by('-rank', '-id')
+
+    fts_query = build_fts_query(text)
+    if not fts_query:
+        return RankedVideoList([], queryset)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s), rowid DESC',
+            [fts_query, *FTS_COLUMN_WEIGHTS]
+        )
+        return RankedVideoList([row[0] for row in cursor.fetchall()], queryset)
+
+
+def index_video(video):
+    """
+    Writes the title and description of a video into the FTS5 table.
+
+    Only needed on SQLite; PostgreSQL computes the search vector itself.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [video.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [video.pk, video.title, video.description]
+        )
+
+
+def unindex_video(video_id):
+    """
+    Removes a video from the FTS5 table on SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [video_id])
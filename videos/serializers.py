@@ -1,22 +1,43 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Video, VideoViewing
+from .catalog import VIDEO_LIST_FIELDS
+from .models import Genre, Video, VideoViewing
+from .transcoding import TRICKPLAY_INDEX
+
+class GenreField(serializers.SlugRelatedField):
+    """
+    Genre field that lists the existing genres in its error messages.
+
+    The names are read from the queryset when an error is raised, so the
+    messages follow the Genre rows instead of a fixed list.
+    """
+
+    def fail(self, key, **kwargs):
+        genres = ', '.join(self.get_queryset().order_by('name').values_list('name', flat=True))
+        super().fail(key, genres=genres, **kwargs)
+
 
 class VideoSerializer(serializers.ModelSerializer):
     """
     Serializer for the Video model.
 
     Handles serialization and deserialization of Video instances.
-    Includes a ChoiceField for the 'genre' field with predefined choices
-    and custom error messages.
+    Represents the genre by its name, which must be one of the Genre rows,
+    with custom error messages, and includes the URLs of the HLS master
+    playlist and the trickplay index.
     """
-    genre = serializers.ChoiceField(
-        choices=['Action', 'Comedy', 'Documentary', 'Drama'],
+    genre = GenreField(
+        slug_field='name',
+        queryset=Genre.objects.all(),
         required=True,
         error_messages={
-            'required': "Das Genre ist ein Pflichtfeld. Bitte wählen Sie eines der folgenden Genres: Action, Comedy, Documentary, Drama.", # Keeping German message as per original, should be translated or internationalized in a real application.
-            'invalid_choice': "Ungültiges Genre. Bitte wählen Sie eines der folgenden Genres: Action, Comedy, Documentary, Drama." # Keeping German message as per original, same as above.
+            'required': "Das Genre ist ein Pflichtfeld. Bitte wählen Sie eines der folgenden Genres: {genres}.",
+            'does_not_exist': "Ungültiges Genre. Bitte wählen Sie eines der folgenden Genres: {genres}.",
+            'invalid': "Ungültiges Genre. Bitte wählen Sie eines der folgenden Genres: {genres}."
         }
     )
+    hls_url = serializers.SerializerMethodField()
+    trickplay_url = serializers.SerializerMethodField()
 
     class Meta:
         """
@@ -26,8 +47,64 @@ class VideoSerializer(serializers.ModelSerializer):
         as well as specifying read-only fields.
         """
         model = Video
-        fields = ['id', 'title', 'description', 'video_file', 'thumbnail', 'resolutions', 'upload_date', 'genre']
-        read_only_fields = ['id', 'thumbnail', 'resolutions', 'upload_date']
+        fields = ['id', 'title', 'description', 'video_file', 'thumbnail', 'resolutions', 'hls_url', 'trickplay_url', 'upload_date', 'genre', 'duration']
+        read_only_fields = ['id', 'thumbnail', 'resolutions', 'upload_date', 'duration']
+
+    def get_hls_url(self, obj):
+        """
+        Returns the URL of the video's HLS master playlist, or None if the
+        video has not been packaged yet.
+        """
+        if not obj.hls_playlist:
+            return None
+        return reverse('video-hls-master', kwargs={'pk': obj.pk})
+
+    def get_trickplay_url(self, obj):
+        """
+        Returns the URL of the video's trickplay WebVTT index, or None if no
+        sprites have been rendered yet.
+        """
+        if not obj.trickplay_index:
+            return None
+        return reverse('video-trickplay', kwargs={'pk': obj.pk, 'filename': TRICKPLAY_INDEX})
+
+
+class VideoListSerializer(VideoSerializer):
+    """
+    Read-only serializer for videos in catalog lists.
+
+    Includes only the given fields of VideoSerializer, by default the id,
+    title, thumbnail and genre name that list screens show, so a catalog
+    page carries no descriptions, file paths or resolution maps.
+    """
+
+    def __init__(self, *args, fields=VIDEO_LIST_FIELDS, **kwargs):
+        """
+        Args:
+            fields (list, optional): The names of the fields to include.
+        """
+        super().__init__(*args, **kwargs)
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+
+class GenreSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Genre model.
+
+    Includes the number of videos in the genre, which must be annotated on
+    the queryset as video_count.
+    """
+    video_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        """
+        Meta class for GenreSerializer.
+
+        Defines the model to be serialized and the fields to include.
+        """
+        model = Genre
+        fields = ['id', 'name', 'video_count']
 
 
 class VideoViewingSerializer(serializers.ModelSerializer):
@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog_cache import bump_catalog_version
+from .models import Genre, Video
+from .search import index_video, unindex_video
+from .stream_cache import stream_file_cache
+from .suggestions import title_index
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_stream_files(sender, instance, **kwargs):
+    """
+    Drops the cached stream files of a video when it is saved or deleted.
+
+    Saving covers the end of a conversion as well, since
+    store_conversion_results saves the video with its new renditions.
+    """
+    stream_file_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_catalog(sender, instance, **kwargs):
+    """
+    Bumps the catalog version when a video or genre is saved or deleted.
+
+    This includes convert_video_task publishing the renditions of a video.
+    The bump waits for the transaction to commit, so no request can cache
+    the old catalog under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Video)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps the FTS5 search table in sync with a saved video on SQLite.
+
+    Saves that only touch other fields, e.g. the conversion results, are skipped.
+    """
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        index_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def remove_from_search_index(sender, instance, **kwargs):
+    """
+    Removes a deleted video from the FTS5 search table on SQLite.
+    """
+    unindex_video(instance.pk)
+
+
+@receiver(post_save, sender=Video)
+def update_title_index(sender, instance, **kwargs):
+    """
+    Applies a saved video's title to the in-process suggestion index after commit.
+    """
+    video_id, title = instance.pk, instance.title
+    transaction.on_commit(lambda: title_index.update(video_id, title))
+
+
+@receiver(post_delete, sender=Video)
+def remove_from_title_index(sender, instance, **kwargs):
+    """
+    Removes a deleted video from the in-process suggestion index after commit.
+    """
+    video_id = instance.pk
+    transaction.on_commit(lambda: title_index.remove(video_id))
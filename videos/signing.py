@@ -0,0 +1,132 @@
+import re
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SIGNATURE_SALT = 'videos.signing.media-url'
+THUMBNAIL_RESOLUTION = 'thumbnail'
+# One signature covers all playlists and segments of a video's HLS package,
+# and one the trickplay index and its sprite sheets.
+HLS_RESOLUTION = 'hls'
+TRICKPLAY_RESOLUTION = 'trickplay'
+SIGNATURE_PARAMS = ('user', 'expires', 'signature')
+PLAYLIST_URI_ATTRIBUTE_PATTERN = re.compile(r'URI="([^"]+)"')
+
+
+def get_media_signature(video_id, resolution_name, user_id, expires):
+    """
+    Computes the HMAC-SHA256 signature of a media URL.
+
+    The key is derived from settings.SECRET_KEY, so signatures can be
+    verified by every web process without shared state.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+        resolution_name (str): The resolution, or THUMBNAIL_RESOLUTION for the thumbnail.
+        user_id (int): The ID of the user the URL was issued to.
+        expires (int): The expiry time as a Unix timestamp.
+
+    Returns:
+        str: The hexadecimal signature.
+    """
+    value = f'{video_id}:{resolution_name}:{user_id}:{expires}'
+    return salted_hmac(SIGNATURE_SALT, value, algorithm='sha256').hexdigest()
+
+
+def sign_media_url(url, video_id, resolution_name, user_id, expires):
+    """
+    Appends the user, expiry and signature to a stream or thumbnail URL.
+
+    Args:
+        url (str): The URL of the stream or thumbnail endpoint.
+        video_id (int): The ID of the Video model instance.
+        resolution_name (str): The resolution, or THUMBNAIL_RESOLUTION for the thumbnail.
+        user_id (int): The ID of the user the URL is issued to.
+        expires (int): The expiry time as a Unix timestamp.
+
+    Returns:
+        str: The signed URL.
+    """
+    signature = get_media_signature(video_id, resolution_name, user_id, expires)
+    return f"{url}?{urlencode({'user': user_id, 'expires': expires, 'signature': signature})}"
+
+
+def is_media_signature_valid(query_params, video_id, resolution_name):
+    """
+    Verifies the signature of a stream or thumbnail request.
+
+    Only the query parameters are checked, so no database access is needed.
+    Always succeeds if settings.VIDEO_STREAM_SIGNATURE_REQUIRED is disabled.
+
+    Args:
+        query_params (QueryDict): The query parameters of the request.
+        video_id (int): The ID of the requested video.
+        resolution_name (str): The requested resolution, or THUMBNAIL_RESOLUTION.
+
+    Returns:
+        bool: True if the signature matches and has not expired.
+    """
+    if not settings.VIDEO_STREAM_SIGNATURE_REQUIRED:
+        return True
+    try:
+        user_id = int(query_params.get('user', ''))
+        expires = int(query_params.get('expires', ''))
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    expected = get_media_signature(video_id, resolution_name, user_id, expires)
+    return constant_time_compare(expected, query_params.get('signature', ''))
+
+
+def get_signature_query(query_params):
+    """
+    Returns the signature parameters of a signed request as a query string.
+
+    Args:
+        query_params (QueryDict): The query parameters of the request.
+
+    Returns:
+        str: The encoded "user", "expires" and "signature" parameters, or an
+             empty string if the request is not signed.
+    """
+    return urlencode({name: query_params[name] for name in SIGNATURE_PARAMS if name in query_params})
+
+
+def sign_relative_uri(uri, signature_query):
+    """
+    Appends the signature query to a URI, in front of its fragment.
+    """
+    if not signature_query:
+        return uri
+    uri, separator, fragment = uri.partition('#')
+    return f"{uri}{'&' if '?' in uri else '?'}{signature_query}{separator}{fragment}"
+
+
+def sign_playlist(content, signature_query):
+    """
+    Carries the signature of a playlist request into the URIs it references.
+
+    Signs every URI line of an HLS playlist and the URI attributes of its
+    tags (e.g. the init segment of #EXT-X-MAP), as well as the sprite URIs of
+    a WebVTT trickplay index, so the player's follow-up requests pass the
+    same signature check as the playlist itself.
+
+    Args:
+        content (str): The HLS playlist or WebVTT index.
+        signature_query (str): The query string returned by get_signature_query.
+
+    Returns:
+        str: The playlist with signed URIs.
+    """
+    if not signature_query:
+        return content
+    lines = []
+    for line in content.split('\n'):
+        if line.startswith('#EXT'):
+            line = PLAYLIST_URI_ATTRIBUTE_PATTERN.sub(lambda match: f'URI="{sign_relative_uri(match.group(1), signature_query)}"', line)
+        elif line and not line.startswith('#') and '-->' not in line and line != 'WEBVTT':
+            line = sign_relative_uri(line, signature_query)
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .streaming import stat_stream_file
+
+
+class StreamFileCache:
+    """
+    Bounded, thread-safe LRU cache of resolved stream files with a time to live.
+
+    Maps (video id, resolution) to the StreamFile of the rendition, i.e. its
+    absolute path, size, modification time and ETag, so repeated range
+    requests of a player need neither a Video query nor any stat calls.
+    Entries are dropped when the video is saved or deleted and when its
+    conversion finishes (see videos.signals). Processes that did not see the
+    change notice it when they serve the file, since the cached size and
+    modification time are compared with the opened file (see
+    videos.streaming.check_stream_file), and otherwise once the entry's time
+    to live has expired.
+    """
+
+    def __init__(self, max_entries, ttl):
+        """
+        Args:
+            max_entries (int): The number of entries kept before the least
+                               recently used one is evicted.
+            ttl (float): The number of seconds an entry stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, video_id, resolution_name):
+        """
+        Returns the cached stream file, or None if it is missing or expired.
+        """
+        key = (video_id, resolution_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stream_file, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return stream_file
+
+    def store(self, video_id, resolution_name, file_path):
+        """
+        Stats a resolved file and caches it.
+
+        Args:
+            video_id (int): The ID of the Video model instance.
+            resolution_name (str): The resolution, or None for the uploaded file.
+            file_path (str): The absolute path of the file.
+
+        Returns:
+            StreamFile: The path and validators of the file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        stream_file = stat_stream_file(file_path)
+        with self.lock:
+            self.entries[(video_id, resolution_name)] = (stream_file, time.monotonic() + self.ttl)
+            self.entries.move_to_end((video_id, resolution_name))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return stream_file
+
+    def invalidate(self, video_id):
+        """
+        Drops every cached resolution of a video.
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == video_id]:
+                del self.entries[key]
+
+    def clear(self):
+        """
+        Drops all entries.
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+stream_file_cache = StreamFileCache(settings.VIDEO_STREAM_CACHE_MAX_ENTRIES, settings.VIDEO_STREAM_CACHE_TTL)
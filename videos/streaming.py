@@ -0,0 +1,585 @@
+import asyncio
+import functools
+import os
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from .head_cache import head_cache
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# More ranges than this in one request are ignored and the whole file is sent,
+# so a client cannot make the server seek and frame thousands of tiny parts.
+MAX_RANGES = 16
+# The values of settings.VIDEO_OFFLOAD_MODE that hand files to the reverse proxy.
+OFFLOAD_MODES = ('x-accel-redirect', 'x-sendfile')
+
+
+# Prefix of the names of the threads that run the blocking file operations of
+# the asynchronous views.
+MEDIA_IO_THREAD_PREFIX = 'media-io'
+
+media_io_lock = threading.Lock()
+media_io_executor = None
+
+
+# The validators of a file that is about to be served: its absolute path,
+# size in bytes, modification time in nanoseconds and strong ETag.
+StreamFile = namedtuple('StreamFile', ['path', 'size', 'mtime_ns', 'etag'])
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Raised when a Range header is valid but none of its ranges overlaps the file.
+    """
+
+
+class StaleStreamFile(Exception):
+    """
+    Raised when a file no longer matches the validators it was about to be served with.
+    """
+
+
+class FileRange:
+    """
+    File-like view of one byte range of an open file.
+
+    Passed to FileResponse so WSGI servers with a sendfile-capable
+    wsgi.file_wrapper (e.g. gunicorn) send the range straight from the page
+    cache: they take the descriptor from fileno(), the offset from its current
+    position and the length from Content-Length. Servers without a file
+    wrapper fall back to read(), which never returns bytes past the range.
+    """
+
+    def __init__(self, file, start, length):
+        """
+        Args:
+            file (file): The file, opened in binary mode.
+            start (int): The first byte of the range.
+            length (int): The number of bytes in the range.
+        """
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes without crossing the end of the range.
+        """
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b''
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        """
+        Returns the descriptor of the underlying file for sendfile.
+        """
+        return self.file.fileno()
+
+    def close(self):
+        """
+        Closes the underlying file.
+        """
+        self.file.close()
+
+
+def get_file_etag(stat_result):
+    """
+    Returns a strong ETag for a file from its modification time and size.
+
+    Renditions and thumbnails are only ever replaced with an atomic rename,
+    so a changed file always gets a new modification time and therefore a
+    new ETag, which makes the validator safe to use with If-Range.
+
+    Args:
+        stat_result (os.stat_result): The result of os.stat for the file.
+
+    Returns:
+        str: The quoted ETag, e.g. '"17c9f3a2b1e-5f5e100"'.
+    """
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def stat_stream_file(file_path):
+    """
+    Reads the size, modification time and ETag of a file.
+
+    Args:
+        file_path (str): The absolute path of the file.
+
+    Returns:
+        StreamFile: The path and validators of the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    stat_result = os.stat(file_path)
+    return StreamFile(file_path, stat_result.st_size, stat_result.st_mtime_ns, get_file_etag(stat_result))
+
+
+def check_stream_file(stream_file):
+    """
+    Opens a file and checks that it still matches already known validators.
+
+    Validators cached by another process, e.g. before a re-conversion
+    replaced the rendition, would send the old Content-Length and ETag with
+    the bytes of the new file. The check costs one open and fstat.
+
+    Args:
+        stream_file (StreamFile): The known path and validators of the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        StaleStreamFile: If the size or modification time of the file differ.
+    """
+    with open(stream_file.path, 'rb') as file:
+        stat_result = os.fstat(file.fileno())
+    if (stat_result.st_size, stat_result.st_mtime_ns) != (stream_file.size, stream_file.mtime_ns):
+        raise StaleStreamFile(stream_file.path)
+
+
+def parse_byte_range(range_header, file_size):
+    """
+    Parses the HTTP Range header into the byte ranges to send.
+
+    Supports single and multiple ranges, open-ended ranges ("500-") and
+    suffix ranges ("-500"). Ranges are clamped to the file size; ranges that
+    start beyond the end of the file are dropped.
+
+    Args:
+        range_header (str): The HTTP Range header string.
+        file_size (int): The size of the requested file in bytes.
+
+    Returns:
+        list: Tuples of the inclusive start and end byte of each range, or None
+              if the header is malformed, uses another unit or has too many
+              ranges, in which case it must be ignored.
+
+    Raises:
+        RangeNotSatisfiable: If the header is valid but no range can be served.
+    """
+    unit, _, range_set = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or not range_set.strip():
+        return None
+    specs = [spec.strip() for spec in range_set.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        start, separator, end = spec.partition('-')
+        start, end = start.strip(), end.strip()
+        if not separator or not (start or end):
+            return None
+        if (start and not start.isdigit()) or (end and not end.isdigit()):
+            return None
+        if not start:
+            suffix_length = int(end)
+            if suffix_length > 0 and file_size > 0:
+                ranges.append((max(0, file_size - suffix_length), file_size - 1))
+            continue
+        start = int(start)
+        end = int(end) if end else None
+        if end is not None and end < start:
+            return None
+        if start < file_size:
+            ranges.append((start, file_size - 1 if end is None else min(end, file_size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return ranges
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """
+    Evaluates an If-Range header against the current validators of a file.
+
+    Args:
+        if_range (str): The If-Range header, an entity tag or an HTTP date.
+        etag (str): The current strong ETag of the file.
+        last_modified (int): The modification time of the file as a timestamp.
+
+    Returns:
+        bool: True if the client's copy is current and the Range may be honoured.
+    """
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_file_range(file_path, start_byte, end_byte, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Generator function to yield file content in chunks.
+
+    Reads and yields chunks of the file, starting from start_byte up to and
+    including end_byte, in specified chunk sizes.
+
+    Args:
+        file_path (str): The absolute path of the file.
+        start_byte (int): The first byte to send.
+        end_byte (int): The last byte to send.
+        chunk_size (int, optional): The maximum size of one chunk.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start_byte)
+        bytes_to_read = end_byte - start_byte + 1
+
+        while bytes_to_read > 0:
+            chunk = file.read(min(chunk_size, bytes_to_read))
+            if not chunk:
+                break
+            yield chunk
+            bytes_to_read -= len(chunk)
+
+
+def read_multipart_ranges(file_path, ranges, file_size, content_type, boundary):
+    """
+    Generator function to yield a multipart/byteranges body.
+
+    Args:
+        file_path (str): The absolute path of the file.
+        ranges (list): Tuples of the inclusive start and end byte of each part.
+        file_size (int): The size of the file in bytes.
+        content_type (str): The content type of the file.
+        boundary (str): The multipart boundary.
+    """
+    for start, end in ranges:
+        yield get_part_header(boundary, content_type, start, end, file_size)
+        yield from read_file_range(file_path, start, end)
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode()
+
+
+def get_media_io_executor():
+    """
+    Returns the thread pool that runs the blocking file operations of the
+    asynchronous views.
+
+    The pool is created on first use with VIDEO_ASYNC_IO_THREADS threads and
+    shared by all requests, so the number of threads doing disk I/O stays
+    fixed however many clients are connected. Operations beyond that wait in
+    the pool's queue, which slows the affected responses down instead of
+    starting more threads.
+    """
+    global media_io_executor
+    with media_io_lock:
+        if media_io_executor is None:
+            media_io_executor = ThreadPoolExecutor(
+                max_workers=settings.VIDEO_ASYNC_IO_THREADS, thread_name_prefix=MEDIA_IO_THREAD_PREFIX
+            )
+        return media_io_executor
+
+
+async def arun_media_io(function, *args):
+    """
+    Runs a blocking file operation in the media I/O pool and returns its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_media_io_executor(), functools.partial(function, *args))
+
+
+async def aread_file_range(file_path, start_byte, end_byte, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Asynchronous generator function to yield file content in chunks.
+
+    Every read runs in the media I/O pool (see get_media_io_executor) with
+    os.pread, so the loop is never blocked on disk I/O and no thread is held
+    between chunks. The next chunk is only read once the server has sent the previous
+    one, which applies the client's backpressure to the reads. If the client
+    disconnects, Django cancels the response and the file is closed without
+    reading further.
+
+    Args:
+        file_path (str): The absolute path of the file.
+        start_byte (int): The first byte to send.
+        end_byte (int): The last byte to send.
+        chunk_size (int, optional): The maximum size of one chunk.
+    """
+    file_descriptor = await arun_media_io(os.open, file_path, os.O_RDONLY)
+    try:
+        offset = start_byte
+        while offset <= end_byte:
+            chunk = await arun_media_io(os.pread, file_descriptor, min(chunk_size, end_byte - offset + 1), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+    finally:
+        os.close(file_descriptor)
+
+
+async def aread_multipart_ranges(file_path, ranges, file_size, content_type, boundary):
+    """
+    Asynchronous generator function to yield a multipart/byteranges body.
+
+    Args:
+        file_path (str): The absolute path of the file.
+        ranges (list): Tuples of the inclusive start and end byte of each part.
+        file_size (int): The size of the file in bytes.
+        content_type (str): The content type of the file.
+        boundary (str): The multipart boundary.
+    """
+    for start, end in ranges:
+        yield get_part_header(boundary, content_type, start, end, file_size)
+        async for chunk in aread_file_range(file_path, start, end):
+            yield chunk
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode()
+
+
+def get_part_header(boundary, content_type, start, end, file_size):
+    """
+    Returns the header of one part of a multipart/byteranges body.
+    """
+    return (
+        f'--{boundary}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n'
+    ).encode()
+
+
+def get_multipart_length(ranges, file_size, content_type, boundary):
+    """
+    Returns the exact length of a multipart/byteranges body in bytes.
+    """
+    length = len(f'--{boundary}--\r\n')
+    for start, end in ranges:
+        length += len(get_part_header(boundary, content_type, start, end, file_size)) + (end - start + 1) + 2
+    return length
+
+
+def stream_file_range(file_path, start, end, status, content_type, asynchronous=False):
+    """
+    Returns a response that sends the inclusive byte range start to end of a file.
+
+    With settings.VIDEO_STREAM_FILE_WRAPPER enabled, the open file is handed
+    to the server as a FileResponse so it can use wsgi.file_wrapper and
+    sendfile; the Python generator read_file_range is only used when the
+    setting is disabled. Asynchronous responses for ASGI always stream from
+    aread_file_range.
+
+    Args:
+        file_path (str): The absolute path of the file.
+        start (int): The first byte to send.
+        end (int): The last byte to send.
+        status (int): The HTTP status of the response.
+        content_type (str): The content type of the file.
+        asynchronous (bool, optional): Whether to stream with an asynchronous iterator.
+
+    Returns:
+        StreamingHttpResponse: The response, with Content-Length set.
+    """
+    if asynchronous:
+        response = StreamingHttpResponse(aread_file_range(file_path, start, end), status=status, content_type=content_type)
+    elif settings.VIDEO_STREAM_FILE_WRAPPER:
+        response = FileResponse(
+            FileRange(open(file_path, 'rb'), start, end - start + 1), status=status, content_type=content_type
+        )
+        response.block_size = STREAM_CHUNK_SIZE
+    else:
+        response = StreamingHttpResponse(read_file_range(file_path, start, end), status=status, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    return response
+
+
+def build_file_response(request, file_path, content_type, asynchronous=False, stream_file=None, hot_start=False):
+    """
+    Builds the response for a GET or HEAD request of a static media file.
+
+    Handles conditional requests (If-None-Match, If-Modified-Since and the
+    other preconditions via Django's get_conditional_response) and byte
+    ranges: no Range header or a failed If-Range yields 200 with the whole
+    file, one range yields 206 with Content-Range, several ranges yield 206
+    with a multipart/byteranges body, and an unsatisfiable Range yields 416.
+    A malformed Range header is ignored, as RFC 9110 requires. Whole files
+    and single ranges are sent with stream_file_range, so the server can use
+    sendfile; multipart bodies are always generated in Python. With
+    asynchronous set, the body is an asynchronous iterator for ASGI views.
+    With hot_start set and settings.VIDEO_HEAD_CACHE_ENABLED, a single range
+    that starts in the head or moov atom of the file is served from the
+    head cache. If the range extends past the cached bytes, the 206 is cut
+    short at them, as RFC 9110 allows, and the client requests the rest,
+    which is then sent with sendfile, instead of copying it through Python.
+
+    Args:
+        request (HttpRequest): The request.
+        file_path (str): The absolute path of the file to send.
+        content_type (str): The content type of the file.
+        asynchronous (bool, optional): Whether to stream with an asynchronous iterator.
+        stream_file (StreamFile, optional): The already known validators of the
+                                            file, e.g. from the stream file cache.
+                                            The file is stat'ed if omitted.
+        hot_start (bool, optional): Whether to use the head cache for the file.
+
+    Returns:
+        HttpResponse: The response.
+
+    Raises:
+        StaleStreamFile: If the file no longer matches the given stream_file.
+    """
+    if stream_file is None:
+        stream_file = stat_stream_file(file_path)
+    else:
+        check_stream_file(stream_file)
+    file_size = stream_file.size
+    etag = stream_file.etag
+    last_modified = stream_file.mtime_ns // 1000000000
+
+    conditional_response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional_response is not None:
+        conditional_response['ETag'] = etag
+        conditional_response['Last-Modified'] = http_date(last_modified)
+        return conditional_response
+
+    ranges = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range_matches(if_range, etag, last_modified)):
+        try:
+            ranges = parse_byte_range(range_header, file_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{file_size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    if ranges is None:
+        response = stream_file_range(file_path, 0, file_size - 1, 200, content_type, asynchronous)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        cached_bytes = None
+        if hot_start and settings.VIDEO_HEAD_CACHE_ENABLED:
+            cached_bytes = head_cache.read(stream_file, start, end)
+        if cached_bytes:
+            end = start + len(cached_bytes) - 1
+            response = HttpResponse(cached_bytes, status=206, content_type=content_type)
+            response['Content-Length'] = str(len(cached_bytes))
+        else:
+            response = stream_file_range(file_path, start, end, 206, content_type, asynchronous)
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+    else:
+        boundary = uuid.uuid4().hex
+        read_parts = aread_multipart_ranges if asynchronous else read_multipart_ranges
+        response = StreamingHttpResponse(
+            read_parts(file_path, ranges, file_size, content_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}'
+        )
+        response['Content-Length'] = str(get_multipart_length(ranges, file_size, content_type, boundary))
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def validate_offload_mode():
+    """
+    Checks that settings.VIDEO_OFFLOAD_MODE is empty or one of OFFLOAD_MODES.
+
+    Called when the app is loaded (see VideosConfig.ready), so a mistyped
+    mode stops the process from starting instead of failing every media
+    request.
+
+    Raises:
+        ImproperlyConfigured: If the mode is unknown.
+    """
+    mode = settings.VIDEO_OFFLOAD_MODE
+    if mode and mode not in OFFLOAD_MODES:
+        raise ImproperlyConfigured(
+            f"Unknown VIDEO_OFFLOAD_MODE: '{mode}'. Use one of {', '.join(OFFLOAD_MODES)} or leave it empty."
+        )
+
+
+def build_offload_response(file_path, content_type):
+    """
+    Builds a response that lets the reverse proxy send a media file itself.
+
+    With settings.VIDEO_OFFLOAD_MODE set to "x-accel-redirect" the response
+    carries the file's path below settings.VIDEO_OFFLOAD_INTERNAL_PREFIX, which
+    nginx maps to MEDIA_ROOT in an internal location. With "x-sendfile" it
+    carries the absolute path for Apache's mod_xsendfile or lighttpd. The
+    proxy then handles ranges and conditional requests on its own.
+
+    Args:
+        file_path (str): The absolute path of the file to send.
+        content_type (str): The content type of the file.
+
+    Returns:
+        HttpResponse: The empty response with the offload header, or None if
+                      offloading is disabled or the file is outside MEDIA_ROOT.
+    """
+    mode = settings.VIDEO_OFFLOAD_MODE
+    if not mode:
+        return None
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    file_path = os.path.abspath(file_path)
+    if os.path.commonpath([media_root, file_path]) != media_root:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        relative_path = os.path.relpath(file_path, media_root).replace('\\', '/')
+        response['X-Accel-Redirect'] = settings.VIDEO_OFFLOAD_INTERNAL_PREFIX.rstrip('/') + '/' + quote(relative_path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = file_path
+    else:
+        validate_offload_mode()
+    return response
+
+
+def serve_media_file(request, file_path, content_type, asynchronous=False, stream_file=None, hot_start=False):
+    """
+    Serves a media file after the view has authorized the request and resolved the path.
+
+    Hands the file to the reverse proxy if an offload mode is configured,
+    otherwise serves it from Django with build_file_response.
+
+    Args:
+        request (HttpRequest): The request.
+        file_path (str): The absolute path of the file to send.
+        content_type (str): The content type of the file.
+        asynchronous (bool, optional): Whether to stream with an asynchronous iterator.
+        stream_file (StreamFile, optional): The already known validators of the file.
+        hot_start (bool, optional): Whether to use the head cache for the file.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    return (
+        build_offload_response(file_path, content_type)
+        or build_file_response(request, file_path, content_type, asynchronous, stream_file, hot_start)
+    )
+
+
+async def aserve_media_file(request, file_path, content_type, stream_file=None, hot_start=False):
+    """
+    Serves a media file from an asynchronous view.
+
+    The response is built in the media I/O pool, since it has to stat the
+    file or check known validators against it, so the event loop is not
+    blocked. The body is streamed with asynchronous reads.
+
+    Args:
+        request (HttpRequest): The request.
+        file_path (str): The absolute path of the file to send.
+        content_type (str): The content type of the file.
+        stream_file (StreamFile, optional): The already known validators of the file.
+        hot_start (bool, optional): Whether to use the head cache for the file.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    return await sync_to_async(serve_media_file, thread_sensitive=False, executor=get_media_io_executor())(
+        request, file_path, content_type, True, stream_file, hot_start
+    )
@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+import unicodedata
+from django.conf import settings
+from .models import Video
+
+
+def normalize_title(text):
+    """
+    Returns the form of a title or query that prefixes are compared in.
+
+    Case and accents are ignored, so "über" finds "Über" and "uber".
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+class SortedKeys:
+    """
+    Sorted array of (key, video id) pairs, searchable by key prefix with bisect.
+
+    Keys and ids are kept in two parallel lists, so a lookup bisects a plain
+    list of strings and returns as soon as the range of matching keys ends.
+    """
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, video_id in pairs]
+        self.video_ids = [video_id for key, video_id in pairs]
+
+    def add(self, key, video_id):
+        index = bisect.bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key and self.video_ids[index] < video_id:
+            index += 1
+        self.keys.insert(index, key)
+        self.video_ids.insert(index, video_id)
+
+    def remove(self, key, video_id):
+        index = bisect.bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.video_ids[index] == video_id:
+                del self.keys[index]
+                del self.video_ids[index]
+                return
+            index += 1
+
+    def find(self, prefix, limit, exclude=()):
+        """
+        Returns up to limit ids whose key starts with prefix, in key order.
+        """
+        video_ids = []
+        index = bisect.bisect_left(self.keys, prefix)
+        while len(video_ids) < limit and index < len(self.keys) and self.keys[index].startswith(prefix):
+            video_id = self.video_ids[index]
+            if video_id not in exclude and video_id not in video_ids:
+                video_ids.append(video_id)
+            index += 1
+        return video_ids
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class TitlePrefixIndex:
+    """
+    In-process prefix index of all video titles for search-as-you-type.
+
+    Titles whose beginning matches the typed prefix are suggested first, in
+    alphabetical order, followed by titles with a later word starting with
+    it. Lookups bisect two sorted arrays and cost O(log n + k) without any
+    database access. All request threads share the index; a lock protects
+    the arrays, which are only held for the few microseconds of a lookup or
+    update.
+
+    The index is built from the database on first use. Saved and deleted
+    videos are applied incrementally by videos.signals once their
+    transaction commits. Processes that did not see the change pick it up
+    when the index is rebuilt after settings.VIDEO_SUGGEST_INDEX_TTL seconds;
+    a rebuild runs in one request thread while the others keep using the
+    current arrays. Changes that arrive while the rebuild reads the database
+    are recorded and applied again to the new arrays when they are swapped
+    in, since the snapshot may have been taken before they were committed.
+    """
+
+    def __init__(self, ttl):
+        """
+        Args:
+            ttl (float): The number of seconds after which the index is rebuilt.
+        """
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.build_finished = threading.Condition(self.lock)
+        self.titles = None
+        self.title_keys = SortedKeys()
+        self.word_keys = SortedKeys()
+        self.built_at = None
+        self.rebuilding = False
+        self.pending_changes = None
+
+    def build(self, titles):
+        """
+        Replaces the index with the given titles.
+
+        Changes recorded since the rebuild started are applied to the new
+        arrays under the same lock as the swap, so no update is lost.
+
+        Args:
+            titles (iterable): Pairs of video id and title.
+        """
+        titles = dict(titles)
+        title_pairs, word_pairs = [], []
+        for video_id, title in titles.items():
+            title_key, word_keys = self.get_keys(title)
+            title_pairs.append((title_key, video_id))
+            word_pairs.extend((word_key, video_id) for word_key in word_keys)
+        title_keys, word_keys = SortedKeys(title_pairs), SortedKeys(word_pairs)
+        with self.lock:
+            self.titles, self.title_keys, self.word_keys = titles, title_keys, word_keys
+            for video_id, title in (self.pending_changes or {}).items():
+                self.apply(video_id, title)
+            self.pending_changes = None
+            self.built_at = time.monotonic()
+
+    def get_keys(self, title):
+        """
+        Returns the key of the whole title and the keys starting at each later word.
+        """
+        title_key = normalize_title(title)
+        words = title_key.split(' ')
+        return title_key, [' '.join(words[index:]) for index in range(1, len(words))]
+
+    def ensure_current(self):
+        """
+        Builds the index from the database if it was never built or has expired.
+
+        Only one thread builds at a time, so a single builder owns the
+        recorded changes. While an expired index is rebuilt, other threads
+        keep using it; before the first build they wait for it to finish.
+        """
+        with self.lock:
+            expired = self.built_at is None or time.monotonic() - self.built_at > self.ttl
+            if not expired:
+                return
+            if self.rebuilding:
+                while self.rebuilding and self.built_at is None:
+                    self.build_finished.wait()
+                return
+            self.rebuilding = True
+            self.pending_changes = {}
+        try:
+            self.build(Video.objects.values_list('id', 'title').iterator())
+        finally:
+            with self.lock:
+                self.rebuilding = False
+                self.pending_changes = None
+                self.build_finished.notify_all()
+
+    def update(self, video_id, title):
+        """
+        Adds a video or replaces its title. Does nothing before the first build
+        unless a build is running.
+        """
+        self.change(video_id, title)
+
+    def remove(self, video_id):
+        """
+        Removes a video. Does nothing before the first build unless a build is running.
+        """
+        self.change(video_id, None)
+
+    def change(self, video_id, title):
+        """
+        Applies a new title, or None for a removal, and records it for a
+        rebuild in progress.
+        """
+        with self.lock:
+            if self.pending_changes is not None:
+                self.pending_changes[video_id] = title
+            if self.titles is not None:
+                self.apply(video_id, title)
+
+    def apply(self, video_id, title):
+        """
+        Replaces the keys and title of a video, or removes them if title is
+        None. Must be called with the lock held.
+        """
+        self.discard(video_id)
+        if title is None:
+            return
+        self.titles[video_id] = title
+        title_key, word_keys = self.get_keys(title)
+        self.title_keys.add(title_key, video_id)
+        for word_key in word_keys:
+            self.word_keys.add(word_key, video_id)
+
+    def discard(self, video_id):
+        """
+        Removes the keys and title of a video. Must be called with the lock held.
+        """
+        title = self.titles.pop(video_id, None)
+        if title is None:
+            return
+        title_key, word_keys = self.get_keys(title)
+        self.title_keys.remove(title_key, video_id)
+        for word_key in word_keys:
+            self.word_keys.remove(word_key, video_id)
+
+    def suggest(self, text, limit):
+        """
+        Returns the videos whose title or one of its words starts with text.
+
+        Args:
+            text (str): The typed text.
+            limit (int): The maximum number of suggestions.
+
+        Returns:
+            list: Dicts with the id and title of each suggested video, best first.
+        """
+        prefix = normalize_title(text)
+        if not prefix:
+            return []
+        with self.lock:
+            video_ids = self.title_keys.find(prefix, limit)
+            if len(video_ids) < limit:
+                video_ids += self.word_keys.find(prefix, limit - len(video_ids), exclude=set(video_ids))
+            return [{'id': video_id, 'title': self.titles[video_id]} for video_id in video_ids]
+
+    def clear(self):
+        """
+        Drops the index, so the next lookup rebuilds it.
+        """
+        with self.lock:
+            self.titles = None
+            self.title_keys, self.word_keys = SortedKeys(), SortedKeys()
+            self.built_at = None
+
+
+title_index = TitlePrefixIndex(settings.VIDEO_SUGGEST_INDEX_TTL)
@@ -1,20 +1,52 @@
-from celery import shared_task
-import subprocess
+from celery import shared_task, chord
 import os
-import uuid
+import shutil
 from django.conf import settings
 from .models import Video
-from .utils import sanitize_filename
+from .checkpoints import get_partial_path, get_pending_renditions, start_renditions, complete_rendition, fail_renditions
+from .head_cache import head_cache
+from .progress import ProgressReporter, start_progress, publish_segment_done
+from .transcoding import (
+    RESOLUTIONS, THUMBNAIL_FILENAME, get_output_dir, get_rendition_url, get_thumbnail_name,
+    probe_video, build_rendition_ladder, get_rendition, get_thumbnail_offset,
+    build_rendition_command, build_thumbnail_command, build_single_decode_command, run_ffmpeg,
+    get_segment_dir, build_segment_split_command, list_source_segments, build_segment_transcode_command,
+    write_concat_list, build_concat_command, get_hls_dir, get_package_dir, remove_stale_packages,
+    build_hls_package_command, build_probe_command, parse_probe_output, parse_stream_info, write_master_playlist,
+    get_rendition_path, TRICKPLAY_INDEX, get_trickplay_dir, get_trickplay_tile_height, build_trickplay_command, write_trickplay_index,
+)
 
-@shared_task
+@shared_task(acks_late=True, reject_on_worker_lost=True)
 def convert_video_task(video_id):
     """
     Converts a video to multiple resolutions and generates a thumbnail.
 
     This Celery task processes a video file specified by its video_id.
-    It uses FFmpeg to convert the video into different resolutions (120p, 360p, 720p, 1080p)
-    and generates a thumbnail image from the video. The converted videos and thumbnail
-    are saved in the media storage, and their URLs are stored in the Video model.
+    It first probes the source with ffprobe and stores its metadata on the
+    Video model. It then uses FFmpeg to convert the video into the resolutions
+    of the rendition ladder (120p, 360p, 720p, 1080p) that do not exceed the
+    source height, and generates a thumbnail image from the video. The converted
+    videos and thumbnail are saved in the media storage, and their URLs are
+    stored in the Video model.
+
+    The strategy is selected by settings.VIDEO_TRANSCODE_STRATEGY:
+    "single_decode" decodes the source once and writes all renditions and the
+    thumbnail from one FFmpeg process, "sequential" runs one FFmpeg process per
+    rendition plus one for the thumbnail, and "parallel" dispatches every
+    rendition and the thumbnail as separate subtasks in a Celery chord so they
+    can run on different workers at the same time. "segmented" additionally
+    splits the source at keyframes into chunks of settings.VIDEO_SEGMENT_DURATION
+    seconds and transcodes every chunk of every rendition as its own subtask;
+    concat_segments_task joins the chunks afterwards.
+
+    Progress is checkpointed per rendition in RenditionJob. Renditions that a
+    previous run finished and that are still intact on disk are skipped, and
+    outputs are written to temporary names and renamed once complete. The
+    task is acknowledged late, so it is redelivered if a worker is killed;
+    the broker's visibility_timeout (settings.CELERY_BROKER_TRANSPORT_OPTIONS)
+    must exceed the longest transcode, or it is redelivered while running.
+    The progress of every rendition is published to the cache (see
+    videos.progress) while FFmpeg runs.
 
     Args:
         video_id (int): The ID of the Video model instance to be converted.
@@ -25,57 +57,447 @@ def convert_video_task(video_id):
     """
     video = Video.objects.get(pk=video_id)
     video_path = video.video_file.path
+    metadata = probe_video(video_path)
+    for field, value in metadata.items():
+        setattr(video, field, value)
+    video.save(update_fields=list(metadata))
+    ladder = build_rendition_ladder(video)
+    start_progress(video_id, [rendition[0] for rendition in ladder])
+
+    if settings.VIDEO_TRANSCODE_STRATEGY == 'parallel':
+        header = [transcode_rendition_task.s(video_id, resolution_name) for resolution_name, height, max_bitrate in ladder]
+        header.append(generate_thumbnail_task.s(video_id))
+        chord(header)(finalize_conversion_task.s(video_id))
+        return
 
-    original_filename_without_extension = os.path.splitext(os.path.basename(video.video_file.name))[0]
-    sanitized_filename = sanitize_filename(original_filename_without_extension)
-    video_folder_name = f"{video.id}_{sanitized_filename}"
-    output_base_dir = os.path.join(settings.MEDIA_ROOT, 'videos', video_folder_name)
-    os.makedirs(output_base_dir, exist_ok=True)
-    resolutions = {
-        "120p": "120p.mp4",
-        "360p": "360p.mp4",
-        "720p": "720p.mp4",
-        "1080p": "1080p.mp4",
+    output_base_dir = get_output_dir(video)
+    output_paths = {
+        resolution_name: os.path.join(output_base_dir, RESOLUTIONS[resolution_name])
+        for resolution_name, height, max_bitrate in ladder
     }
-    converted_resolutions_urls = {}
-    for resolution_name, output_filename in resolutions.items():
-        output_path = os.path.join(output_base_dir, output_filename)
-        command = [
-            'ffmpeg',
-            '-i', video_path,
-            '-vf', f'scale=trunc(oh*a/2)*2:{resolution_name[:-1]}',
-            '-c:v', 'libx264',
-            '-preset', 'slow',
-            '-crf', '22',
-            '-c:a', 'aac',
-            '-b:a', '128k',
-            output_path
+    pending = get_pending_renditions(video, ladder, output_paths)
+    pending_names = [rendition[0] for rendition in pending]
+
+    if settings.VIDEO_TRANSCODE_STRATEGY == 'segmented':
+        segment_dir = get_segment_dir(output_base_dir)
+        if pending:
+            run_ffmpeg(build_segment_split_command(video_path, segment_dir, settings.VIDEO_SEGMENT_DURATION), "segmentation")
+            start_renditions(video, pending_names)
+        segment_filenames = list_source_segments(segment_dir)
+        header = [
+            transcode_segment_task.s(video_id, resolution_name, segment_filename)
+            for resolution_name, height, max_bitrate in pending
+            for segment_filename in segment_filenames
         ]
-        try:
-            result = subprocess.run(command, capture_output=True, text=True, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg conversion failed for resolution {resolution_name}:")
-            print(f"Command: {' '.join(command)}")
-            print(f"Return Code: {e.returncode}")
-            print(f"Stdout: {e.stdout}")
-            print(f"Stderr: {e.stderr}")
-            raise e
-
-
-        relative_url = os.path.join(settings.MEDIA_URL, 'videos', video_folder_name, output_filename).replace('\\', '/')
-        converted_resolutions_urls[resolution_name] = relative_url
-    thumbnail_filename = 'thumbnail.jpg'
-    thumbnail_path = os.path.join(output_base_dir, thumbnail_filename)
-    thumbnail_command = [
-        'ffmpeg',
-        '-i', video_path,
-        '-ss', '00:00:30',
-        '-vframes', '1',
-        '-vf', 'scale=320:-1',
-        thumbnail_path
+        header.append(generate_thumbnail_task.s(video_id))
+        chord(header)(concat_segments_task.s(video_id))
+        return
+
+    thumbnail_path = os.path.join(output_base_dir, THUMBNAIL_FILENAME)
+    thumbnail_offset = get_thumbnail_offset(video)
+
+    if settings.VIDEO_TRANSCODE_STRATEGY == 'single_decode':
+        needs_thumbnail = not os.path.exists(thumbnail_path)
+        if pending or needs_thumbnail:
+            outputs = [
+                (height, max_bitrate, get_partial_path(output_paths[resolution_name]))
+                for resolution_name, height, max_bitrate in pending
+            ]
+            command = build_single_decode_command(
+                video_path, outputs, get_partial_path(thumbnail_path) if needs_thumbnail else None, thumbnail_offset
+            )
+            start_renditions(video, pending_names)
+            try:
+                run_ffmpeg(
+                    command, f"resolutions {', '.join(pending_names)}",
+                    on_progress=ProgressReporter(video.id, pending_names, video.duration)
+                )
+            except Exception as e:
+                fail_renditions(video, pending_names, e)
+                raise
+            for resolution_name in pending_names:
+                complete_rendition(video, resolution_name, output_paths[resolution_name])
+            if needs_thumbnail:
+                os.replace(get_partial_path(thumbnail_path), thumbnail_path)
+    else:
+        for resolution_name, height, max_bitrate in pending:
+            transcode_rendition(video, resolution_name, height, max_bitrate, output_paths[resolution_name])
+        generate_thumbnail(video, thumbnail_path)
+
+    results = [
+        {'resolution': resolution_name, 'url': get_rendition_url(video, RESOLUTIONS[resolution_name])}
+        for resolution_name, height, max_bitrate in ladder
     ]
-    subprocess.run(thumbnail_command, capture_output=True, text=True, check=True)
-    thumbnail_relative_url = os.path.join('videos', video_folder_name, thumbnail_filename).replace('\\', '/')
-    video.resolutions = converted_resolutions_urls
-    video.thumbnail = thumbnail_relative_url
-    video.save()
\ No newline at end of file
+    results.append({'thumbnail': get_thumbnail_name(video)})
+    store_conversion_results(video, results)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def transcode_rendition_task(video_id, resolution_name):
+    """
+    Converts a video into a single resolution.
+
+    Used as one branch of the chord started by convert_video_task in the
+    "parallel" strategy. The result is collected by finalize_conversion_task.
+    A rendition that is already complete and verified is not transcoded again.
+
+    Args:
+        video_id (int): The ID of the Video model instance to be converted.
+        resolution_name (str): The resolution to create, e.g. "720p".
+
+    Returns:
+        dict: The resolution name and the URL of the converted file.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg conversion fails.
+    """
+    video = Video.objects.get(pk=video_id)
+    rendition = get_rendition(video, resolution_name)
+    output_filename = RESOLUTIONS[resolution_name]
+    output_path = os.path.join(get_output_dir(video), output_filename)
+    if get_pending_renditions(video, [rendition], {resolution_name: output_path}):
+        transcode_rendition(video, *rendition, output_path)
+    return {'resolution': resolution_name, 'url': get_rendition_url(video, output_filename)}
+
+
+@shared_task
+def generate_thumbnail_task(video_id):
+    """
+    Generates the thumbnail of a video.
+
+    Used as one branch of the chord started by convert_video_task in the
+    "parallel" strategy.
+
+    Args:
+        video_id (int): The ID of the Video model instance.
+
+    Returns:
+        dict: The thumbnail path relative to MEDIA_ROOT.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg thumbnail extraction fails.
+    """
+    video = Video.objects.get(pk=video_id)
+    generate_thumbnail(video, os.path.join(get_output_dir(video), THUMBNAIL_FILENAME))
+    return {'thumbnail': get_thumbnail_name(video)}
+
+
+@shared_task
+def finalize_conversion_task(results, video_id):
+    """
+    Stores the results of a parallel conversion on the Video model.
+
+    Runs as the body of the chord, i.e. only after every rendition and the
+    thumbnail have been created successfully. If any subtask fails, Celery
+    does not call this task and the video stays unpublished.
+
+    Args:
+        results (list): The return values of the chord's subtasks.
+        video_id (int): The ID of the Video model instance.
+    """
+    store_conversion_results(Video.objects.get(pk=video_id), results)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def transcode_segment_task(video_id, resolution_name, segment_filename):
+    """
+    Converts one source segment of a video into a single resolution.
+
+    Used as one branch of the chord started by convert_video_task in the
+    "segmented" strategy. Segments that an earlier run already transcoded are
+    kept, so a retried conversion only redoes the missing ones.
+
+    Args:
+        video_id (int): The ID of the Video model instance to be converted.
+        resolution_name (str): The resolution to create, e.g. "720p".
+        segment_filename (str): The file name of the source segment.
+
+    Returns:
+        dict: The resolution name and the file name of the transcoded segment.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg conversion fails.
+    """
+    video = Video.objects.get(pk=video_id)
+    resolution_name, height, max_bitrate = get_rendition(video, resolution_name)
+    segment_dir = get_segment_dir(get_output_dir(video))
+    rendition_segment_dir = os.path.join(segment_dir, resolution_name)
+    os.makedirs(rendition_segment_dir, exist_ok=True)
+    output_filename = os.path.splitext(segment_filename)[0] + '.mp4'
+    output_path = os.path.join(rendition_segment_dir, output_filename)
+    if not os.path.exists(output_path):
+        command = build_segment_transcode_command(
+            os.path.join(segment_dir, segment_filename),
+            height,
+            get_partial_path(output_path),
+            max_bitrate
+        )
+        try:
+            run_ffmpeg(command, f"segment {segment_filename} of resolution {resolution_name}")
+        except Exception as e:
+            fail_renditions(video, [resolution_name], e)
+            raise
+        os.replace(get_partial_path(output_path), output_path)
+    publish_segment_done(video_id, resolution_name, len(list_source_segments(segment_dir)))
+    return {'resolution': resolution_name, 'segment': output_filename}
+
+
+@shared_task
+def concat_segments_task(results, video_id):
+    """
+    Joins the transcoded segments of every resolution and stores the result.
+
+    Runs as the body of the chord in the "segmented" strategy. The segments of
+    each resolution are concatenated without re-encoding, the audio is taken
+    from the source, and the intermediate segment files are removed.
+    Resolutions that were already complete before the run had no segments
+    and are published as they are.
+
+    Args:
+        results (list): The return values of the chord's subtasks.
+        video_id (int): The ID of the Video model instance.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg concatenation fails.
+    """
+    video = Video.objects.get(pk=video_id)
+    output_base_dir = get_output_dir(video)
+    segment_dir = get_segment_dir(output_base_dir)
+
+    segments = {}
+    for result in results:
+        if 'segment' in result:
+            segments.setdefault(result['resolution'], []).append(result['segment'])
+
+    outputs = []
+    converted_results = [result for result in results if 'thumbnail' in result]
+    for resolution_name, height, max_bitrate in build_rendition_ladder(video):
+        output_filename = RESOLUTIONS[resolution_name]
+        converted_results.append({'resolution': resolution_name, 'url': get_rendition_url(video, output_filename)})
+        if resolution_name not in segments:
+            continue
+        list_path = os.path.join(segment_dir, f'{resolution_name}.txt')
+        write_concat_list(list_path, [
+            os.path.join(segment_dir, resolution_name, segment_filename)
+            for segment_filename in sorted(segments[resolution_name])
+        ])
+        outputs.append((resolution_name, list_path, os.path.join(output_base_dir, output_filename)))
+
+    if outputs:
+        command = build_concat_command(
+            video.video_file.path,
+            [(list_path, get_partial_path(output_path)) for resolution_name, list_path, output_path in outputs]
+        )
+        try:
+            run_ffmpeg(command, "segment concatenation")
+        except Exception as e:
+            fail_renditions(video, [output[0] for output in outputs], e)
+            raise
+        for resolution_name, list_path, output_path in outputs:
+            complete_rendition(video, resolution_name, output_path)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    store_conversion_results(video, converted_results)
+
+
+def transcode_rendition(video, resolution_name, height, max_bitrate, output_path):
+    """
+    Transcodes one rendition in its own FFmpeg process and records its job state.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_name (str): The resolution to create, e.g. "720p".
+        height (int): The target height in pixels.
+        max_bitrate (int): The maximum video bitrate in kbit/s.
+        output_path (str): The final path of the rendition.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg conversion fails.
+    """
+    command = build_rendition_command(video.video_file.path, height, get_partial_path(output_path), max_bitrate)
+    start_renditions(video, [resolution_name])
+    try:
+        run_ffmpeg(
+            command, f"resolution {resolution_name}",
+            on_progress=ProgressReporter(video.id, [resolution_name], video.duration)
+        )
+    except Exception as e:
+        fail_renditions(video, [resolution_name], e)
+        raise
+    complete_rendition(video, resolution_name, output_path)
+
+
+def generate_thumbnail(video, thumbnail_path):
+    """
+    Extracts the thumbnail of a video unless it already exists.
+
+    Args:
+        video (Video): The Video instance.
+        thumbnail_path (str): The final path of the thumbnail.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg thumbnail extraction fails.
+    """
+    if os.path.exists(thumbnail_path):
+        return
+    partial_path = get_partial_path(thumbnail_path)
+    run_ffmpeg(build_thumbnail_command(video.video_file.path, partial_path, get_thumbnail_offset(video)), "thumbnail")
+    os.replace(partial_path, thumbnail_path)
+
+
+def store_conversion_results(video, results):
+    """
+    Packages the converted renditions and stores their URLs and the thumbnail on the video.
+
+    If settings.VIDEO_HLS_ENABLED is set, every rendition is packaged as HLS
+    before the video is saved, so a published video always has its playlists.
+    Likewise the trickplay sprites are rendered if settings.VIDEO_TRICKPLAY_ENABLED
+    is set. Once the video is saved, earlier HLS packages are deleted, and
+    with settings.VIDEO_HEAD_CACHE_ENABLED the heads of the new renditions
+    are prefetched.
+
+    Args:
+        video (Video): The Video instance.
+        results (list): Dicts with either a "resolution" and "url" or a "thumbnail" key.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg HLS packaging or trickplay rendering fails.
+    """
+    converted_resolutions_urls = {}
+    for result in results:
+        if 'thumbnail' in result:
+            video.thumbnail = result['thumbnail']
+        else:
+            converted_resolutions_urls[result['resolution']] = result['url']
+    video.resolutions = {
+        resolution_name: converted_resolutions_urls[resolution_name]
+        for resolution_name in RESOLUTIONS if resolution_name in converted_resolutions_urls
+    }
+    if settings.VIDEO_HLS_ENABLED:
+        video.hls_playlist = package_hls(video, list(video.resolutions))
+    if settings.VIDEO_TRICKPLAY_ENABLED:
+        video.trickplay_index = generate_trickplay(video, list(video.resolutions))
+    video.save()
+    output_base_dir = get_output_dir(video)
+    if settings.VIDEO_HLS_ENABLED:
+        remove_unreferenced_packages(get_hls_dir(output_base_dir), 'hls_playlist')
+    if settings.VIDEO_TRICKPLAY_ENABLED:
+        remove_unreferenced_packages(get_trickplay_dir(output_base_dir), 'trickplay_index')
+    if settings.VIDEO_HEAD_CACHE_ENABLED:
+        for rendition_url in video.resolutions.values():
+            head_cache.prefetch(get_rendition_path(rendition_url))
+
+
+def remove_unreferenced_packages(parent_dir, field_name):
+    """
+    Deletes the packages of an HLS or trickplay directory that no video refers to.
+
+    Re-uploads of the same content copy the paths of the original's packages
+    (see VideoUploadView), so a package is kept while any video still points
+    into it, not only the video that was just converted.
+
+    Args:
+        parent_dir (str): The HLS or trickplay directory of the video.
+        field_name (str): The Video field with the path of a file inside a package.
+    """
+    if not os.path.isdir(parent_dir):
+        return
+    relative_dir = os.path.relpath(parent_dir, settings.MEDIA_ROOT).replace('\\', '/')
+    referenced_paths = Video.objects.filter(**{f'{field_name}__startswith': f'{relative_dir}/'}).values_list(field_name, flat=True)
+    remove_stale_packages(parent_dir, [os.path.dirname(os.path.join(settings.MEDIA_ROOT, path)) for path in referenced_paths])
+
+
+def package_hls(video, resolution_names):
+    """
+    Packages the converted renditions of a video as HLS and writes the master playlist.
+
+    Every packaging is written to a new version directory (see
+    get_package_dir), so re-converted videos never reuse the URLs of
+    cached playlists and segments. Each rendition is probed for the
+    RESOLUTION and CODECS attributes of the master playlist. Earlier
+    packages are removed by store_conversion_results once the video points
+    to the new one.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_names (list): The converted resolutions to package.
+
+    Returns:
+        str: The path of the master playlist relative to MEDIA_ROOT.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg HLS packaging fails.
+    """
+    output_base_dir = get_output_dir(video)
+    package_dir = get_package_dir(get_hls_dir(output_base_dir))
+    stream_infos = {}
+    for resolution_name in resolution_names:
+        rendition_path = os.path.join(output_base_dir, RESOLUTIONS[resolution_name])
+        playlist_dir = os.path.join(package_dir, resolution_name)
+        os.makedirs(playlist_dir)
+        command = build_hls_package_command(rendition_path, playlist_dir, settings.VIDEO_HLS_SEGMENT_DURATION)
+        run_ffmpeg(command, f"HLS packaging of resolution {resolution_name}")
+        stream_infos[resolution_name] = parse_stream_info(
+            run_ffmpeg(build_probe_command(rendition_path), f"probe of resolution {resolution_name}").stdout
+        )
+    master_playlist_path = write_master_playlist(package_dir, resolution_names, stream_infos)
+    return os.path.relpath(master_playlist_path, settings.MEDIA_ROOT).replace('\\', '/')
+
+
+def generate_trickplay(video, resolution_names):
+    """
+    Renders the trickplay sprite sheets of a video and writes their WebVTT index.
+
+    The frames are sampled from the smallest converted rendition, which is
+    much cheaper to decode than the source and still larger than a tile.
+    Everything is written to a temporary directory that is renamed to a new
+    version directory (see get_package_dir) once complete, so sprite URLs
+    never serve the sheets of another conversion. Earlier versions are
+    removed by store_conversion_results once the video points to the new one.
+
+    The cues of the index are derived from the duration. If the source probe
+    did not find one, the sampled rendition is probed; if its duration is
+    unknown or 0 as well, no trickplay is rendered, since the number of tiles
+    cannot be told apart from the black padding of the last sheet.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_names (list): The converted resolutions, smallest first.
+
+    Returns:
+        str: The path of the WebVTT index relative to MEDIA_ROOT, or an empty
+             string if the duration of the video is unknown. Earlier packages
+             are then removed by store_conversion_results as well.
+
+    Raises:
+        subprocess.CalledProcessError: If the FFmpeg rendering fails.
+    """
+    output_base_dir = get_output_dir(video)
+    if resolution_names:
+        source_path = os.path.join(output_base_dir, RESOLUTIONS[resolution_names[0]])
+    else:
+        source_path = video.video_file.path
+    trickplay_dir = get_trickplay_dir(output_base_dir)
+    duration = video.duration
+    if not duration:
+        duration = parse_probe_output(run_ffmpeg(build_probe_command(source_path), "trickplay probe").stdout)['duration']
+    if not duration:
+        return ''
+    package_dir = get_package_dir(trickplay_dir)
+    partial_dir = get_partial_path(package_dir)
+    os.makedirs(partial_dir)
+
+    interval = settings.VIDEO_TRICKPLAY_INTERVAL
+    tile_width = settings.VIDEO_TRICKPLAY_TILE_WIDTH
+    tile_height = get_trickplay_tile_height(video, tile_width)
+    columns = settings.VIDEO_TRICKPLAY_COLUMNS
+    rows = settings.VIDEO_TRICKPLAY_ROWS
+    image_format = settings.VIDEO_TRICKPLAY_FORMAT
+    command = build_trickplay_command(source_path, partial_dir, interval, tile_width, tile_height, columns, rows, image_format)
+    run_ffmpeg(command, "trickplay sprites")
+
+    write_trickplay_index(
+        os.path.join(partial_dir, TRICKPLAY_INDEX), duration, interval, tile_width, tile_height, columns, rows, image_format,
+        os.path.basename(package_dir)
+    )
+    os.replace(partial_dir, package_dir)
+    return os.path.relpath(os.path.join(package_dir, TRICKPLAY_INDEX), settings.MEDIA_ROOT).replace('\\', '/')
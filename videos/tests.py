@@ -1,9 +1,147 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import unquote
+from django.conf import settings
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import FileResponse
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import ProtectedError
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.contrib.auth import get_user_model
-from videos.models import Video, VideoViewing
+from rest_framework.test import APITestCase
+from PIL import Image
+from videos.models import Genre, Video, VideoViewing, RenditionJob
+from videos.tasks import convert_video_task, package_hls, generate_trickplay, store_conversion_results
+from videos.checkpoints import get_partial_path
+from videos.progress import ProgressReporter, start_progress, get_progress
+from videos.streaming import MEDIA_IO_THREAD_PREFIX, aread_file_range, build_file_response, stat_stream_file, validate_offload_mode
+from videos.thumbnails import render_thumbnail_variant
+from videos.stream_cache import StreamFileCache, stream_file_cache
+from videos.head_cache import HeadCache, find_moov_atom
+from videos.catalog import get_genre_rows
+from videos.serializers import VideoSerializer
+from videos.search import build_fts_query
+from videos.suggestions import TitlePrefixIndex, title_index
+from videos.catalog_cache import CATALOG_VERSION_KEY, bump_catalog_version, get_catalog_version
+from videos.signing import HLS_RESOLUTION, THUMBNAIL_RESOLUTION, TRICKPLAY_RESOLUTION, sign_media_url
+from videos.views import AsyncVideoStreamView
+from videos.transcoding import parse_stream_info, build_single_decode_command, build_rendition_ladder, parse_probe_output, parse_keyframe_interval, write_trickplay_index
+from celery.bin.celery import celery as celery_command
+from celery.worker.worker import WorkController
+from click.testing import CliRunner
+from videoflix_backend.celery import app as celery_app
 
 User = get_user_model()
 
+PROBE_OUTPUT = json.dumps({
+    'format': {'duration': '120.0', 'bit_rate': '8000000'},
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'avg_frame_rate': '30000/1001'},
+        {'codec_type': 'audio', 'codec_name': 'aac'},
+    ],
+})
+RENDITION_PROBE_OUTPUT = json.dumps({
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'level': 31, 'width': 1280, 'height': 720},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'profile': 'LC'},
+    ],
+})
+KEYFRAME_PROBE_OUTPUT = '0.000000,K__\n0.033367,___\n2.002000,K__\n4.004000,K__\n'
+
+
+def fake_ffmpeg_run(command, **kwargs):
+    """
+    Stands in for subprocess.run in transcoding tests.
+
+    Returns canned ffprobe output for a 1080p source. For FFmpeg commands it
+    writes every temporary output file, as FFmpeg would, and returns an empty result.
+    """
+    if command[0] == 'ffprobe':
+        output = KEYFRAME_PROBE_OUTPUT if '-read_intervals' in command else PROBE_OUTPUT
+        return subprocess.CompletedProcess(command, 0, stdout=output, stderr='')
+    for argument in command:
+        if '.part.' in argument:
+            with open(argument, 'wb') as output_file:
+                output_file.write(argument.encode())
+    return subprocess.CompletedProcess(command, 0, stdout='', stderr='')
+
+
+class FakePopen:
+    """
+    Stands in for subprocess.Popen in transcoding tests.
+
+    Passes the command to a subprocess.run stand-in and reports two progress
+    blocks on stdout, like FFmpeg's -progress pipe:1 output.
+    """
+
+    def __init__(self, command, runner):
+        """
+        Runs the command through the runner and records its exit code.
+        """
+        self.returncode = 0
+        try:
+            runner(command)
+        except subprocess.CalledProcessError as e:
+            self.returncode = e.returncode
+        self.stdout = io.StringIO(
+            'frame=30\nout_time_us=60000000\nspeed=2.5x\nprogress=continue\n'
+            'frame=60\nout_time_us=120000000\nspeed=2.5x\nprogress=end\n'
+        )
+
+    def wait(self):
+        """
+        Returns the exit code of the command.
+        """
+        return self.returncode
+
+
+@contextlib.contextmanager
+def patch_ffmpeg(side_effect):
+    """
+    Replaces subprocess.run and subprocess.Popen in videos.transcoding.
+
+    Both are routed to one mock with the given side effect, so tests can
+    count and inspect every FFmpeg and ffprobe command.
+    """
+    runner = mock.Mock(side_effect=side_effect)
+    with mock.patch('videos.transcoding.subprocess.run', runner), \
+            mock.patch('videos.transcoding.subprocess.Popen', side_effect=lambda command, **kwargs: FakePopen(command, runner)):
+        yield runner
+
+def signed_media_url(video_id, resolution_name=None, user_id=1, ttl=60):
+    """
+    Returns a signed stream URL, or a signed thumbnail URL without a resolution.
+    """
+    expires = int(time.time()) + ttl
+    if resolution_name is None:
+        return sign_media_url(reverse('video-thumbnail', args=[video_id]), video_id, THUMBNAIL_RESOLUTION, user_id, expires)
+    return sign_media_url(reverse('video-stream', args=[video_id, resolution_name]), video_id, resolution_name, user_id, expires)
+
+
+def signed_package_url(url, video_id, resolution_name, user_id=1, ttl=60):
+    """
+    Returns an HLS or trickplay URL signed for the whole package of a video.
+    """
+    return sign_media_url(url, video_id, resolution_name, user_id, int(time.time()) + ttl)
+
+
 class VideoViewingModelTest(TestCase):
     """
     Test suite for the VideoViewing model.
@@ -81,4 +219,2065 @@ class VideoViewingModelTest(TestCase):
         upon initial viewing.
         """
         viewing = VideoViewing.objects.create(user=self.user, video=self.video)
-        self.assertFalse(viewing.is_finished)
\ No newline at end of file
+        self.assertFalse(viewing.is_finished)
+
+class SingleDecodeTranscodingTest(TestCase):
+    """
+    Test suite for the single-decode transcoding mode.
+
+    Verifies that the FFmpeg command fans one decode out to every rendition
+    and the thumbnail, and that convert_video_task starts only one process.
+    """
+
+    def setUp(self):
+        """
+        Creates a video that points to an uploaded file and a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.video = Video.objects.create(title='Test Video', video_file='videos/My Movie.mp4')
+
+    def test_single_decode_command_splits_into_all_outputs(self):
+        """
+        Tests that the command decodes the input once and maps every branch.
+
+        The split filter must have one branch per rendition plus one for the
+        thumbnail, and every branch must be mapped to its own output file.
+        """
+        command = build_single_decode_command('/in.mp4', [(120, None, '/120p.mp4'), (720, 3500, '/720p.mp4')], '/thumb.jpg')
+        self.assertEqual(command.count('-i'), 1)
+        filter_graph = command[command.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith('[0:v]split=3[s0][s1][s2]'))
+        self.assertIn('[s1]scale=trunc(oh*a/2)*2:720[v1]', filter_graph)
+        self.assertIn('[thumb]', filter_graph)
+        self.assertEqual(command[-1], '/thumb.jpg')
+        self.assertIn('/120p.mp4', command)
+        self.assertIn('/720p.mp4', command)
+
+    def test_convert_video_task_runs_one_ffmpeg_process(self):
+        """
+        Tests that convert_video_task runs FFmpeg once in single_decode mode
+        and stores the URLs of all renditions and the thumbnail.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='single_decode', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_ffmpeg_run) as run:
+            convert_video_task(self.video.id)
+
+        # 2 probes + 1 transcode
+        self.assertEqual(run.call_count, 3)
+        self.video.refresh_from_db()
+        self.assertEqual(set(self.video.resolutions), {'120p', '360p', '720p', '1080p'})
+        self.assertEqual(self.video.resolutions['720p'], f'/media/videos/{self.video.id}_My_Movie/720p.mp4')
+        self.assertEqual(self.video.thumbnail.name, f'videos/{self.video.id}_My_Movie/thumbnail.jpg')
+
+    def test_convert_video_task_sequential_mode(self):
+        """
+        Tests that the sequential mode still runs one process per rendition
+        plus one for the thumbnail.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='sequential', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_ffmpeg_run) as run:
+            convert_video_task(self.video.id)
+
+        self.assertEqual(run.call_count, 7)
+
+
+class ParallelTranscodingTest(TestCase):
+    """
+    Test suite for the "parallel" transcoding strategy.
+
+    Runs the chord eagerly and verifies that the Video model is only updated
+    once every subtask has succeeded.
+    """
+
+    def setUp(self):
+        """
+        Creates a video, a temporary MEDIA_ROOT and switches Celery to eager mode.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.video = Video.objects.create(title='Test Video', video_file='videos/My Movie.mp4')
+        previous = {key: celery_app.conf[key] for key in ('task_always_eager', 'task_eager_propagates')}
+        celery_app.conf.update(task_always_eager=True, task_eager_propagates=True)
+        self.addCleanup(celery_app.conf.update, previous)
+
+    def test_chord_publishes_all_renditions(self):
+        """
+        Tests that each rendition and the thumbnail run as separate subtasks
+        and that the aggregation step stores all of them.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='parallel', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_ffmpeg_run) as run:
+            convert_video_task.delay(self.video.id)
+
+        self.assertEqual(run.call_count, 7)
+        self.video.refresh_from_db()
+        self.assertEqual(list(self.video.resolutions), ['120p', '360p', '720p', '1080p'])
+        self.assertEqual(self.video.thumbnail.name, f'videos/{self.video.id}_My_Movie/thumbnail.jpg')
+
+    def test_failed_subtask_leaves_video_unpublished(self):
+        """
+        Tests that the video is not updated when one of the subtasks fails.
+        """
+        def fail_360p(command, **kwargs):
+            if any('360p' in argument for argument in command):
+                raise subprocess.CalledProcessError(1, 'ffmpeg')
+            return fake_ffmpeg_run(command)
+
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='parallel', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fail_360p):
+            with self.assertRaises(subprocess.CalledProcessError):
+                convert_video_task.delay(self.video.id)
+
+        self.video.refresh_from_db()
+        self.assertIsNone(self.video.resolutions)
+        self.assertEqual(RenditionJob.objects.get(video=self.video, resolution='360p').status, RenditionJob.STATUS_FAILED)
+
+    def test_segmented_strategy_transcodes_every_segment(self):
+        """
+        Tests that the "segmented" strategy runs one subtask per segment and
+        resolution and joins the segments of each resolution in order.
+        """
+        commands = []
+
+        def fake_ffmpeg(command, **kwargs):
+            commands.append(command)
+            if '-segment_time' in command:
+                segment_dir = os.path.dirname(command[-1])
+                for index in range(3):
+                    open(os.path.join(segment_dir, f'source_{index:05d}.mkv'), 'wb').close()
+            return fake_ffmpeg_run(command)
+
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='segmented', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_ffmpeg):
+            convert_video_task.delay(self.video.id)
+
+        # 2 probes + 1 split + 3 segments * 4 resolutions + 1 thumbnail + 1 concatenation
+        self.assertEqual(len(commands), 17)
+        self.assertIn('concat', commands[-1])
+        self.video.refresh_from_db()
+        self.assertEqual(list(self.video.resolutions), ['120p', '360p', '720p', '1080p'])
+        segment_dir = os.path.join(self.media_root, 'videos', f'{self.video.id}_My_Movie', 'segments')
+        self.assertFalse(os.path.exists(segment_dir))
+
+
+class HLSPackagingTest(TestCase):
+    """
+    Test suite for the HLS packaging stage and the HLS endpoints.
+
+    FFmpeg is replaced by a stand-in that writes a small media playlist and
+    segments, so the master playlist and the served files can be checked.
+    """
+
+    def setUp(self):
+        """
+        Creates a converted video and a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/My Movie.mp4',
+            resolutions={'120p': '/media/120p.mp4', '720p': '/media/720p.mp4'}
+        )
+
+    def fake_ffmpeg(self, command, **kwargs):
+        """
+        Writes two 6 second segments of 750 and 1500 bytes and their playlist,
+        or returns the probe of a 720p High profile rendition.
+        """
+        if command[0] == 'ffprobe':
+            return subprocess.CompletedProcess(command, 0, stdout=RENDITION_PROBE_OUTPUT, stderr='')
+        playlist_dir = os.path.dirname(command[-1])
+        with open(command[-1], 'w') as playlist:
+            playlist.write('#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n')
+            for index, size in enumerate([750, 1500]):
+                with open(os.path.join(playlist_dir, f'segment_{index:05d}.m4s'), 'wb') as segment:
+                    segment.write(b'\0' * size)
+                playlist.write(f'#EXTINF:6.000000,\nsegment_{index:05d}.m4s\n')
+            playlist.write('#EXT-X-ENDLIST\n')
+
+    def package(self):
+        """
+        Packages the test video with the FFmpeg stand-in and returns the master playlist path.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                patch_ffmpeg(self.fake_ffmpeg):
+            self.video.hls_playlist = package_hls(self.video, ['120p', '720p'])
+            self.video.save()
+        return os.path.join(self.media_root, self.video.hls_playlist)
+
+    def test_master_playlist_lists_renditions_with_bandwidth(self):
+        """
+        Tests that the master playlist references every rendition of its
+        package with its peak and average bandwidth measured from the
+        segments and the probed resolution and codecs.
+        """
+        master_playlist_path = self.package()
+        package = os.path.basename(os.path.dirname(master_playlist_path))
+        with open(master_playlist_path) as master_playlist:
+            content = master_playlist.read()
+        self.assertTrue(package.startswith('v'))
+        self.assertIn(
+            '#EXT-X-STREAM-INF:BANDWIDTH=2000,AVERAGE-BANDWIDTH=1500,RESOLUTION=1280x720,'
+            f'CODECS="avc1.64001f,mp4a.40.2"\n{package}/120p/index.m3u8', content
+        )
+        self.assertIn(f'{package}/720p/index.m3u8', content)
+
+    def test_stream_info_omits_unknown_codecs(self):
+        """
+        Tests that CODECS is left out unless every stream's codec string is known.
+        """
+        self.assertEqual(parse_stream_info(RENDITION_PROBE_OUTPUT), {'resolution': '1280x720', 'codecs': 'avc1.64001f,mp4a.40.2'})
+        self.assertEqual(parse_stream_info(PROBE_OUTPUT), {'resolution': '1920x1080', 'codecs': None})
+
+    def test_repackaging_uses_new_urls_and_removes_the_old_package(self):
+        """
+        Tests that a re-conversion is packaged under a new version, and that
+        the replaced package is deleted and no longer served.
+        """
+        old_package = os.path.basename(os.path.dirname(self.package()))
+        old_url = self.hls_url(old_package, '720p', 'segment_00001.m4s')
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(self.fake_ffmpeg):
+            store_conversion_results(self.video, [
+                {'resolution': '120p', 'url': '/media/120p.mp4'}, {'resolution': '720p', 'url': '/media/720p.mp4'}
+            ])
+        package_dir = os.path.dirname(os.path.join(self.media_root, self.video.hls_playlist))
+        self.assertNotEqual(os.path.basename(package_dir), old_package)
+        self.assertEqual(os.listdir(os.path.dirname(package_dir)), [os.path.basename(package_dir)])
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(self.client.get(old_url).status_code, 404)
+
+    def test_repackaging_keeps_the_package_of_a_reupload(self):
+        """
+        Tests that re-converting a video keeps the package a re-upload of the
+        same content still points to.
+        """
+        self.package()
+        duplicate = Video.objects.create(title='Copy', **self.video.get_conversion_data())
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(self.fake_ffmpeg):
+            store_conversion_results(self.video, [
+                {'resolution': '120p', 'url': '/media/120p.mp4'}, {'resolution': '720p', 'url': '/media/720p.mp4'}
+            ])
+        self.assertNotEqual(self.video.hls_playlist, duplicate.hls_playlist)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, self.video.hls_playlist)))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, duplicate.hls_playlist)))
+
+        duplicate.delete()
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(self.fake_ffmpeg):
+            store_conversion_results(self.video, [{'resolution': '720p', 'url': '/media/720p.mp4'}])
+        hls_dir = os.path.dirname(os.path.dirname(os.path.join(self.media_root, self.video.hls_playlist)))
+        self.assertEqual(len(os.listdir(hls_dir)), 1)
+
+    def hls_url(self, *args):
+        """
+        Returns the signed URL of the master playlist, or of a file of a package and resolution.
+        """
+        url_name = 'video-hls-package-file' if args else 'video-hls-master'
+        return signed_package_url(reverse(url_name, args=[self.video.id, *args]), self.video.id, HLS_RESOLUTION)
+
+    def test_segments_are_served_with_immutable_cache_headers(self):
+        """
+        Tests that segments of a versioned URL are served with long-lived
+        immutable caching, unversioned ones are revalidated and the per-user
+        playlists are revalidated privately.
+        """
+        package = os.path.basename(os.path.dirname(self.package()))
+        with self.settings(MEDIA_ROOT=self.media_root):
+            segment = self.client.get(self.hls_url(package, '720p', 'segment_00001.m4s'))
+            unversioned = self.client.get(signed_package_url(
+                reverse('video-hls-file', args=[self.video.id, '720p', 'segment_00001.m4s']), self.video.id, HLS_RESOLUTION
+            ))
+            master = self.client.get(self.hls_url())
+        self.assertEqual(segment.status_code, 200)
+        self.assertEqual(b''.join(segment.streaming_content), b'\0' * 1500)
+        self.assertIn('immutable', segment['Cache-Control'])
+        self.assertEqual(unversioned['Cache-Control'], 'public, no-cache')
+        self.assertEqual(master['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertEqual(master['Cache-Control'], 'private, no-cache')
+
+    def test_playlists_pass_their_signature_on(self):
+        """
+        Tests that the playlists sign the URIs they reference, so a player
+        can follow them, while unsigned requests are rejected.
+        """
+        package = os.path.basename(os.path.dirname(self.package()))
+        master_url = self.hls_url()
+        signature_query = master_url.split('?')[1]
+        with self.settings(MEDIA_ROOT=self.media_root):
+            master = self.client.get(master_url).content.decode()
+            self.assertIn(f'\n{package}/720p/index.m3u8?{signature_query}\n', master)
+            media_url = reverse('video-hls-package-file', args=[self.video.id, package, '720p', 'index.m3u8'])
+            media = self.client.get(f'{media_url}?{signature_query}').content.decode()
+            self.assertIn(f'#EXT-X-MAP:URI="init.mp4?{signature_query}"', media)
+            self.assertIn(f'\nsegment_00001.m4s?{signature_query}\n', media)
+            segment_url = reverse('video-hls-package-file', args=[self.video.id, package, '720p', 'segment_00001.m4s'])
+            self.assertEqual(self.client.get(f'{segment_url}?{signature_query}').status_code, 200)
+            self.assertEqual(self.client.get(segment_url).status_code, 403)
+            self.assertEqual(self.client.get(reverse('video-hls-master', args=[self.video.id])).status_code, 403)
+
+    def test_invalid_file_names_are_rejected(self):
+        """
+        Tests that file names outside the HLS package cannot be requested.
+        """
+        package = os.path.basename(os.path.dirname(self.package()))
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.hls_url(package, '720p', '..%2F..%2Fsecret.mp4'))
+        self.assertNotEqual(response.status_code, 200)
+
+
+
+class TrickplayTest(TestCase):
+    """
+    Test suite for the trickplay sprite sheets, their WebVTT index and endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates a converted 16:9 video of 25 seconds and a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/My Movie.mp4', duration=25.0, width=1920, height=1080,
+            resolutions={'120p': '/media/120p.mp4', '720p': '/media/720p.mp4'}
+        )
+
+    def fake_ffmpeg(self, command, **kwargs):
+        """
+        Writes one sprite sheet where the command's output pattern points.
+        """
+        with open(command[-1].replace('%03d', '001'), 'wb') as sprite:
+            sprite.write(b'sprite')
+
+    def test_index_maps_times_to_sprite_coordinates(self):
+        """
+        Tests that cues advance through the tiles row by row and continue on
+        the next sheet once a sheet is full.
+        """
+        index_path = os.path.join(self.media_root, 'thumbnails.vtt')
+        cue_count = write_trickplay_index(index_path, 25.0, 5, 160, 90, 2, 2, 'jpg')
+        with open(index_path) as index_file:
+            content = index_file.read()
+        self.assertEqual(cue_count, 5)
+        self.assertTrue(content.startswith('WEBVTT\n'))
+        self.assertIn('00:00:00.000 --> 00:00:05.000\nsprite_001.jpg#xywh=0,0,160,90', content)
+        self.assertIn('00:00:15.000 --> 00:00:20.000\nsprite_001.jpg#xywh=160,90,160,90', content)
+        self.assertIn('00:00:20.000 --> 00:00:25.000\nsprite_002.jpg#xywh=0,0,160,90', content)
+
+    def test_unknown_duration_is_probed_from_the_sampled_rendition(self):
+        """
+        Tests that without a stored duration the index follows the probed
+        duration of the sampled rendition, not the padded sprite sheets.
+        """
+        def fake_ffmpeg(command, **kwargs):
+            if command[0] == 'ffprobe':
+                return subprocess.CompletedProcess(command, 0, stdout=json.dumps({'format': {'duration': '12.0'}}), stderr='')
+            self.fake_ffmpeg(command)
+
+        Video.objects.filter(pk=self.video.pk).update(duration=None)
+        self.video.refresh_from_db()
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRICKPLAY_INTERVAL=5), patch_ffmpeg(fake_ffmpeg) as runner:
+            index = generate_trickplay(self.video, ['120p', '720p'])
+        self.assertTrue(runner.call_args_list[0][0][0][-1].endswith('120p.mp4'))
+        with open(os.path.join(self.media_root, index)) as index_file:
+            self.assertEqual(index_file.read().count(' --> '), 3)
+
+    def test_trickplay_is_skipped_without_any_duration(self):
+        """
+        Tests that no sprites are rendered and an earlier index is removed
+        when neither the video nor the sampled rendition has a duration.
+        """
+        results = [{'resolution': '120p', 'url': '/media/120p.mp4'}]
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_HLS_ENABLED=False), patch_ffmpeg(self.fake_ffmpeg):
+            store_conversion_results(self.video, results)
+        index = self.video.trickplay_index
+        self.video.duration = 0
+        empty_probe = subprocess.CompletedProcess(['ffprobe'], 0, stdout='{}', stderr='')
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_HLS_ENABLED=False), \
+                patch_ffmpeg(lambda command, **kwargs: empty_probe) as runner:
+            store_conversion_results(self.video, results)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.trickplay_index, '')
+        self.assertEqual([call[0][0][0] for call in runner.call_args_list], ['ffprobe'])
+        self.assertFalse(os.path.exists(os.path.dirname(os.path.join(self.media_root, index))))
+
+    def test_sprites_are_sampled_from_smallest_rendition_and_served(self):
+        """
+        Tests that the sprites are rendered from the smallest rendition with
+        tiles matching the aspect ratio, and that the index and sprites are
+        served with their content types while other names are rejected.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRICKPLAY_INTERVAL=10, VIDEO_TRICKPLAY_FORMAT='jpg'), \
+                patch_ffmpeg(self.fake_ffmpeg) as runner:
+            self.video.trickplay_index = generate_trickplay(self.video, ['120p', '720p'])
+            self.video.save()
+        command = runner.call_args[0][0]
+        self.assertTrue(command[command.index('-i') + 1].endswith('120p.mp4'))
+        self.assertIn('fps=1/10,scale=160:90,tile=10x10', command)
+
+        package = os.path.basename(os.path.dirname(self.video.trickplay_index))
+        with self.settings(MEDIA_ROOT=self.media_root):
+            index_url = self.trickplay_url('thumbnails.vtt')
+            signature_query = index_url.split('?')[1]
+            index = self.client.get(index_url)
+            sprite = self.client.get(self.trickplay_url(package, 'sprite_001.jpg'))
+            invalid = self.client.get(self.trickplay_url(package, 'thumbnail.jpg'))
+            unsigned = self.client.get(reverse('video-trickplay-package-file', args=[self.video.id, package, 'sprite_001.jpg']))
+        self.assertEqual(index['Content-Type'], 'text/vtt')
+        self.assertIn(f'{package}/sprite_001.jpg?{signature_query}#xywh=160,0,160,90', index.content.decode())
+        self.assertEqual(sprite['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', sprite['Cache-Control'])
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(unsigned.status_code, 403)
+
+    def test_reconversion_uses_new_sprite_urls_and_removes_the_old_package(self):
+        """
+        Tests that a re-conversion renders its sprites under a new version,
+        that the replaced package is deleted and no longer served, and that
+        unversioned sprite URLs of older indexes are revalidated.
+        """
+        results = [{'resolution': '120p', 'url': '/media/120p.mp4'}, {'resolution': '720p', 'url': '/media/720p.mp4'}]
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_HLS_ENABLED=False), patch_ffmpeg(self.fake_ffmpeg):
+            store_conversion_results(self.video, results)
+            old_package = os.path.basename(os.path.dirname(self.video.trickplay_index))
+            store_conversion_results(self.video, results)
+        package_dir = os.path.dirname(os.path.join(self.media_root, self.video.trickplay_index))
+        self.assertNotEqual(os.path.basename(package_dir), old_package)
+        self.assertEqual(os.listdir(os.path.dirname(package_dir)), [os.path.basename(package_dir)])
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(self.client.get(self.trickplay_url(old_package, 'sprite_001.jpg')).status_code, 404)
+
+        legacy_dir = os.path.dirname(package_dir)
+        shutil.copy(os.path.join(package_dir, 'sprite_001.jpg'), legacy_dir)
+        Video.objects.filter(pk=self.video.pk).update(trickplay_index=os.path.relpath(os.path.join(legacy_dir, 'thumbnails.vtt'), self.media_root))
+        with self.settings(MEDIA_ROOT=self.media_root):
+            legacy_sprite = self.client.get(self.trickplay_url('sprite_001.jpg'))
+        self.assertEqual(legacy_sprite.status_code, 200)
+        self.assertEqual(legacy_sprite['Cache-Control'], 'public, no-cache')
+
+    def trickplay_url(self, *args):
+        """
+        Returns the signed URL of a trickplay file, optionally inside a package.
+        """
+        url_name = 'video-trickplay-package-file' if len(args) == 2 else 'video-trickplay'
+        return signed_package_url(reverse(url_name, args=[self.video.id, *args]), self.video.id, TRICKPLAY_RESOLUTION)
+
+
+
+class VideoStreamRangeTest(TestCase):
+    """
+    Test suite for byte ranges and conditional requests in VideoStreamView.
+    """
+
+    def setUp(self):
+        """
+        Creates a video with a 1000 byte 720p rendition in a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_movie'))
+        self.content = bytes(range(250)) * 4
+        with open(os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4'), 'wb') as rendition:
+            rendition.write(self.content)
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/movie.mp4',
+            resolutions={'720p': '/media/videos/1_movie/720p.mp4'}
+        )
+        self.url = signed_media_url(self.video.id, '720p')
+
+    def get(self, **headers):
+        """
+        Requests the rendition with the given headers and returns the response and body.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_request_without_range_returns_whole_file(self):
+        """
+        Tests that a request without Range gets a 200 with the whole file and validators.
+        """
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_single_open_and_suffix_ranges(self):
+        """
+        Tests that a closed, an open-ended and a suffix range return exactly their bytes.
+        """
+        response, body = self.get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[100:200])
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1000')
+
+        response, body = self.get(Range='bytes=900-')
+        self.assertEqual((response.status_code, body), (206, self.content[900:]))
+
+        response, body = self.get(Range='bytes=-100')
+        self.assertEqual(body, self.content[900:])
+        self.assertEqual(response['Content-Range'], 'bytes 900-999/1000')
+
+    def test_multiple_ranges_return_multipart_body(self):
+        """
+        Tests that several ranges are sent as multipart/byteranges with an exact Content-Length.
+        """
+        response, body = self.get(Range='bytes=0-9, 500-509')
+        self.assertEqual(response.status_code, 206)
+        content_type, boundary = response['Content-Type'].split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-9/1000\r\n\r\n' + self.content[0:10], body)
+        self.assertIn(b'Content-Range: bytes 500-509/1000\r\n\r\n' + self.content[500:510], body)
+        self.assertTrue(body.endswith(f'--{boundary}--\r\n'.encode()))
+
+    def test_unsatisfiable_and_malformed_ranges(self):
+        """
+        Tests that a range beyond the file gets 416 and a malformed header is ignored.
+        """
+        response, body = self.get(Range='bytes=5000-6000')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1000')
+
+        response, body = self.get(Range='bytes=abc')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_conditional_requests(self):
+        """
+        Tests If-None-Match and If-Modified-Since revalidation and that a stale
+        If-Range validator turns a range request into a full response.
+        """
+        response, body = self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.get(If_None_Match=etag)[0].status_code, 304)
+        self.assertEqual(self.get(If_Modified_Since=last_modified)[0].status_code, 304)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=etag)[0].status_code, 206)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=last_modified)[0].status_code, 206)
+        response, body = self.get(Range='bytes=0-9', If_Range='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_ranges_are_handed_to_file_wrapper(self):
+        """
+        Tests that a range is served as a FileResponse positioned at its start
+        for wsgi.file_wrapper, and that reading it never crosses the range end.
+        """
+        file_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        response = build_file_response(RequestFactory().get('/', HTTP_RANGE='bytes=100-199'), file_path, 'video/mp4')
+        self.addCleanup(response.close)
+        self.assertEqual(os.lseek(response.file_to_stream.fileno(), 0, os.SEEK_CUR), 100)
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+    def test_generator_fallback(self):
+        """
+        Tests that the buffered generator is used when the file wrapper is disabled.
+        """
+        with self.settings(VIDEO_STREAM_FILE_WRAPPER=False):
+            response, body = self.get(Range='bytes=-10')
+        self.assertIsNone(getattr(response, 'file_to_stream', None))
+        self.assertEqual(body, self.content[-10:])
+
+    async def test_async_view_streams_ranges(self):
+        """
+        Tests that the asynchronous view answers ranges with non-blocking reads.
+        """
+        request = AsyncRequestFactory().get(self.url, headers={'Range': 'bytes=10-19, -5'})
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = await AsyncVideoStreamView.as_view()(request, pk=self.video.id, resolution='720p')
+            body = b''.join([chunk async for chunk in response])
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertIn(self.content[10:20], body)
+        self.assertIn(self.content[-5:], body)
+        self.assertEqual(int(response['Content-Length']), len(body))
+
+    async def test_async_view_answers_removed_rendition_with_404(self):
+        """
+        Tests that a rendition removed after it was cached is answered with
+        404 and dropped from the stream file cache.
+        """
+        file_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        stream_file_cache.store(self.video.id, '720p', file_path)
+        os.remove(file_path)
+        request = AsyncRequestFactory().get(self.url)
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = await AsyncVideoStreamView.as_view()(request, pk=self.video.id, resolution='720p')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(stream_file_cache.get(self.video.id, '720p'))
+
+    async def test_async_reads_stop_when_client_disconnects(self):
+        """
+        Tests that closing the body after the first chunk closes the file
+        without reading the rest.
+        """
+        file_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        with mock.patch('videos.streaming.os.pread', wraps=os.pread) as pread, \
+                mock.patch('videos.streaming.os.close', wraps=os.close) as close:
+            chunks = aread_file_range(file_path, 0, 999, chunk_size=100)
+            self.assertEqual(await chunks.__anext__(), self.content[:100])
+            await chunks.aclose()
+        self.assertEqual(pread.call_count, 1)
+        close.assert_called_once()
+
+    async def test_async_reads_share_a_bounded_pool(self):
+        """
+        Tests that many concurrent readers never use more threads than the
+        media I/O pool has.
+        """
+        file_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        reader_threads = set()
+        original_pread = os.pread
+
+        def pread(file_descriptor, length, offset):
+            reader_threads.add(threading.current_thread().name)
+            time.sleep(0.001)
+            return original_pread(file_descriptor, length, offset)
+
+        async def read_all():
+            return b''.join([chunk async for chunk in aread_file_range(file_path, 0, 999, chunk_size=100)])
+
+        with mock.patch('videos.streaming.os.pread', pread):
+            bodies = await asyncio.gather(*[read_all() for _ in range(50)])
+        self.assertEqual(set(bodies), {self.content[:1000]})
+        self.assertTrue(all(name.startswith(MEDIA_IO_THREAD_PREFIX) for name in reader_threads))
+        self.assertLessEqual(len(reader_threads), settings.VIDEO_ASYNC_IO_THREADS)
+
+    def test_load_test_command_runs(self):
+        """
+        Tests that the streaming load test serves all clients.
+        """
+        output = io.StringIO()
+        call_command('loadtest_streaming', clients=20, size_mb=1, delay=0, disconnect_ratio=0.5, stdout=output)
+        self.assertIn('completed / disconnected:   10 / 10', output.getvalue())
+        self.assertIn('failed responses:           0', output.getvalue())
+
+    def test_benchmark_command_runs(self):
+        """
+        Tests that the streaming benchmark reports both serving paths.
+        """
+        output = io.StringIO()
+        call_command('benchmark_streaming', size_mb=1, streams=[2], stdout=output)
+        self.assertIn('generator', output.getvalue())
+        self.assertIn('file_wrapper', output.getvalue())
+
+
+
+class StreamFileCacheTest(TestCase):
+    """
+    Test suite for the in-process cache of resolved stream files.
+    """
+
+    def setUp(self):
+        """
+        Creates a video with a rendition in a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_movie'))
+        self.rendition_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        with open(self.rendition_path, 'wb') as rendition:
+            rendition.write(b'0123456789')
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/movie.mp4',
+            resolutions={'720p': '/media/videos/1_movie/720p.mp4'}
+        )
+        self.url = signed_media_url(self.video.id, '720p')
+
+    def test_repeated_range_requests_need_no_queries(self):
+        """
+        Tests that only the first request resolves the video from the database.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.client.get(self.url, headers={'Range': 'bytes=0-4'})
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url, headers={'Range': 'bytes=5-9'})
+        self.assertEqual(b''.join(response.streaming_content), b'56789')
+
+    def test_saving_or_deleting_video_invalidates_entries(self):
+        """
+        Tests that the post_save and post_delete signals drop the video's entries.
+        """
+        stream_file_cache.store(self.video.id, '720p', self.rendition_path)
+        self.video.save()
+        self.assertIsNone(stream_file_cache.get(self.video.id, '720p'))
+
+        stream_file_cache.store(self.video.id, '720p', self.rendition_path)
+        video_id = self.video.id
+        self.video.delete()
+        self.assertIsNone(stream_file_cache.get(video_id, '720p'))
+
+    def test_file_replaced_behind_the_cache_is_served_with_new_validators(self):
+        """
+        Tests that a rendition replaced without invalidating the cache, as
+        seen by another process, is served with its own size and ETag, so
+        an If-Range resume with the old ETag gets the whole new file.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root):
+            old_etag = self.client.get(self.url, headers={'Range': 'bytes=0-4'})['ETag']
+            with open(self.rendition_path + '.new', 'wb') as rendition:
+                rendition.write(b'abcdefghijklmnop')
+            os.replace(self.rendition_path + '.new', self.rendition_path)
+            response = self.client.get(self.url, headers={'Range': 'bytes=5-9', 'If-Range': old_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '16')
+        self.assertNotEqual(response['ETag'], old_etag)
+        self.assertEqual(b''.join(response.streaming_content), b'abcdefghijklmnop')
+        self.assertEqual(stream_file_cache.get(self.video.id, '720p').size, 16)
+
+    def test_entries_are_bounded_and_expire(self):
+        """
+        Tests that the least recently used entry is evicted and that entries expire.
+        """
+        cache = StreamFileCache(max_entries=2, ttl=60)
+        cache.store(1, '720p', self.rendition_path)
+        cache.store(2, '720p', self.rendition_path)
+        cache.get(1, '720p')
+        cache.store(3, '720p', self.rendition_path)
+        self.assertIsNone(cache.get(2, '720p'))
+        self.assertEqual(cache.get(1, '720p').size, 10)
+
+        with mock.patch('videos.stream_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(1, '720p'))
+
+
+
+def mp4_box(box_type, payload):
+    """
+    Returns an MP4 box with a 32-bit size header.
+    """
+    return (8 + len(payload)).to_bytes(4, 'big') + box_type + payload
+
+
+class HeadCacheTest(APITestCase):
+    """
+    Test suite for the hot-start cache of rendition heads and moov atoms.
+    """
+
+    def setUp(self):
+        """
+        Creates a video whose rendition has its moov atom at the end, and a
+        head cache of 64 bytes per file in place of the process-wide one.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_movie'))
+        self.rendition_path = os.path.join(self.media_root, 'videos', '1_movie', '720p.mp4')
+        self.content = mp4_box(b'ftyp', b'isom' * 4) + mp4_box(b'mdat', bytes(range(250)) * 4) + mp4_box(b'moov', b'm' * 100)
+        with open(self.rendition_path, 'wb') as rendition:
+            rendition.write(self.content)
+        self.moov_offset = len(self.content) - 108
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/movie.mp4',
+            resolutions={'720p': '/media/videos/1_movie/720p.mp4'}
+        )
+        self.url = signed_media_url(self.video.id, '720p')
+        self.head_cache = HeadCache(max_bytes=1024, head_bytes=64, max_moov_bytes=256)
+        patcher = mock.patch('videos.streaming.head_cache', self.head_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, range_header):
+        """
+        Requests a range of the rendition with the head cache enabled and returns the response and body.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_HEAD_CACHE_ENABLED=True):
+            response = self.client.get(self.url, headers={'Range': range_header})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_find_moov_atom(self):
+        """
+        Tests that the moov atom is found behind the other top-level boxes, also with a 64-bit size.
+        """
+        with open(self.rendition_path, 'rb') as rendition:
+            self.assertEqual(find_moov_atom(rendition.fileno(), len(self.content)), (self.moov_offset, 108))
+        large_box = (1).to_bytes(4, 'big') + b'mdat' + (24).to_bytes(8, 'big') + b'x' * 8
+        with tempfile.TemporaryFile() as video_file:
+            video_file.write(large_box + mp4_box(b'moov', b''))
+            video_file.flush()
+            self.assertEqual(find_moov_atom(video_file.fileno(), 32), (24, 8))
+
+    def test_head_range_is_served_from_memory_after_first_request(self):
+        """
+        Tests that the first head request is a miss that fills the cache and the second a hit.
+        """
+        response, body = self.get('bytes=0-31')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[:32])
+        self.assertEqual((self.head_cache.hits, self.head_cache.misses), (0, 1))
+
+        with mock.patch('videos.head_cache.os.pread') as pread:
+            response, body = self.get('bytes=16-47')
+        pread.assert_not_called()
+        self.assertFalse(response.streaming)
+        self.assertEqual(body, self.content[16:48])
+        self.assertEqual(response['Content-Range'], f'bytes 16-47/{len(self.content)}')
+        self.assertEqual((self.head_cache.hits, self.head_cache.misses), (1, 1))
+
+    def test_range_past_head_is_cut_at_cached_bytes(self):
+        """
+        Tests that an open-ended range gets only the cached head, and that
+        the client's follow-up range is sent from disk with the file wrapper.
+        """
+        response, body = self.get('bytes=0-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[:64])
+        self.assertEqual(response['Content-Range'], f'bytes 0-63/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '64')
+
+        response, body = self.get('bytes=64-')
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(body, self.content[64:])
+        self.assertEqual(response['Content-Range'], f'bytes 64-{len(self.content) - 1}/{len(self.content)}')
+
+    def test_moov_atom_at_end_is_cached(self):
+        """
+        Tests that a request for the trailing moov atom is answered from memory.
+        """
+        self.get('bytes=0-1')
+        response, body = self.get(f'bytes={self.moov_offset}-')
+        self.assertEqual(body, self.content[self.moov_offset:])
+        self.assertEqual(self.head_cache.hits, 1)
+
+    def test_middle_range_bypasses_cache(self):
+        """
+        Tests that ranges outside the head and moov atom are sent from disk and not counted.
+        """
+        response, body = self.get('bytes=500-599')
+        self.assertEqual(body, self.content[500:600])
+        self.assertEqual((self.head_cache.hits, self.head_cache.misses), (0, 0))
+
+    def test_replaced_rendition_is_not_served_from_stale_entry(self):
+        """
+        Tests that an entry whose file changed is reloaded.
+        """
+        self.get('bytes=0-15')
+        with open(self.rendition_path, 'r+b') as rendition:
+            rendition.write(b'X' * 16)
+        os.utime(self.rendition_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        stream_file_cache.clear()
+        response, body = self.get('bytes=0-15')
+        self.assertEqual(body, b'X' * 16)
+        self.assertEqual(self.head_cache.misses, 2)
+
+    def test_least_frequently_requested_entry_is_evicted(self):
+        """
+        Tests that a full cache evicts the entry with the fewest hits.
+        """
+        cache = HeadCache(max_bytes=100, head_bytes=40, max_moov_bytes=0)
+        paths = []
+        for index in range(3):
+            path = os.path.join(self.media_root, f'{index}.mp4')
+            with open(path, 'wb') as video_file:
+                video_file.write(b'x' * 50)
+            paths.append(path)
+        stream_files = [stat_stream_file(path) for path in paths]
+        cache.read(stream_files[0], 0, 9)
+        cache.read(stream_files[1], 0, 9)
+        cache.read(stream_files[0], 0, 9)
+        cache.read(stream_files[2], 0, 9)
+        self.assertEqual(set(cache.entries), {paths[0], paths[2]})
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 100)
+
+    def test_conversion_prefetches_renditions(self):
+        """
+        Tests that storing the conversion results asks the kernel to read the heads.
+        """
+        with self.settings(
+            MEDIA_ROOT=self.media_root, VIDEO_HEAD_CACHE_ENABLED=True,
+            VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False
+        ), mock.patch('videos.tasks.head_cache') as head_cache:
+            store_conversion_results(self.video, [{'resolution': '720p', 'url': '/media/videos/1_movie/720p.mp4'}])
+        head_cache.prefetch.assert_called_once_with(self.rendition_path)
+
+    def test_stats_require_admin(self):
+        """
+        Tests that only admin users can read the hit and miss counters.
+        """
+        url = reverse('head-cache-stats')
+        user = get_user_model().objects.create_user(username='cacheadmin', email='cacheadmin@example.com', password='password')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.data)
+        self.assertIn('misses', response.data)
+
+
+class SignedMediaURLTest(APITestCase):
+    """
+    Test suite for issuing and verifying signed stream and thumbnail URLs.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a converted video with a rendition and a thumbnail.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_movie'))
+        for filename in ['720p.mp4', 'thumbnail.jpg']:
+            with open(os.path.join(self.media_root, 'videos', '1_movie', filename), 'wb') as output_file:
+                output_file.write(b'content')
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/movie.mp4', thumbnail='videos/1_movie/thumbnail.jpg',
+            resolutions={'720p': '/media/videos/1_movie/720p.mp4'}
+        )
+
+    def test_issued_urls_grant_access_without_queries(self):
+        """
+        Tests that the issued URLs are accepted and verified without any query.
+        """
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('signed-media-urls', args=[self.video.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('signature=', response.data['thumbnail'])
+        self.client.force_authenticate(None)
+
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(self.client.get(response.data['thumbnail']).status_code, 200)
+            self.client.get(response.data['resolutions']['720p'])
+            with self.assertNumQueries(0):
+                stream = self.client.get(response.data['resolutions']['720p'], HTTP_AUTHORIZATION='Token ignored')
+        self.assertEqual(stream.status_code, 200)
+
+    def test_issuing_requires_authentication(self):
+        """
+        Tests that anonymous users cannot obtain signed URLs.
+        """
+        self.assertEqual(self.client.get(reverse('signed-media-urls', args=[self.video.id])).status_code, 401)
+
+    def test_unsigned_tampered_and_expired_urls_are_rejected(self):
+        """
+        Tests that a URL without signature, for another resolution or past
+        its expiry is rejected.
+        """
+        stream_url = reverse('video-stream', args=[self.video.id, '720p'])
+        tampered_url = signed_media_url(self.video.id, '360p').replace('/360p/', '/720p/')
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(self.client.get(stream_url).status_code, 403)
+            self.assertEqual(self.client.get(tampered_url).status_code, 403)
+            self.assertEqual(self.client.get(signed_media_url(self.video.id, '720p', ttl=-1)).status_code, 403)
+            with self.settings(VIDEO_STREAM_SIGNATURE_REQUIRED=False):
+                self.assertEqual(self.client.get(stream_url).status_code, 200)
+
+
+
+class ThumbnailVariantTest(APITestCase):
+    """
+    Test suite for thumbnail caching headers and resized variants.
+    """
+
+    def setUp(self):
+        """
+        Creates a video with a 320x180 JPEG thumbnail in a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_movie'))
+        self.thumbnail_path = os.path.join(self.media_root, 'videos', '1_movie', 'thumbnail.jpg')
+        Image.new('RGB', (320, 180), 'red').save(self.thumbnail_path, format='JPEG')
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/movie.mp4', thumbnail='videos/1_movie/thumbnail.jpg'
+        )
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_issued_thumbnail_url(self):
+        """
+        Returns the thumbnail URL issued by the signed media URL endpoint.
+        """
+        self.client.force_authenticate(self.user)
+        url = self.client.get(reverse('signed-media-urls', args=[self.video.id])).data['thumbnail']
+        self.client.force_authenticate(None)
+        return url
+
+    def test_versioned_url_is_immutable_and_revalidates_with_304(self):
+        """
+        Tests that the issued URL is cached as immutable and that a repeat
+        request with the ETag gets a 304.
+        """
+        url = self.get_issued_thumbnail_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        revalidated = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn('immutable', revalidated['Cache-Control'])
+
+    def test_unversioned_url_must_revalidate(self):
+        """
+        Tests that a URL without the current version is not cached as immutable.
+        """
+        response = self.client.get(signed_media_url(self.video.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_resized_webp_variant_is_rendered_once(self):
+        """
+        Tests that a resized WebP variant is rendered on the first request and
+        served from the disk cache afterwards.
+        """
+        url = self.get_issued_thumbnail_url() + '&w=160&format=webp'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (160, 90)))
+
+        with mock.patch('videos.thumbnails.Image.open') as image_open:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        image_open.assert_not_called()
+        variants = os.listdir(os.path.join(self.media_root, 'videos', '1_movie', 'thumbnail_variants'))
+        self.assertEqual(len(variants), 1)
+
+    def test_replaced_thumbnail_drops_old_variants(self):
+        """
+        Tests that variants of a replaced thumbnail are not served and are removed.
+        """
+        url = signed_media_url(self.video.id) + '&w=160&format=jpeg'
+        self.client.get(url)
+        Image.new('RGB', (320, 180), 'blue').save(self.thumbnail_path, format='JPEG')
+        os.utime(self.thumbnail_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        response = self.client.get(url)
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertGreater(image.getpixel((80, 45))[2], 200)
+        variants = os.listdir(os.path.join(self.media_root, 'videos', '1_movie', 'thumbnail_variants'))
+        self.assertEqual(len(variants), 1)
+
+    def test_concurrent_renders_use_separate_temporary_files(self):
+        """
+        Tests that two threads rendering the same variant at once each write
+        their own temporary file and both end with a complete image.
+        """
+        stream_file = stat_stream_file(self.thumbnail_path)
+        saved_paths = []
+        both_saving = threading.Barrier(2)
+        original_save = Image.Image.save
+
+        def save(image, path, *args, **kwargs):
+            saved_paths.append(path)
+            both_saving.wait(timeout=5)
+            return original_save(image, path, *args, **kwargs)
+
+        results = []
+        with mock.patch.object(Image.Image, 'save', save):
+            threads = [
+                threading.Thread(target=lambda: results.append(render_thumbnail_variant(stream_file, 160, 'jpeg')))
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(set(saved_paths)), 2)
+        self.assertEqual(len(set(results)), 1)
+        with Image.open(results[0]) as image:
+            self.assertEqual(image.size, (160, 90))
+        self.assertEqual(os.listdir(os.path.dirname(results[0])), [os.path.basename(results[0])])
+
+    def test_invalid_width_and_unsupported_format_are_rejected(self):
+        """
+        Tests that unknown widths and formats, and AVIF without Pillow support, get a 400.
+        """
+        self.assertEqual(self.client.get(signed_media_url(self.video.id) + '&w=1234').status_code, 400)
+        self.assertEqual(self.client.get(signed_media_url(self.video.id) + '&format=gif').status_code, 400)
+        with mock.patch('videos.thumbnails.features.check_module', return_value=False):
+            response = self.client.get(signed_media_url(self.video.id) + '&format=avif')
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeOffloadProxy:
+    """
+    Stands in for a reverse proxy that serves files named by Django's offload headers.
+
+    Like an nginx internal location, it maps the X-Accel-Redirect prefix to
+    the media root; an X-Sendfile header is taken as an absolute path.
+    """
+
+    def __init__(self, media_root, internal_prefix):
+        self.media_root = media_root
+        self.internal_prefix = internal_prefix
+
+    def serve(self, response):
+        """
+        Returns the bytes the proxy would send for a Django response.
+        """
+        if 'X-Accel-Redirect' in response:
+            location = response['X-Accel-Redirect']
+            assert location.startswith(self.internal_prefix), location
+            file_path = os.path.join(self.media_root, unquote(location[len(self.internal_prefix):]))
+        else:
+            file_path = response['X-Sendfile']
+        with open(file_path, 'rb') as served_file:
+            return served_file.read()
+
+
+class ReverseProxyOffloadTest(TestCase):
+    """
+    Test suite for handing stream and thumbnail files to the reverse proxy.
+    """
+
+    def setUp(self):
+        """
+        Creates a video with a rendition and a thumbnail in a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'videos', '1_my movie'))
+        for filename, content in [('720p.mp4', b'rendition'), ('thumbnail.jpg', b'thumbnail')]:
+            with open(os.path.join(self.media_root, 'videos', '1_my movie', filename), 'wb') as output_file:
+                output_file.write(content)
+        self.video = Video.objects.create(
+            title='Test Video', video_file='videos/my movie.mp4', thumbnail='videos/1_my movie/thumbnail.jpg',
+            resolutions={'720p': '/media/videos/1_my movie/720p.mp4'}
+        )
+        self.proxy = FakeOffloadProxy(self.media_root, '/protected-media/')
+
+    def get(self, url, mode):
+        """
+        Requests a URL with the given offload mode.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_OFFLOAD_MODE=mode, VIDEO_OFFLOAD_INTERNAL_PREFIX='/protected-media/'):
+            return self.client.get(url, headers={'Range': 'bytes=0-3'})
+
+    def test_stream_is_offloaded_with_x_accel_redirect(self):
+        """
+        Tests that Django returns an empty response with a quoted internal
+        location that the proxy resolves to the rendition, and leaves the
+        Range header to the proxy.
+        """
+        response = self.get(signed_media_url(self.video.id, '720p'), 'x-accel-redirect')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/1_my%20movie/720p.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(self.proxy.serve(response), b'rendition')
+
+    def test_thumbnail_is_offloaded_with_x_sendfile(self):
+        """
+        Tests that the thumbnail is handed over with its absolute path.
+        """
+        response = self.get(signed_media_url(self.video.id), 'x-sendfile')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'videos', '1_my movie', 'thumbnail.jpg'))
+        self.assertEqual(self.proxy.serve(response), b'thumbnail')
+
+    def test_files_are_served_by_django_without_offload_mode(self):
+        """
+        Tests that no offload header is emitted when the mode is disabled.
+        """
+        response = self.get(signed_media_url(self.video.id, '720p'), '')
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'rend')
+
+    def test_unknown_offload_mode_fails_when_the_app_loads(self):
+        """
+        Tests that a mistyped offload mode is rejected when the app is loaded
+        instead of on each media request.
+        """
+        with self.settings(VIDEO_OFFLOAD_MODE='x-accel'):
+            with self.assertRaisesMessage(ImproperlyConfigured, "Unknown VIDEO_OFFLOAD_MODE: 'x-accel'"):
+                apps.get_app_config('videos').ready()
+        for mode in ('', 'x-accel-redirect', 'x-sendfile'):
+            with self.settings(VIDEO_OFFLOAD_MODE=mode):
+                validate_offload_mode()
+
+
+
+class CatalogPaginationTest(APITestCase):
+    """
+    Test suite for the cursor-paginated, filterable catalog.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and five videos in two genres, two of them uploaded at the same time.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.videos = [
+            Video.objects.create(title=title, video_file='videos/movie.mp4', genre=Genre.objects.get(name=genre))
+            for title, genre in [('E', 'Action'), ('D', 'Drama'), ('C', 'Action'), ('B', 'Drama'), ('A', 'Action')]
+        ]
+        Video.objects.filter(pk__in=[self.videos[1].pk, self.videos[2].pk]).update(upload_date=self.videos[1].upload_date)
+
+    def get_all_pages(self, **params):
+        """
+        Follows the next links from the first page and returns the titles of all pages.
+        """
+        pages = []
+        response = self.client.get(reverse('all-videos'), params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([video['title'] for video in response.data['results']])
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_pages_are_newest_first_without_gaps_or_duplicates(self):
+        """
+        Tests that the pages list every video once, newest first, with ties ordered by id.
+        """
+        pages = self.get_all_pages(page_size=2)
+        self.assertEqual(pages, [['A', 'B'], ['C', 'D'], ['E']])
+
+    def test_page_query_uses_position_instead_of_offset(self):
+        """
+        Tests that a later page is fetched with a WHERE on the position, not an OFFSET.
+        """
+        first_page = self.client.get(reverse('all-videos'), {'page_size': 1})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first_page.data['next'])
+        catalog_query = next(query['sql'] for query in queries if 'videos_video' in query['sql'])
+        self.assertIn('"upload_date" <', catalog_query)
+        self.assertNotIn('OFFSET', catalog_query)
+
+    def test_genre_filter_and_ordering(self):
+        """
+        Tests that the genre filter and the title ordering are applied across pages.
+        """
+        self.assertEqual(self.get_all_pages(genre='Action', page_size=2), [['A', 'C'], ['E']])
+        self.assertEqual(self.get_all_pages(ordering='title', page_size=3), [['A', 'B', 'C'], ['D', 'E']])
+        self.assertEqual(self.get_all_pages(ordering='unknown', page_size=5), [['A', 'B', 'C', 'D', 'E']])
+
+    def test_catalog_requires_authentication(self):
+        """
+        Tests that anonymous users cannot list the catalog.
+        """
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('all-videos')).status_code, 401)
+
+
+class CatalogCacheTest(APITestCase):
+    """
+    Test suite for the versioned catalog cache and its ETags.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a video, starting from an empty cache.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.video = Video.objects.create(title='Cached', video_file='videos/movie.mp4', genre=Genre.objects.get(name='Drama'))
+        self.url = reverse('all-videos')
+
+    def test_repeat_request_is_served_from_cache(self):
+        """
+        Tests that a second request needs no catalog query and returns the same ETag.
+        """
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertFalse([query for query in queries if 'videos_video' in query['sql']])
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertTrue(first['ETag'].startswith('"'))
+
+    def test_matching_etag_gets_304(self):
+        """
+        Tests that a request with the current ETag is answered with 304 and no body.
+        """
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_saving_and_deleting_videos_bump_the_version(self):
+        """
+        Tests that saving or deleting a video after commit changes the ETag and the data.
+        """
+        first = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.title = 'Renamed'
+            self.video.save()
+        second = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['results'][0]['title'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+
+    def test_different_queries_are_cached_separately(self):
+        """
+        Tests that filters are part of the cache key and the ETag.
+        """
+        all_videos = self.client.get(self.url)
+        action = self.client.get(self.url, {'genre': 'Action'})
+        self.assertEqual(action.data['results'], [])
+        self.assertNotEqual(action['ETag'], all_videos['ETag'])
+
+    def test_lost_version_does_not_reuse_old_entries(self):
+        """
+        Tests that a version recreated after a cache flush differs from the previous one.
+        """
+        version = get_catalog_version()
+        cache.delete(CATALOG_VERSION_KEY)
+        self.assertNotEqual(get_catalog_version(), version)
+        bump_catalog_version()
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class GenreRowsTest(APITestCase):
+    """
+    Test suite for the genre rows of the home screen.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and three Action, two Drama and one video without genre.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        for title, genre in [('A1', 'Action'), ('D1', 'Drama'), ('A2', 'Action'), ('D2', 'Drama'), ('A3', 'Action'), ('N', None)]:
+            Video.objects.create(
+                title=title, video_file='videos/movie.mp4', genre=Genre.objects.filter(name=genre).first()
+            )
+        self.expected = [('Action', ['A3', 'A2']), ('Drama', ['D2', 'D1'])]
+
+    def get_rows(self, response):
+        """
+        Returns the genres and video titles of a genre rows response.
+        """
+        return [(row['genre'], [video['title'] for video in row['videos']]) for row in response.data['genres']]
+
+    def test_rows_are_fetched_in_one_query(self):
+        """
+        Tests that the newest videos of every genre come from a single window-function query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('genre-rows'), {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_rows(response), self.expected)
+        video_queries = [query['sql'] for query in queries if 'videos_video' in query['sql']]
+        self.assertEqual(len(video_queries), 1)
+        self.assertIn('ROW_NUMBER', video_queries[0])
+
+    def test_fallback_without_window_functions(self):
+        """
+        Tests that databases without window functions get the same rows.
+        """
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            self.assertEqual(get_genre_rows(2), [
+                (genre, [Video.objects.get(title=title) for title in titles]) for genre, titles in self.expected
+            ])
+
+    def test_rows_are_cached_and_revalidated(self):
+        """
+        Tests that repeat requests are served from the cache and answered with 304 if current.
+        """
+        first = self.client.get(reverse('genre-rows'))
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('genre-rows'), headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse([query for query in queries if 'videos_video' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(title='A4', video_file='videos/movie.mp4', genre=Genre.objects.get(name='Action'))
+        third = self.client.get(reverse('genre-rows'), {'limit': 1})
+        self.assertEqual(self.get_rows(third), [('Action', ['A4']), ('Drama', ['D2'])])
+
+    def test_invalid_limit_is_rejected(self):
+        """
+        Tests that a limit that is not a positive integer gets a 400.
+        """
+        self.assertEqual(self.client.get(reverse('genre-rows'), {'limit': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('genre-rows'), {'limit': 'all'}).status_code, 400)
+
+
+class GenreModelTest(APITestCase):
+    """
+    Test suite for the Genre table, its data migration and the genre endpoints.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and videos in two of the default genres.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        for title, genre in [('A1', 'Action'), ('A2', 'Action'), ('D1', 'Drama')]:
+            Video.objects.create(title=title, video_file='videos/movie.mp4', genre=Genre.objects.get(name=genre))
+
+    def test_default_genres_exist(self):
+        """
+        Tests that the data migration created the genres offered before.
+        """
+        self.assertEqual(list(Genre.objects.values_list('name', flat=True)), ['Action', 'Comedy', 'Documentary', 'Drama'])
+
+    def test_genres_are_listed_with_counts_in_one_query(self):
+        """
+        Tests that the genre list counts the videos of every genre in a single query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('genre-list'))
+        self.assertEqual(
+            [(genre['name'], genre['video_count']) for genre in response.data],
+            [('Action', 2), ('Comedy', 0), ('Documentary', 0), ('Drama', 1)]
+        )
+        self.assertEqual(len([query for query in queries if 'videos_genre' in query['sql']]), 1)
+
+    def test_serializer_accepts_genre_names_and_lists_genres_in_errors(self):
+        """
+        Tests that the genre is written and read by name and unknown names are
+        rejected with the current genres listed.
+        """
+        serializer = VideoSerializer(data={'title': 'New', 'genre': 'Comedy'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['genre'], Genre.objects.get(name='Comedy'))
+        self.assertEqual(VideoSerializer(Video.objects.get(title='D1')).data['genre'], 'Drama')
+
+        serializer = VideoSerializer(data={'title': 'New', 'genre': 'Western'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            str(serializer.errors['genre'][0]),
+            'Ungültiges Genre. Bitte wählen Sie eines der folgenden Genres: Action, Comedy, Documentary, Drama.'
+        )
+        Genre.objects.create(name='Western')
+        serializer = VideoSerializer(data={'title': 'New'})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            str(serializer.errors['genre'][0]),
+            'Das Genre ist ein Pflichtfeld. Bitte wählen Sie eines der folgenden Genres: Action, Comedy, Documentary, Drama, Western.'
+        )
+
+    def test_catalog_lists_genre_without_extra_queries(self):
+        """
+        Tests that the genre names of a catalog page are loaded with the videos.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all-videos'), {'genre': 'Action'})
+        self.assertEqual([video['genre'] for video in response.data['results']], ['Action', 'Action'])
+        self.assertEqual(len([query for query in queries if 'videos_genre' in query['sql']]), 1)
+
+    def test_genre_in_use_cannot_be_deleted(self):
+        """
+        Tests that deleting a genre that still has videos is refused.
+        """
+        with self.assertRaises(ProtectedError):
+            Genre.objects.get(name='Action').delete()
+
+
+class GenreDataMigrationTest(TransactionTestCase):
+    """
+    Test suite for moving the free-text genres into the Genre table.
+    """
+
+    def test_text_genres_are_linked_to_genre_rows(self):
+        """
+        Tests that existing free-text values become genres and are linked, and
+        that the migration can be reversed.
+        """
+        executor = MigrationExecutor(connection)
+        executor.migrate([('videos', '0010_genre')])
+        old_apps = executor.loader.project_state([('videos', '0010_genre')]).apps
+        OldVideo = old_apps.get_model('videos', 'Video')
+        OldVideo.objects.create(title='Old', video_file='videos/old.mp4', genre_name='Drama')
+        OldVideo.objects.create(title='Custom', video_file='videos/custom.mp4', genre_name=' Anime ')
+        OldVideo.objects.create(title='None', video_file='videos/none.mp4', genre_name='')
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('videos', '0011_populate_genres')])
+        new_apps = executor.loader.project_state([('videos', '0011_populate_genres')]).apps
+        NewVideo = new_apps.get_model('videos', 'Video')
+        self.assertEqual(NewVideo.objects.get(title='Old').genre.name, 'Drama')
+        self.assertEqual(NewVideo.objects.get(title='Custom').genre.name, 'Anime')
+        self.assertIsNone(NewVideo.objects.get(title='None').genre)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class VideoSearchTest(APITestCase):
+    """
+    Test suite for the full-text search over titles and descriptions.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and videos whose titles and descriptions mention sharks and whales.
+        """
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.ocean = Video.objects.create(title='Ocean Giants', description='Whales and sharks of the deep sea.', video_file='videos/a.mp4')
+        self.sharks = Video.objects.create(title='Shark Week', description='A week about ocean predators.', video_file='videos/b.mp4')
+        self.shark = Video.objects.create(title='Sharks', description='Great white sharks hunting seals.', video_file='videos/c.mp4')
+        Video.objects.create(title='Mountains', description='Alpine hiking.', video_file='videos/d.mp4')
+
+    def search(self, text, **params):
+        """
+        Searches for text and returns the response and the titles of the results.
+        """
+        response = self.client.get(reverse('video-search'), {'q': text, **params})
+        return response, [video['title'] for video in response.data.get('results', [])]
+
+    def test_title_matches_rank_above_description_matches(self):
+        """
+        Tests that videos with the word in the title come before those with it only in the description.
+        """
+        response, titles = self.search('sharks')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(titles, ['Sharks', 'Ocean Giants'])
+
+    def test_all_words_must_match_and_syntax_is_escaped(self):
+        """
+        Tests that every word must match and that FTS operators in the input are plain text.
+        """
+        self.assertEqual(self.search('whales deep')[1], ['Ocean Giants'])
+        self.assertEqual(self.search('whales seals')[1], [])
+        self.assertEqual(self.search('sharks" OR "alpine*')[1], [])
+        self.assertEqual(build_fts_query('sharks" OR (x'), '"sharks" "OR" "x"')
+
+    def test_results_are_paginated(self):
+        """
+        Tests that results are split into numbered pages.
+        """
+        response, titles = self.search('sharks', page_size=1)
+        self.assertEqual(titles, ['Sharks'])
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(self.client.get(response.data['next']).data['results'][0]['title'], 'Ocean Giants')
+
+    def test_index_follows_saves_and_deletes(self):
+        """
+        Tests that renamed and deleted videos are found by their new title or not at all.
+        """
+        self.shark.title = 'Seal Hunt'
+        self.shark.save()
+        self.assertEqual(self.search('hunt')[1], ['Seal Hunt'])
+        self.ocean.delete()
+        self.assertEqual(self.search('whales')[1], [])
+
+    def test_search_text_is_required(self):
+        """
+        Tests that a request without search text gets a 400.
+        """
+        self.assertEqual(self.client.get(reverse('video-search')).status_code, 400)
+        self.assertEqual(self.search('   ')[0].status_code, 400)
+
+
+class TitleSuggestionTest(APITestCase):
+    """
+    Test suite for the in-memory title prefix index behind search suggestions.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and videos whose titles start with or contain the same words.
+        """
+        title_index.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.ocean = Video.objects.create(title='Ocean Giants', video_file='videos/a.mp4')
+        self.deep = Video.objects.create(title='The Deep Ocean', video_file='videos/b.mp4')
+        self.uber = Video.objects.create(title='Über Wasser', video_file='videos/c.mp4')
+        self.addCleanup(title_index.clear)
+
+    def suggest(self, text, **params):
+        """
+        Requests suggestions for text and returns the response and the suggested titles.
+        """
+        response = self.client.get(reverse('title-suggestions'), {'q': text, **params})
+        return response, [video['title'] for video in response.data] if response.status_code == 200 else []
+
+    def test_title_starts_rank_above_word_matches(self):
+        """
+        Tests that titles starting with the prefix come before titles with a later word starting with it.
+        """
+        response, titles = self.suggest('oce')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(titles, ['Ocean Giants', 'The Deep Ocean'])
+        self.assertEqual(response.data[0], {'id': self.ocean.id, 'title': 'Ocean Giants'})
+        self.assertEqual(self.suggest('deep o')[1], ['The Deep Ocean'])
+        self.assertEqual(self.suggest('oce', limit=1)[1], ['Ocean Giants'])
+        self.assertEqual(self.suggest('xyz')[1], [])
+
+    def test_case_and_accents_are_ignored(self):
+        """
+        Tests that prefixes match regardless of case and accents.
+        """
+        self.assertEqual(self.suggest('UBER')[1], ['Über Wasser'])
+        self.assertEqual(self.suggest('über w')[1], ['Über Wasser'])
+
+    def test_index_updates_and_removals(self):
+        """
+        Tests that updated titles replace their old keys and removed videos are no longer suggested.
+        """
+        index = TitlePrefixIndex(ttl=60)
+        index.build([(1, 'Alpha Beta'), (2, 'Beta Gamma')])
+        self.assertEqual([video['id'] for video in index.suggest('beta', 10)], [2, 1])
+        index.update(2, 'Delta')
+        self.assertEqual(index.suggest('beta', 10), [{'id': 1, 'title': 'Alpha Beta'}])
+        self.assertEqual(index.suggest('gam', 10), [])
+        index.remove(1)
+        self.assertEqual(index.suggest('beta', 10), [])
+        self.assertEqual(index.suggest('del', 10), [{'id': 2, 'title': 'Delta'}])
+
+    def test_changes_during_a_rebuild_are_not_lost(self):
+        """
+        Tests that updates and removals arriving after the rebuild's snapshot
+        was read are applied to the new index.
+        """
+        index = TitlePrefixIndex(ttl=0)
+        index.build([(1, 'Alpha Beta'), (2, 'Beta Gamma')])
+        index.built_at -= 1
+
+        def snapshot():
+            yield (1, 'Alpha Beta')
+            yield (2, 'Beta Gamma')
+            index.update(2, 'Delta')
+            index.update(3, 'Epsilon')
+            index.remove(1)
+
+        with mock.patch('videos.suggestions.Video.objects.values_list') as values_list:
+            values_list.return_value.iterator.return_value = snapshot()
+            index.ensure_current()
+        self.assertEqual(index.suggest('beta', 10), [])
+        self.assertEqual(index.suggest('del', 10), [{'id': 2, 'title': 'Delta'}])
+        self.assertEqual(index.suggest('eps', 10), [{'id': 3, 'title': 'Epsilon'}])
+        self.assertIsNone(index.pending_changes)
+
+    def test_concurrent_cold_start_builds_once_and_keeps_changes(self):
+        """
+        Tests that a second request during the first build waits for it
+        instead of building again, and that an update made meanwhile survives.
+        """
+        index = TitlePrefixIndex(ttl=60)
+        snapshot_started, snapshot_resumed = threading.Event(), threading.Event()
+
+        def snapshot():
+            snapshot_started.set()
+            yield (1, 'Alpha')
+            snapshot_resumed.wait(timeout=5)
+            yield (2, 'Beta Old')
+
+        waiter_results = []
+
+        def wait_for_index():
+            index.ensure_current()
+            waiter_results.append(index.suggest('alp', 10))
+
+        with mock.patch('videos.suggestions.Video.objects.values_list') as values_list:
+            values_list.return_value.iterator.side_effect = lambda: snapshot()
+            builder = threading.Thread(target=index.ensure_current)
+            builder.start()
+            snapshot_started.wait(timeout=5)
+            waiter = threading.Thread(target=wait_for_index)
+            waiter.start()
+            index.update(2, 'Beta New')
+            time.sleep(0.05)
+            snapshot_resumed.set()
+            builder.join()
+            waiter.join()
+        self.assertEqual(values_list.call_count, 1)
+        self.assertEqual(waiter_results, [[{'id': 1, 'title': 'Alpha'}]])
+        self.assertEqual(index.suggest('beta', 10), [{'id': 2, 'title': 'Beta New'}])
+
+    def test_saves_and_deletes_update_the_built_index(self):
+        """
+        Tests that committed saves and deletes are applied to the index without a rebuild.
+        """
+        self.assertEqual(self.suggest('oce')[1], ['Ocean Giants', 'The Deep Ocean'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ocean.title = 'Mountain Giants'
+            self.ocean.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deep.delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.suggest('oce')[1], [])
+            self.assertEqual(self.suggest('mou')[1], ['Mountain Giants'])
+        self.assertFalse(any('videos_video' in query['sql'] for query in queries.captured_queries))
+
+    def test_invalid_requests(self):
+        """
+        Tests that an invalid limit gets a 400, an empty prefix no suggestions and anonymous users a 401.
+        """
+        self.assertEqual(self.suggest('oce', limit='abc')[0].status_code, 400)
+        self.assertEqual(self.suggest('oce', limit=0)[0].status_code, 400)
+        self.assertEqual(self.suggest('  ')[1], [])
+        self.client.force_authenticate(None)
+        self.assertEqual(self.suggest('oce')[0].status_code, 401)
+
+    def test_benchmark_command_runs(self):
+        """
+        Tests that the suggestion benchmark reports the build and lookup times.
+        """
+        output = io.StringIO()
+        call_command('benchmark_suggestions', titles=1000, queries=100, stdout=output)
+        self.assertIn('titles:         1000', output.getvalue())
+        self.assertIn('lookup:', output.getvalue())
+        self.assertIn('remove:', output.getvalue())
+
+
+class CatalogFieldsTest(APITestCase):
+    """
+    Test suite for the compact catalog representation and its sparse fieldsets.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and three fully described videos.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        for title in ['A', 'B', 'C']:
+            Video.objects.create(
+                title=title, description='A long description. ' * 50, video_file='videos/movie.mp4',
+                resolutions={'480p': 'videos/movie_480p.mp4'}, genre=Genre.objects.get(name='Drama'), duration=60.0
+            )
+
+    def get_catalog(self, url_name='all-videos', **params):
+        """
+        Requests a catalog endpoint and returns the response and the SQL of its video queries.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name), params)
+        return response, [query['sql'] for query in queries if 'videos_video' in query['sql']]
+
+    def test_default_items_are_compact(self):
+        """
+        Tests that catalog items have only the list fields and unused columns are not loaded.
+        """
+        response, video_queries = self.get_catalog()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'thumbnail', 'genre'])
+        self.assertEqual(response.data['results'][0]['genre'], 'Drama')
+        self.assertEqual(len(video_queries), 1)
+        self.assertNotIn('"description"', video_queries[0])
+        self.assertNotIn('"resolutions"', video_queries[0])
+
+    def test_requested_fields_are_returned_and_loaded(self):
+        """
+        Tests that the fields parameter selects the item fields and the loaded columns.
+        """
+        response, video_queries = self.get_catalog(fields='title,duration,hls_url', ordering='title', page_size=2)
+        self.assertEqual(response.data['results'], [
+            {'title': 'A', 'duration': 60.0, 'hls_url': None}, {'title': 'B', 'duration': 60.0, 'hls_url': None}
+        ])
+        self.assertEqual(len(video_queries), 1)
+        self.assertNotIn('videos_genre', video_queries[0])
+        self.assertNotIn('"description"', video_queries[0])
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(next_page.data['results'], [{'title': 'C', 'duration': 60.0, 'hls_url': None}])
+
+    def test_unknown_fields_get_400(self):
+        """
+        Tests that unknown or missing field names are rejected.
+        """
+        self.assertEqual(self.get_catalog(fields='title,password')[0].status_code, 400)
+        self.assertEqual(self.get_catalog(fields=',')[0].status_code, 400)
+        self.assertEqual(self.get_catalog('genre-rows', fields='secret')[0].status_code, 400)
+
+    def test_genre_rows_use_the_same_representation(self):
+        """
+        Tests that genre rows are compact by default and accept the fields parameter.
+        """
+        response, video_queries = self.get_catalog('genre-rows')
+        self.assertEqual(list(response.data['genres'][0]['videos'][0]), ['id', 'title', 'thumbnail', 'genre'])
+        self.assertEqual(len(video_queries), 1)
+        self.assertNotIn('"description"', video_queries[0])
+        response = self.get_catalog('genre-rows', fields='title')[0]
+        self.assertEqual(response.data['genres'][0]['videos'], [{'title': 'C'}, {'title': 'B'}, {'title': 'A'}])
+
+
+class RenditionLadderTest(TestCase):
+    """
+    Test suite for the ffprobe metadata and the rendition ladder built from it.
+    """
+
+    def test_probe_output_is_parsed(self):
+        """
+        Tests that duration, dimensions, frame rate, bitrate, codecs and the
+        keyframe interval are read from ffprobe's output.
+        """
+        metadata = parse_probe_output(PROBE_OUTPUT)
+        self.assertEqual(metadata['duration'], 120.0)
+        self.assertEqual((metadata['width'], metadata['height']), (1920, 1080))
+        self.assertEqual(metadata['frame_rate'], 29.97)
+        self.assertEqual(metadata['bitrate'], 8000000)
+        self.assertEqual((metadata['video_codec'], metadata['audio_codec']), ('h264', 'aac'))
+        self.assertEqual(parse_keyframe_interval(KEYFRAME_PROBE_OUTPUT), 2.002)
+
+    def test_ladder_skips_upscaling(self):
+        """
+        Tests that a 480p source only gets the renditions up to 360p, and a
+        source below the lowest rung still gets the lowest rendition.
+        """
+        self.assertEqual([rendition[0] for rendition in build_rendition_ladder(Video(height=480))], ['120p', '360p'])
+        self.assertEqual([rendition[0] for rendition in build_rendition_ladder(Video(height=96))], ['120p'])
+
+    def test_ladder_bitrate_is_capped_at_source_bitrate(self):
+        """
+        Tests that no rendition is given a higher maximum bitrate than the source.
+        """
+        ladder = build_rendition_ladder(Video(height=1080, bitrate=2000000))
+        self.assertEqual([rendition[2] for rendition in ladder], [250, 1000, 2000, 2000])
+
+    def test_convert_video_task_stores_metadata_and_skips_upscales(self):
+        """
+        Tests that convert_video_task stores the probed metadata and only
+        creates the renditions the source can fill.
+        """
+        small_probe = PROBE_OUTPUT.replace('1920', '854').replace('1080', '480')
+
+        def fake_run(command, **kwargs):
+            if command[0] == 'ffprobe' and '-read_intervals' not in command:
+                return subprocess.CompletedProcess(command, 0, stdout=small_probe, stderr='')
+            return fake_ffmpeg_run(command)
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        video = Video.objects.create(title='Test Video', video_file='videos/small.mp4')
+        with self.settings(MEDIA_ROOT=media_root, VIDEO_TRANSCODE_STRATEGY='single_decode', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_run):
+            convert_video_task(video.id)
+
+        video.refresh_from_db()
+        self.assertEqual(video.height, 480)
+        self.assertEqual(video.keyframe_interval, 2.002)
+        self.assertEqual(list(video.resolutions), ['120p', '360p'])
+
+
+class UploadDeduplicationTest(APITestCase):
+    """
+    Test suite for the content-hash deduplication of uploads.
+    """
+
+    def setUp(self):
+        """
+        Creates an admin user, authenticates the client and uses a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword', email='admin@example.com')
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, content):
+        """
+        Uploads a video file with the given content and returns the response.
+        """
+        data = {'title': 'Upload', 'genre': 'Drama', 'video_file': SimpleUploadedFile('movie.mp4', content)}
+        with self.settings(MEDIA_ROOT=self.media_root):
+            return self.client.post(reverse('video-upload'), data, format='multipart')
+
+    def test_reupload_reuses_existing_conversion(self):
+        """
+        Tests that a second upload of identical content is not converted again
+        and reuses the stored file, renditions and thumbnail.
+        """
+        with mock.patch('videos.views.convert_video_task.delay') as delay:
+            first = self.upload(b'same content')
+            original = Video.objects.get(pk=first.data['id'])
+            original.resolutions = {'360p': '/media/videos/1_movie/360p.mp4'}
+            original.thumbnail = 'videos/1_movie/thumbnail.jpg'
+            original.save()
+            second = self.upload(b'same content')
+
+        self.assertEqual(delay.call_count, 1)
+        duplicate = Video.objects.get(pk=second.data['id'])
+        self.assertEqual(duplicate.content_hash, hashlib.sha256(b'same content').hexdigest())
+        self.assertEqual(duplicate.resolutions, original.resolutions)
+        self.assertEqual(duplicate.thumbnail.name, original.thumbnail.name)
+        self.assertEqual(duplicate.video_file.name, original.video_file.name)
+
+    def test_different_content_is_converted(self):
+        """
+        Tests that uploads with different content are each converted.
+        """
+        with mock.patch('videos.views.convert_video_task.delay') as delay:
+            self.upload(b'first content')
+            self.upload(b'second content')
+        self.assertEqual(delay.call_count, 2)
+
+
+
+class CheckpointedTranscodingTest(TestCase):
+    """
+    Test suite for the per-rendition job state of convert_video_task.
+    """
+
+    def setUp(self):
+        """
+        Creates a video and a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.video = Video.objects.create(title='Test Video', video_file='videos/My Movie.mp4')
+
+    def convert(self, run):
+        """
+        Runs convert_video_task in the sequential strategy with the given subprocess.run stand-in.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='sequential', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(run):
+            convert_video_task(self.video.id)
+
+    def test_retry_skips_completed_renditions(self):
+        """
+        Tests that a retry after a failure at 1080p only transcodes 1080p,
+        and that the finished renditions are recorded with size and checksum.
+        """
+        def fail_1080p(command, **kwargs):
+            if any('1080p' in argument for argument in command):
+                raise subprocess.CalledProcessError(1, 'ffmpeg')
+            return fake_ffmpeg_run(command)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.convert(fail_1080p)
+
+        jobs = {job.resolution: job for job in RenditionJob.objects.filter(video=self.video)}
+        self.assertEqual(jobs['720p'].status, RenditionJob.STATUS_DONE)
+        self.assertGreater(jobs['720p'].output_size, 0)
+        self.assertEqual(len(jobs['720p'].checksum), 64)
+        self.assertEqual(jobs['1080p'].status, RenditionJob.STATUS_FAILED)
+
+        commands = []
+        self.convert(lambda command, **kwargs: commands.append(command) or fake_ffmpeg_run(command))
+        transcoded = [command[-1] for command in commands if command[0] == 'ffmpeg' and command[-1].endswith('.mp4')]
+        self.assertEqual(len(transcoded), 1)
+        self.assertTrue(transcoded[0].endswith('1080p.part.mp4'))
+        self.assertEqual(RenditionJob.objects.get(video=self.video, resolution='1080p').status, RenditionJob.STATUS_DONE)
+
+    def test_modified_rendition_is_transcoded_again(self):
+        """
+        Tests that a rendition whose file no longer matches its checksum is
+        not trusted and is transcoded again.
+        """
+        self.convert(fake_ffmpeg_run)
+        output_path = os.path.join(self.media_root, 'videos', f'{self.video.id}_My_Movie', '360p.mp4')
+        with open(output_path, 'r+b') as output_file:
+            output_file.write(b'X')
+
+        commands = []
+        self.convert(lambda command, **kwargs: commands.append(command) or fake_ffmpeg_run(command))
+        self.assertEqual([command[-1] for command in commands if command[0] == 'ffmpeg'], [get_partial_path(output_path)])
+        self.assertFalse(os.path.exists(get_partial_path(output_path)))
+
+
+
+class TranscodeProgressTest(APITestCase):
+    """
+    Test suite for the transcoding progress store and its API endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates a video, an admin user and a temporary MEDIA_ROOT, and clears the cache.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        cache.clear()
+        self.video = Video.objects.create(title='Test Video', video_file='videos/My Movie.mp4')
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword', email='admin@example.com')
+
+    def test_reporter_publishes_percent_speed_and_eta(self):
+        """
+        Tests that a progress report is converted into percent, speed and ETA.
+        """
+        start_progress(self.video.id, ['720p'])
+        ProgressReporter(self.video.id, ['720p'], 120.0)(30.0, 2.0, False)
+        progress = get_progress(self.video.id)['renditions']['720p']
+        self.assertEqual(progress['status'], 'running')
+        self.assertEqual(progress['percent'], 25.0)
+        self.assertEqual(progress['speed'], 2.0)
+        self.assertEqual(progress['eta'], 45.0)
+
+    def test_conversion_progress_is_exposed_to_admins(self):
+        """
+        Tests that a finished conversion reports every rendition as done and
+        that the endpoint is restricted to admin users.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root, VIDEO_TRANSCODE_STRATEGY='single_decode', VIDEO_HLS_ENABLED=False, VIDEO_TRICKPLAY_ENABLED=False), \
+                patch_ffmpeg(fake_ffmpeg_run):
+            convert_video_task(self.video.id)
+
+        url = reverse('transcode-progress', args=[self.video.id])
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['renditions']), {'120p', '360p', '720p', '1080p'})
+        self.assertEqual(response.data['renditions']['1080p']['status'], 'done')
+        self.assertEqual(self.client.get(reverse('transcode-progress', args=[self.video.id + 1])).status_code, 404)
+
+
+class CeleryQueueRoutingTest(TestCase):
+    """
+    Tests the routing of tasks to the transcode, short and maintenance queues.
+    """
+
+    def get_queue(self, task_name):
+        return celery_app.amqp.router.route({}, task_name)['queue'].name
+
+    def test_tasks_are_routed_to_their_queues(self):
+        """
+        Tests that conversion tasks go to the transcode queue, periodic cleanup
+        to the maintenance queue and everything else to the short queue.
+        """
+        self.assertEqual(self.get_queue('videos.tasks.convert_video_task'), 'transcode')
+        self.assertEqual(self.get_queue('videos.tasks.transcode_segment_task'), 'transcode')
+        self.assertEqual(self.get_queue('users.tasks.cleanup_inactive_users'), 'maintenance')
+        self.assertEqual(self.get_queue('videoflix_backend.celery.debug_task'), 'short')
+
+    def test_late_acknowledged_tasks_outlive_the_visibility_timeout(self):
+        """
+        Tests that Redis does not redeliver a late acknowledged transcode
+        after its default visibility timeout of one hour.
+        """
+        self.assertTrue(convert_video_task.acks_late)
+        self.assertGreater(celery_app.conf.broker_transport_options['visibility_timeout'], 60 * 60)
+
+    def start_worker(self, *args):
+        """
+        Runs "celery worker" with the given arguments up to the point where it
+        would start consuming, and returns the worker.
+        """
+        workers = []
+        with mock.patch.object(WorkController, 'start', lambda worker: workers.append(worker)), \
+                mock.patch.object(WorkController, 'exitcode', 0, create=True):
+            result = CliRunner().invoke(celery_command, ['-A', 'videoflix_backend', 'worker', '-P', 'solo', *args])
+        self.assertEqual(result.exit_code, 0, repr(result.exception))
+        return workers[0]
+
+    def test_worker_takes_profile_of_its_queue(self):
+        """
+        Tests that a worker consuming one queue runs with that queue's
+        concurrency and prefetch, unless they are given on the command line,
+        and that a worker consuming several queues is left alone.
+        """
+        transcode = settings.CELERY_WORKER_QUEUE_PROFILES['transcode']
+        short = settings.CELERY_WORKER_QUEUE_PROFILES['short']
+        worker = self.start_worker('-Q', 'transcode')
+        self.assertEqual((worker.concurrency, worker.prefetch_multiplier), (transcode['concurrency'], 1))
+        self.assertEqual(worker.consumer.prefetch_multiplier, 1)
+        worker = self.start_worker('-Q', 'short', '--prefetch-multiplier', '3')
+        self.assertEqual((worker.concurrency, worker.prefetch_multiplier), (short['concurrency'], 3))
+        worker = self.start_worker('-Q', 'transcode,short', '--concurrency', '5')
+        self.assertEqual((worker.concurrency, worker.prefetch_multiplier), (5, celery_app.conf.worker_prefetch_multiplier))
@@ -0,0 +1,196 @@
+import contextlib
+import os
+import time
+import uuid
+from django.conf import settings
+from PIL import Image, features
+from .streaming import stat_stream_file
+
+VARIANTS_DIRNAME = 'thumbnail_variants'
+VARIANT_QUALITY = 80
+
+# Output formats of the thumbnail variants: query value -> (Pillow format,
+# content type, file extension, Pillow feature that must be available).
+THUMBNAIL_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', None),
+    'webp': ('WEBP', 'image/webp', 'webp', 'webp'),
+    'avif': ('AVIF', 'image/avif', 'avif', 'avif'),
+}
+
+
+class InvalidThumbnailVariant(Exception):
+    """
+    Raised when the requested width or format of a thumbnail variant is not available.
+    """
+
+
+def get_thumbnail_version(stream_file):
+    """
+    Returns the version of a thumbnail file used in URLs and variant names.
+
+    Args:
+        stream_file (StreamFile): The path and validators of the thumbnail.
+
+    Returns:
+        str: The hexadecimal modification time and size, e.g. '17c9f3a2b1e-5f5e1'.
+    """
+    return stream_file.etag.strip('"')
+
+
+def is_format_supported(image_format):
+    """
+    Returns whether the installed Pillow can write a thumbnail format.
+
+    AVIF support depends on how Pillow was built and is checked with
+    PIL.features, like WebP.
+    """
+    feature = THUMBNAIL_FORMATS[image_format][3]
+    return feature is None or (feature in features.modules and features.check_module(feature))
+
+
+def parse_variant_params(query_params):
+    """
+    Reads the requested width and format of a thumbnail variant.
+
+    Args:
+        query_params (QueryDict): The query parameters of the request.
+
+    Returns:
+        tuple: The width in pixels or None for the original width, and the
+               format name or None for the original JPEG.
+
+    Raises:
+        InvalidThumbnailVariant: If the width is not one of
+                                 settings.VIDEO_THUMBNAIL_WIDTHS or the format
+                                 is unknown or not supported by Pillow.
+    """
+    width = query_params.get('w')
+    image_format = query_params.get('format')
+    if width is not None:
+        if not width.isdigit() or int(width) not in settings.VIDEO_THUMBNAIL_WIDTHS:
+            raise InvalidThumbnailVariant(
+                f"Invalid width: '{width}'. Available widths: {settings.VIDEO_THUMBNAIL_WIDTHS}")
+        width = int(width)
+    if image_format is not None:
+        if image_format not in THUMBNAIL_FORMATS:
+            raise InvalidThumbnailVariant(
+                f"Invalid format: '{image_format}'. Available formats: {list(THUMBNAIL_FORMATS)}")
+        if not is_format_supported(image_format):
+            raise InvalidThumbnailVariant(f"The format '{image_format}' is not supported by this server.")
+    return width, image_format
+
+
+def get_variant_path(stream_file, width, image_format):
+    """
+    Returns the path of a thumbnail variant in the disk cache.
+
+    Variants are stored next to the thumbnail and named after its version,
+    so a replaced thumbnail never serves variants of the old image.
+
+    Args:
+        stream_file (StreamFile): The path and validators of the thumbnail.
+        width (int): The width of the variant, or None for the original width.
+        image_format (str): The format name of the variant.
+
+    Returns:
+        str: The absolute path of the variant.
+    """
+    extension = THUMBNAIL_FORMATS[image_format][2]
+    variants_dir = os.path.join(os.path.dirname(stream_file.path), VARIANTS_DIRNAME)
+    return os.path.join(variants_dir, f"{get_thumbnail_version(stream_file)}-w{width or 'orig'}.{extension}")
+
+
+def render_thumbnail_variant(stream_file, width, image_format):
+    """
+    Returns the path of a thumbnail variant, rendering it with Pillow on first use.
+
+    The variant is written to a temporary file of its own and renamed into
+    place, so concurrent requests, also from threads of the same process,
+    never serve or overwrite a partially written image. Variants of
+    earlier versions of the thumbnail are removed at the same time. Images
+    are only scaled down, never up.
+
+    Args:
+        stream_file (StreamFile): The path and validators of the thumbnail.
+        width (int): The width of the variant, or None for the original width.
+        image_format (str): The format name of the variant.
+
+    Returns:
+        str: The absolute path of the variant.
+    """
+    variant_path = get_variant_path(stream_file, width, image_format)
+    if os.path.exists(variant_path):
+        return variant_path
+
+    variants_dir = os.path.dirname(variant_path)
+    os.makedirs(variants_dir, exist_ok=True)
+    version_prefix = f'{get_thumbnail_version(stream_file)}-'
+    for filename in os.listdir(variants_dir):
+        if not filename.startswith(version_prefix):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(variants_dir, filename))
+
+    pillow_format = THUMBNAIL_FORMATS[image_format][0]
+    with Image.open(stream_file.path) as image:
+        image = image.convert('RGB')
+        if width and width < image.width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+        temporary_path = f'{variant_path}.{uuid.uuid4().hex}.part'
+        try:
+            image.save(temporary_path, format=pillow_format, quality=VARIANT_QUALITY)
+            os.replace(temporary_path, variant_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary_path)
+            raise
+    return variant_path
+
+
+def get_thumbnail_cache_control(query_params, stream_file):
+    """
+    Returns the Cache-Control header of a thumbnail response.
+
+    URLs issued by SignedMediaURLView carry the thumbnail's version in the
+    "v" parameter. Such a URL always returns the same image, so it is cached
+    as immutable until the signature expires, at most for
+    settings.VIDEO_THUMBNAIL_CACHE_MAX_AGE. Without a current version the
+    browser has to revalidate, which is answered with 304 via the ETag.
+
+    Args:
+        query_params (QueryDict): The query parameters of the request.
+        stream_file (StreamFile): The path and validators of the thumbnail.
+
+    Returns:
+        str: The Cache-Control header value.
+    """
+    if query_params.get('v') != get_thumbnail_version(stream_file):
+        return 'private, no-cache'
+    max_age = settings.VIDEO_THUMBNAIL_CACHE_MAX_AGE
+    if settings.VIDEO_STREAM_SIGNATURE_REQUIRED:
+        max_age = max(0, min(max_age, int(query_params.get('expires', 0)) - int(time.time())))
+    return f'private, max-age={max_age}, immutable'
+
+
+def resolve_thumbnail(thumbnail_path, query_params):
+    """
+    Resolves the file, content type and Cache-Control header of a thumbnail request.
+
+    Args:
+        thumbnail_path (str): The absolute path of the original thumbnail.
+        query_params (QueryDict): The query parameters of the request.
+
+    Returns:
+        tuple: The absolute path of the file to send, its content type and
+               the Cache-Control header.
+
+    Raises:
+        InvalidThumbnailVariant: If the requested variant is not available.
+        FileNotFoundError: If the thumbnail does not exist.
+    """
+    width, image_format = parse_variant_params(query_params)
+    stream_file = stat_stream_file(thumbnail_path)
+    cache_control = get_thumbnail_cache_control(query_params, stream_file)
+    if width is None and image_format in (None, 'jpeg'):
+        return thumbnail_path, 'image/jpeg', cache_control
+    image_format = image_format or 'jpeg'
+    return render_thumbnail_variant(stream_file, width, image_format), THUMBNAIL_FORMATS[image_format][1], cache_control
@@ -0,0 +1,1036 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from django.conf import settings
+from .utils import sanitize_filename
+
+# (resolution name, height in pixels, maximum video bitrate in kbit/s)
+RENDITION_LADDER = [
+    ("120p", 120, 250),
+    ("360p", 360, 1000),
+    ("720p", 720, 3500),
+    ("1080p", 1080, 6500),
+]
+
+RESOLUTIONS = {resolution_name: f"{resolution_name}.mp4" for resolution_name, height, max_bitrate in RENDITION_LADDER}
+
+THUMBNAIL_FILENAME = 'thumbnail.jpg'
+THUMBNAIL_OFFSET_SECONDS = 30
+
+HLS_DIRNAME = 'hls'
+HLS_MASTER_PLAYLIST = 'master.m3u8'
+HLS_PLAYLIST = 'index.m3u8'
+HLS_INIT_FILENAME = 'init.mp4'
+
+# RFC 6381 codec strings of the master playlist's CODECS attribute: the
+# profile_idc and constraint flags of each H.264 profile ffprobe reports,
+# followed by the level in hex, and AAC-LC.
+H264_PROFILE_CODECS = {
+    'Constrained Baseline': 'avc1.42e0',
+    'Baseline': 'avc1.4200',
+    'Main': 'avc1.4d40',
+    'High': 'avc1.6400',
+}
+AAC_LC_CODEC = 'mp4a.40.2'
+
+TRICKPLAY_DIRNAME = 'trickplay'
+TRICKPLAY_INDEX = 'thumbnails.vtt'
+
+# HLS and trickplay outputs are written to a new "v<version>" directory on
+# every conversion, so their URLs never serve other content.
+PACKAGE_VERSION_PREFIX = 'v'
+
+
+def get_video_folder_name(video):
+    """
+    Returns the name of the folder that holds all converted files of a video.
+
+    The folder name combines the video id with the sanitized name of the
+    uploaded file, e.g. "12_my_movie".
+
+    Args:
+        video (Video): The Video instance.
+
+    Returns:
+        str: The folder name relative to MEDIA_ROOT/videos.
+    """
+    original_filename_without_extension = os.path.splitext(os.path.basename(video.video_file.name))[0]
+    sanitized_filename = sanitize_filename(original_filename_without_extension)
+    return f"{video.id}_{sanitized_filename}"
+
+
+def get_output_dir(video):
+    """
+    Returns the absolute output directory of a video and makes sure it exists.
+
+    Args:
+        video (Video): The Video instance.
+
+    Returns:
+        str: The absolute path of the output directory.
+    """
+    output_base_dir = os.path.join(settings.MEDIA_ROOT, 'videos', get_video_folder_name(video))
+    os.makedirs(output_base_dir, exist_ok=True)
+    return output_base_dir
+
+
+def get_rendition_url(video, output_filename):
+    """
+    Returns the media URL under which a converted file of a video is served.
+
+    Args:
+        video (Video): The Video instance.
+        output_filename (str): The file name inside the video's output folder.
+
+    Returns:
+        str: The URL, e.g. "/media/videos/12_my_movie/720p.mp4".
+    """
+    return os.path.join(settings.MEDIA_URL, 'videos', get_video_folder_name(video), output_filename).replace('\\', '/')
+
+
+def get_rendition_path(rendition_url):
+    """
+    Returns the absolute path of a converted file from its media URL.
+
+    Args:
+        rendition_url (str): The URL as returned by get_rendition_url.
+
+    Returns:
+        str: The absolute path below MEDIA_ROOT.
+    """
+    relative_path = rendition_url[len(settings.MEDIA_URL):] if rendition_url.startswith(settings.MEDIA_URL) else rendition_url.lstrip('/')
+    return os.path.normpath(os.path.join(settings.MEDIA_ROOT, relative_path))
+
+
+def get_thumbnail_name(video):
+    """
+    Returns the thumbnail path of a video relative to MEDIA_ROOT.
+
+    Args:
+        video (Video): The Video instance.
+
+    Returns:
+        str: The relative path as stored in Video.thumbnail.
+    """
+    return os.path.join('videos', get_video_folder_name(video), THUMBNAIL_FILENAME).replace('\\', '/')
+
+
+def build_probe_command(source_path):
+    """
+    Builds the ffprobe command that reads the container and stream metadata of the source.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+
+    Returns:
+        list: The ffprobe command.
+    """
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        source_path
+    ]
+
+
+def build_keyframe_probe_command(source_path, probe_seconds=60):
+    """
+    Builds the ffprobe command that lists the video packets of the first seconds of the source.
+
+    Only packet headers are read, nothing is decoded, so the command stays
+    cheap even for long uploads.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        probe_seconds (int): How many seconds from the start to inspect.
+
+    Returns:
+        list: The ffprobe command.
+    """
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f'%+{probe_seconds}',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        source_path
+    ]
+
+
+def parse_frame_rate(value):
+    """
+    Converts an ffprobe frame rate such as "30000/1001" into frames per second.
+
+    Args:
+        value (str): The frame rate as reported by ffprobe.
+
+    Returns:
+        float: The frame rate, or None if it is unknown.
+    """
+    if not value:
+        return None
+    numerator, _, denominator = value.partition('/')
+    try:
+        frame_rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(frame_rate, 3) if frame_rate else None
+
+
+def parse_probe_output(output):
+    """
+    Extracts the source metadata stored on the Video model from ffprobe's JSON output.
+
+    Args:
+        output (str): The output of the command built by build_probe_command.
+
+    Returns:
+        dict: The duration, width, height, frame_rate, bitrate, video_codec
+              and audio_codec of the source. Unknown values are None or empty.
+    """
+    probe = json.loads(output or '{}')
+    format_info = probe.get('format', {})
+    streams = probe.get('streams', [])
+    video_stream = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    audio_stream = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+    duration = format_info.get('duration') or video_stream.get('duration')
+    bitrate = video_stream.get('bit_rate') or format_info.get('bit_rate')
+    return {
+        'duration': float(duration) if duration else None,
+        'width': video_stream.get('width'),
+        'height': video_stream.get('height'),
+        'frame_rate': parse_frame_rate(video_stream.get('avg_frame_rate') or video_stream.get('r_frame_rate')),
+        'bitrate': int(bitrate) if bitrate else None,
+        'video_codec': video_stream.get('codec_name', ''),
+        'audio_codec': audio_stream.get('codec_name', ''),
+    }
+
+
+def parse_keyframe_interval(output):
+    """
+    Computes the average distance between keyframes from ffprobe's packet list.
+
+    Args:
+        output (str): The output of the command built by build_keyframe_probe_command.
+
+    Returns:
+        float: The average keyframe interval in seconds, or None if fewer than
+               two keyframes were found.
+    """
+    keyframe_times = []
+    for line in (output or '').splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframe_times.append(float(pts_time))
+    if len(keyframe_times) < 2:
+        return None
+    return round((keyframe_times[-1] - keyframe_times[0]) / (len(keyframe_times) - 1), 3)
+
+
+def probe_video(source_path):
+    """
+    Reads the metadata of an uploaded video with ffprobe.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+
+    Returns:
+        dict: The metadata returned by parse_probe_output plus keyframe_interval.
+
+    Raises:
+        subprocess.CalledProcessError: If ffprobe fails to read the source.
+    """
+    metadata = parse_probe_output(run_ffmpeg(build_probe_command(source_path), "probe").stdout)
+    metadata['keyframe_interval'] = parse_keyframe_interval(
+        run_ffmpeg(build_keyframe_probe_command(source_path), "keyframe probe").stdout
+    )
+    return metadata
+
+
+def build_rendition_ladder(video):
+    """
+    Selects the renditions to create for a video from its probed metadata.
+
+    Only renditions at or below the source height are produced, so a source
+    is never upscaled; a source smaller than the lowest rung still gets the
+    lowest rendition. The maximum bitrate of every rendition is capped at the
+    bitrate of the source, since encoding above it cannot add quality.
+
+    Args:
+        video (Video): The Video instance with probed metadata. Without a
+                       known height the full ladder is returned.
+
+    Returns:
+        list: Tuples of (resolution name, height, maximum bitrate in kbit/s).
+    """
+    ladder = [
+        (resolution_name, height, max_bitrate) for resolution_name, height, max_bitrate in RENDITION_LADDER
+        if not video.height or height <= video.height
+    ] or RENDITION_LADDER[:1]
+    if video.bitrate:
+        source_bitrate = max(video.bitrate // 1000, 1)
+        ladder = [
+            (resolution_name, height, min(max_bitrate, source_bitrate)) for resolution_name, height, max_bitrate in ladder
+        ]
+    return ladder
+
+
+def get_rendition(video, resolution_name):
+    """
+    Returns the ladder entry of a single resolution of a video.
+
+    Args:
+        video (Video): The Video instance.
+        resolution_name (str): The resolution, e.g. "720p".
+
+    Returns:
+        tuple: The resolution name, height and maximum bitrate in kbit/s.
+
+    Raises:
+        KeyError: If the resolution is not part of the video's ladder.
+    """
+    for rendition in build_rendition_ladder(video):
+        if rendition[0] == resolution_name:
+            return rendition
+    raise KeyError(resolution_name)
+
+
+def get_thumbnail_offset(video):
+    """
+    Returns the position in seconds at which the thumbnail is taken.
+
+    Uses THUMBNAIL_OFFSET_SECONDS, or the middle of the video for sources
+    shorter than twice that.
+
+    Args:
+        video (Video): The Video instance with probed metadata.
+
+    Returns:
+        float: The thumbnail position in seconds.
+    """
+    if video.duration and video.duration < 2 * THUMBNAIL_OFFSET_SECONDS:
+        return round(video.duration / 2, 3)
+    return THUMBNAIL_OFFSET_SECONDS
+
+
+def get_scale_filter(height):
+    """
+    Returns the FFmpeg scale filter for a target height.
+
+    The width follows the aspect ratio of the source and is rounded down to
+    an even number, which libx264 requires.
+
+    Args:
+        height (int): The target height in pixels.
+
+    Returns:
+        str: The scale filter expression.
+    """
+    return f'scale=trunc(oh*a/2)*2:{height}'
+
+
+def get_video_encoder_args(max_bitrate=None):
+    """
+    Returns the FFmpeg video encoder arguments shared by all renditions.
+
+    Keyframes are forced at every multiple of settings.VIDEO_HLS_SEGMENT_DURATION
+    so that all renditions can be cut into aligned HLS segments without
+    re-encoding.
+
+    Args:
+        max_bitrate (int, optional): Caps the constant-quality encode at this
+                                     bitrate in kbit/s.
+
+    Returns:
+        list: The codec and quality arguments for the video stream.
+    """
+    args = [
+        '-c:v', 'libx264',
+        '-preset', 'slow',
+        '-crf', '22',
+        '-force_key_frames', f'expr:gte(t,n_forced*{settings.VIDEO_HLS_SEGMENT_DURATION})',
+    ]
+    if max_bitrate:
+        args += ['-maxrate', f'{max_bitrate}k', '-bufsize', f'{2 * max_bitrate}k']
+    return args
+
+
+def get_audio_encoder_args():
+    """
+    Returns the FFmpeg audio encoder arguments shared by all renditions.
+
+    Returns:
+        list: The codec and bitrate arguments for the audio stream.
+    """
+    return [
+        '-c:a', 'aac',
+        '-b:a', '128k',
+    ]
+
+
+def get_encoder_args(max_bitrate=None):
+    """
+    Returns the FFmpeg encoder arguments shared by all renditions.
+
+    Args:
+        max_bitrate (int, optional): The maximum video bitrate in kbit/s.
+
+    Returns:
+        list: The codec and quality arguments for video and audio.
+    """
+    return get_video_encoder_args(max_bitrate) + get_audio_encoder_args()
+
+
+def build_rendition_command(source_path, height, output_path, max_bitrate=None):
+    """
+    Builds the FFmpeg command that converts the source into one rendition.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        height (int): The target height in pixels.
+        output_path (str): The absolute path of the rendition to create.
+        max_bitrate (int, optional): The maximum video bitrate in kbit/s.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    return [
+        'ffmpeg', '-y',
+        '-i', source_path,
+        '-vf', get_scale_filter(height),
+        *get_encoder_args(max_bitrate),
+        output_path
+    ]
+
+
+def build_thumbnail_command(source_path, output_path, offset=THUMBNAIL_OFFSET_SECONDS):
+    """
+    Builds the FFmpeg command that extracts the thumbnail from the source.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        output_path (str): The absolute path of the thumbnail to create.
+        offset (float, optional): The position of the thumbnail in seconds.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    return [
+        'ffmpeg', '-y',
+        '-i', source_path,
+        '-ss', f'{offset}',
+        '-vframes', '1',
+        '-vf', 'scale=320:-1',
+        output_path
+    ]
+
+
+def build_single_decode_command(source_path, outputs, thumbnail_path=None, thumbnail_offset=THUMBNAIL_OFFSET_SECONDS):
+    """
+    Builds one FFmpeg command that writes every rendition from a single decode.
+
+    The decoded video stream is fanned out with the split filter into one
+    scale branch per rendition and, optionally, a branch for the thumbnail.
+    Compared to one process per rendition the source is decoded only once.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        outputs (list): Tuples of (height, max_bitrate, output_path) for every
+                        rendition, max_bitrate in kbit/s or None.
+        thumbnail_path (str, optional): The absolute path of the thumbnail to
+                                        create. No thumbnail branch is added if omitted.
+        thumbnail_offset (float, optional): The position of the thumbnail in seconds.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    branch_count = len(outputs) + (1 if thumbnail_path else 0)
+    split_labels = ''.join(f'[s{index}]' for index in range(branch_count))
+    filters = [f'[0:v]split={branch_count}{split_labels}']
+    for index, (height, max_bitrate, output_path) in enumerate(outputs):
+        filters.append(f'[s{index}]{get_scale_filter(height)}[v{index}]')
+    if thumbnail_path:
+        filters.append(
+            f'[s{len(outputs)}]trim=start={thumbnail_offset},setpts=PTS-STARTPTS,scale=320:-1[thumb]'
+        )
+
+    command = ['ffmpeg', '-y', '-i', source_path, '-filter_complex', ';'.join(filters)]
+    for index, (height, max_bitrate, output_path) in enumerate(outputs):
+        command += ['-map', f'[v{index}]', '-map', '0:a?', *get_encoder_args(max_bitrate), output_path]
+    if thumbnail_path:
+        command += ['-map', '[thumb]', '-frames:v', '1', thumbnail_path]
+    return command
+
+
+def get_segment_dir(output_base_dir):
+    """
+    Returns the directory that holds the intermediate files of a segmented
+    conversion and makes sure it exists.
+
+    Args:
+        output_base_dir (str): The absolute output directory of the video.
+
+    Returns:
+        str: The absolute path of the segment directory.
+    """
+    segment_dir = os.path.join(output_base_dir, 'segments')
+    os.makedirs(segment_dir, exist_ok=True)
+    return segment_dir
+
+
+def build_segment_split_command(source_path, segment_dir, segment_duration):
+    """
+    Builds the FFmpeg command that splits the video stream of the source into segments.
+
+    The stream is copied, not re-encoded, so the segment muxer can only cut at
+    keyframes: every segment starts at the first keyframe after the previous
+    one reached segment_duration seconds. Audio is left out and added back
+    from the source when the transcoded segments are concatenated.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        segment_dir (str): The directory to write the segments to.
+        segment_duration (int): The target segment duration in seconds.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    return [
+        'ffmpeg', '-y',
+        '-i', source_path,
+        '-map', '0:v:0',
+        '-an',
+        '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(segment_duration),
+        '-reset_timestamps', '1',
+        os.path.join(segment_dir, 'source_%05d.mkv')
+    ]
+
+
+def list_source_segments(segment_dir):
+    """
+    Returns the file names of the source segments in playback order.
+
+    Args:
+        segment_dir (str): The directory the source was split into.
+
+    Returns:
+        list: The sorted segment file names.
+    """
+    return sorted(name for name in os.listdir(segment_dir) if name.startswith('source_') and name.endswith('.mkv'))
+
+
+def build_segment_transcode_command(segment_path, height, output_path, max_bitrate=None):
+    """
+    Builds the FFmpeg command that converts one source segment into one rendition.
+
+    Args:
+        segment_path (str): The absolute path of the source segment.
+        height (int): The target height in pixels.
+        output_path (str): The absolute path of the transcoded segment.
+        max_bitrate (int, optional): The maximum video bitrate in kbit/s.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    return [
+        'ffmpeg', '-y',
+        '-i', segment_path,
+        '-vf', get_scale_filter(height),
+        '-an',
+        *get_video_encoder_args(max_bitrate),
+        output_path
+    ]
+
+
+def write_concat_list(list_path, segment_paths):
+    """
+    Writes an input file for FFmpeg's concat demuxer.
+
+    Args:
+        list_path (str): The absolute path of the list file to write.
+        segment_paths (list): The absolute segment paths in playback order.
+    """
+    with open(list_path, 'w') as list_file:
+        for segment_path in segment_paths:
+            escaped_path = segment_path.replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+
+
+def build_concat_command(source_path, outputs):
+    """
+    Builds one FFmpeg command that joins the transcoded segments of every rendition.
+
+    The video segments are concatenated losslessly with stream copy. The
+    audio of the source, if any, is encoded alongside so that it is continuous
+    across segment boundaries.
+
+    Args:
+        source_path (str): The absolute path of the uploaded video.
+        outputs (list): Tuples of (concat_list_path, output_path) for every rendition.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    command = ['ffmpeg', '-y']
+    for list_path, output_path in outputs:
+        command += ['-f', 'concat', '-safe', '0', '-i', list_path]
+    command += ['-i', source_path]
+    source_index = len(outputs)
+    for index, (list_path, output_path) in enumerate(outputs):
+        command += [
+            '-map', f'{index}:v',
+            '-map', f'{source_index}:a?',
+            '-c:v', 'copy',
+            *get_audio_encoder_args(),
+            '-movflags', '+faststart',
+            output_path
+        ]
+    return command
+
+
+def get_hls_dir(output_base_dir):
+    """
+    Returns the directory that holds the HLS package of a video.
+
+    Args:
+        output_base_dir (str): The absolute output directory of the video.
+
+    Returns:
+        str: The absolute path of the HLS directory.
+    """
+    return os.path.join(output_base_dir, HLS_DIRNAME)
+
+
+def get_package_dir(parent_dir, version=None):
+    """
+    Returns the directory of one packaging of a video's HLS renditions or
+    trickplay sprites.
+
+    Every packaging is written to its own directory, named after a new
+    version, so the URLs of its playlists, segments and sprites never serve
+    other content and can be cached as immutable.
+
+    Args:
+        parent_dir (str): The HLS or trickplay directory of the video.
+        version (str, optional): The package version, a new one by default.
+
+    Returns:
+        str: The absolute path of the package directory.
+    """
+    return os.path.join(parent_dir, f'{PACKAGE_VERSION_PREFIX}{version or format(time.time_ns(), "x")}')
+
+
+def get_hls_package_version(master_playlist_path):
+    """
+    Returns the version of the HLS package a master playlist belongs to.
+
+    Args:
+        master_playlist_path (str): The path of the master playlist.
+
+    Returns:
+        str: The version, or None for packages written before versioning.
+    """
+    package_name = os.path.basename(os.path.dirname(master_playlist_path))
+    if package_name == HLS_DIRNAME or not package_name.startswith(PACKAGE_VERSION_PREFIX):
+        return None
+    return package_name[len(PACKAGE_VERSION_PREFIX):]
+
+
+def remove_stale_packages(parent_dir, package_dirs):
+    """
+    Deletes everything in a video's HLS or trickplay directory except the given packages.
+
+    Nothing is deleted if one of the packages to keep is the directory
+    itself, i.e. a package written before versioning.
+
+    Args:
+        parent_dir (str): The HLS or trickplay directory of the video.
+        package_dirs (iterable): The package directories to keep.
+    """
+    package_dirs = {os.path.normpath(package_dir) for package_dir in package_dirs}
+    if os.path.normpath(parent_dir) in package_dirs:
+        return
+    for name in os.listdir(parent_dir):
+        path = os.path.join(parent_dir, name)
+        if os.path.normpath(path) in package_dirs:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def build_hls_package_command(rendition_path, playlist_dir, segment_duration):
+    """
+    Builds the FFmpeg command that packages one rendition as HLS with fMP4 segments.
+
+    The rendition is stream-copied, so segments are cut at the keyframes forced
+    during encoding and line up across all renditions.
+
+    Args:
+        rendition_path (str): The absolute path of the converted rendition.
+        playlist_dir (str): The directory to write the playlist and segments to.
+        segment_duration (int): The target segment duration in seconds.
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    return [
+        'ffmpeg', '-y',
+        '-i', rendition_path,
+        '-c', 'copy',
+        '-f', 'hls',
+        '-hls_time', str(segment_duration),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', HLS_INIT_FILENAME,
+        '-hls_segment_filename', os.path.join(playlist_dir, 'segment_%05d.m4s'),
+        os.path.join(playlist_dir, HLS_PLAYLIST)
+    ]
+
+
+def get_playlist_bandwidth(playlist_dir):
+    """
+    Measures the peak and average bitrate of a packaged rendition.
+
+    Reads the segment durations from the media playlist and the segment sizes
+    from disk, as required for the BANDWIDTH and AVERAGE-BANDWIDTH attributes
+    of the master playlist.
+
+    Args:
+        playlist_dir (str): The directory of the rendition's media playlist.
+
+    Returns:
+        tuple: The peak and the average bitrate in bits per second.
+    """
+    peak_bandwidth = 0
+    total_bytes = 0
+    total_duration = 0.0
+    segment_duration = None
+    with open(os.path.join(playlist_dir, HLS_PLAYLIST)) as playlist:
+        for line in playlist:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                segment_duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line and not line.startswith('#') and segment_duration:
+                segment_bytes = os.path.getsize(os.path.join(playlist_dir, line))
+                peak_bandwidth = max(peak_bandwidth, int(segment_bytes * 8 / segment_duration))
+                total_bytes += segment_bytes
+                total_duration += segment_duration
+                segment_duration = None
+    average_bandwidth = int(total_bytes * 8 / total_duration) if total_duration else 0
+    return peak_bandwidth, average_bandwidth
+
+
+def parse_stream_info(output):
+    """
+    Extracts the RESOLUTION and CODECS attributes of a rendition from ffprobe's JSON output.
+
+    CODECS is only returned if every stream's codec string is known, since
+    players treat the attribute as the complete list.
+
+    Args:
+        output (str): The output of the command built by build_probe_command.
+
+    Returns:
+        dict: The "resolution" (e.g. "1280x720") and "codecs" (e.g.
+              "avc1.64001f,mp4a.40.2"), each None if unknown.
+    """
+    streams = json.loads(output or '{}').get('streams', [])
+    video_stream = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    resolution = None
+    if video_stream.get('width') and video_stream.get('height'):
+        resolution = f"{video_stream['width']}x{video_stream['height']}"
+    codecs = []
+    for stream in streams:
+        if stream.get('codec_type') == 'video' and stream.get('codec_name') == 'h264' \
+                and stream.get('profile') in H264_PROFILE_CODECS and stream.get('level', 0) > 0:
+            codecs.append(f"{H264_PROFILE_CODECS[stream['profile']]}{stream['level']:02x}")
+        elif stream.get('codec_type') == 'audio' and stream.get('codec_name') == 'aac' and stream.get('profile') == 'LC':
+            codecs.append(AAC_LC_CODEC)
+        elif stream.get('codec_type') in ('video', 'audio'):
+            codecs = None
+            break
+    return {'resolution': resolution, 'codecs': ','.join(codecs) if codecs else None}
+
+
+def write_master_playlist(package_dir, resolution_names, stream_infos=None):
+    """
+    Writes the HLS master playlist that lists every packaged rendition.
+
+    Every variant carries its bandwidth and, if known, its RESOLUTION and
+    CODECS, which players need to pick a rendition without loading it.
+
+    Args:
+        package_dir (str): The HLS package directory of the video.
+        resolution_names (list): The packaged resolutions, each in its own sub directory.
+        stream_infos (dict, optional): The parse_stream_info result of each resolution.
+
+    Returns:
+        str: The absolute path of the master playlist.
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS']
+    package_name = os.path.basename(package_dir)
+    for resolution_name in resolution_names:
+        peak_bandwidth, average_bandwidth = get_playlist_bandwidth(os.path.join(package_dir, resolution_name))
+        attributes = f'BANDWIDTH={peak_bandwidth},AVERAGE-BANDWIDTH={average_bandwidth}'
+        stream_info = (stream_infos or {}).get(resolution_name, {})
+        if stream_info.get('resolution'):
+            attributes += f",RESOLUTION={stream_info['resolution']}"
+        if stream_info.get('codecs'):
+            attributes += f',CODECS="{stream_info["codecs"]}"'
+        lines.append(f'#EXT-X-STREAM-INF:{attributes}')
+        lines.append(f'{package_name}/{resolution_name}/{HLS_PLAYLIST}')
+    master_playlist_path = os.path.join(package_dir, HLS_MASTER_PLAYLIST)
+    with open(master_playlist_path, 'w') as master_playlist:
+        master_playlist.write('\n'.join(lines) + '\n')
+    return master_playlist_path
+
+
+def get_trickplay_dir(output_base_dir):
+    """
+    Returns the directory that holds the trickplay sprite sheets and index of a video.
+
+    Args:
+        output_base_dir (str): The absolute output directory of the video.
+
+    Returns:
+        str: The absolute path of the trickplay directory.
+    """
+    return os.path.join(output_base_dir, TRICKPLAY_DIRNAME)
+
+
+def get_trickplay_tile_height(video, tile_width):
+    """
+    Returns the height of one trickplay tile for the aspect ratio of a video.
+
+    Falls back to 16:9 if the source dimensions are unknown. The height is
+    rounded to an even number, as the scale filter requires for most encoders.
+
+    Args:
+        video (Video): The Video instance.
+        tile_width (int): The width of one tile in pixels.
+
+    Returns:
+        int: The height of one tile in pixels.
+    """
+    if video.width and video.height:
+        aspect_ratio = video.height / video.width
+    else:
+        aspect_ratio = 9 / 16
+    return max(2, int(round(tile_width * aspect_ratio / 2)) * 2)
+
+
+def get_trickplay_sprite_name(sheet_number, image_format):
+    """
+    Returns the file name of a trickplay sprite sheet.
+
+    Args:
+        sheet_number (int): The 1-based number of the sheet, as written by FFmpeg.
+        image_format (str): "jpg" or "webp".
+
+    Returns:
+        str: The file name, e.g. "sprite_001.jpg".
+    """
+    return f'sprite_{sheet_number:03d}.{image_format}'
+
+
+def build_trickplay_command(source_path, sprite_dir, interval, tile_width, tile_height, columns, rows, image_format):
+    """
+    Builds the FFmpeg command that renders the trickplay sprite sheets of a video.
+
+    One frame is taken every interval seconds, scaled to the tile size and
+    laid out in sheets of columns x rows tiles.
+
+    Args:
+        source_path (str): The absolute path of the video to sample.
+        sprite_dir (str): The directory to write the sprite sheets to.
+        interval (int): The time between two tiles in seconds.
+        tile_width (int): The width of one tile in pixels.
+        tile_height (int): The height of one tile in pixels.
+        columns (int): The number of tiles per row of a sheet.
+        rows (int): The number of rows per sheet.
+        image_format (str): "jpg" or "webp".
+
+    Returns:
+        list: The FFmpeg command.
+    """
+    if image_format == 'webp':
+        codec_args = ['-c:v', 'libwebp', '-quality', '75']
+    else:
+        codec_args = ['-q:v', '5']
+    return [
+        'ffmpeg', '-y',
+        '-i', source_path,
+        '-an',
+        '-vf', f'fps=1/{interval},scale={tile_width}:{tile_height},tile={columns}x{rows}',
+        *codec_args,
+        os.path.join(sprite_dir, f'sprite_%03d.{image_format}')
+    ]
+
+
+def format_vtt_timestamp(seconds):
+    """
+    Formats a position as a WebVTT timestamp.
+
+    Args:
+        seconds (float): The position in seconds.
+
+    Returns:
+        str: The timestamp, e.g. "00:01:05.500".
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+
+
+def write_trickplay_index(index_path, duration, interval, tile_width, tile_height, columns, rows, image_format, package=None):
+    """
+    Writes the WebVTT index that maps every time range to its sprite tile.
+
+    Each cue covers interval seconds and points to the tile of its frame with
+    a media fragment, e.g. "v18c2/sprite_001.jpg#xywh=160,0,160,90". The
+    index is served from the unversioned trickplay URL, so the sprite URIs
+    are prefixed with the package directory they were rendered to.
+
+    Args:
+        index_path (str): The absolute path of the index to write.
+        duration (float): The duration of the video in seconds.
+        interval (int): The time between two tiles in seconds.
+        tile_width (int): The width of one tile in pixels.
+        tile_height (int): The height of one tile in pixels.
+        columns (int): The number of tiles per row of a sheet.
+        rows (int): The number of rows per sheet.
+        image_format (str): "jpg" or "webp".
+        package (str, optional): The name of the package directory of the sprites.
+
+    Returns:
+        int: The number of cues written.
+    """
+    tiles_per_sheet = columns * rows
+    sprite_prefix = f'{package}/' if package else ''
+    cue_count = max(1, math.ceil(duration / interval))
+    lines = ['WEBVTT', '']
+    for index in range(cue_count):
+        start = index * interval
+        end = min((index + 1) * interval, duration) if duration > start else start + interval
+        sheet_number, position = divmod(index, tiles_per_sheet)
+        row, column = divmod(position, columns)
+        lines.append(f'{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}')
+        lines.append(
+            f'{sprite_prefix}{get_trickplay_sprite_name(sheet_number + 1, image_format)}'
+            f'#xywh={column * tile_width},{row * tile_height},{tile_width},{tile_height}'
+        )
+        lines.append('')
+    with open(index_path, 'w') as index_file:
+        index_file.write('\n'.join(lines))
+    return cue_count
+
+
+def parse_progress_time(progress):
+    """
+    Returns the output position from a block of FFmpeg's -progress output.
+
+    Args:
+        progress (dict): The key=value pairs of one progress block.
+
+    Returns:
+        float: The position in seconds.
+    """
+    for key in ('out_time_us', 'out_time_ms'):
+        value = progress.get(key, '')
+        if value.lstrip('-').isdigit():
+            return max(int(value), 0) / 1000000
+    return 0.0
+
+
+def parse_progress_speed(progress):
+    """
+    Returns the encode speed from a block of FFmpeg's -progress output.
+
+    Args:
+        progress (dict): The key=value pairs of one progress block.
+
+    Returns:
+        float: The speed as a multiple of real time, or None if unknown.
+    """
+    try:
+        return float(progress.get('speed', '').rstrip('x'))
+    except ValueError:
+        return None
+
+
+def print_ffmpeg_failure(description, command, error):
+    """
+    Prints the diagnostic output of a failed FFmpeg or ffprobe command.
+
+    Args:
+        description (str): A short description of the command.
+        command (list): The command that failed.
+        error (subprocess.CalledProcessError): The raised error.
+    """
+    print(f"FFmpeg conversion failed for {description}:")
+    print(f"Command: {' '.join(command)}")
+    print(f"Return Code: {error.returncode}")
+    print(f"Stdout: {error.stdout}")
+    print(f"Stderr: {error.stderr}")
+
+
+def run_ffmpeg(command, description, on_progress=None):
+    """
+    Runs an FFmpeg or ffprobe command and prints diagnostic output if it fails.
+
+    With an on_progress callback, FFmpeg's machine-readable progress output
+    (-progress pipe:1) is read while the process runs, and the callback is
+    called with the output position in seconds, the encode speed and whether
+    this is the final report.
+
+    Args:
+        command (list): The FFmpeg or ffprobe command.
+        description (str): A short description used in the error output,
+                           e.g. "resolution 720p".
+        on_progress (callable, optional): Receives (out_time, speed, finished).
+
+    Returns:
+        subprocess.CompletedProcess: The result of the finished process.
+
+    Raises:
+        subprocess.CalledProcessError: If FFmpeg exits with a non-zero code.
+    """
+    if on_progress is None:
+        try:
+            return subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            print_ffmpeg_failure(description, command, e)
+            raise e
+
+    command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+    with tempfile.TemporaryFile(mode='w+') as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        progress = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            progress[key] = value
+            if key == 'progress':
+                on_progress(parse_progress_time(progress), parse_progress_speed(progress), value == 'end')
+                progress = {}
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+    if returncode:
+        error = subprocess.CalledProcessError(returncode, command, stderr=stderr)
+        print_ffmpeg_failure(description, command, error)
+        raise error
+    return subprocess.CompletedProcess(command, returncode, stderr=stderr)
@@ -1,14 +1,32 @@
+from django.conf import settings
 from django.urls import path
-from .views import AllVideosListView, VideoUploadView, StartViewingView, UpdateViewingProgressView, MarkVideoAsFinishedView, GetViewingProgressView, ContinueWatchingListView, VideoStreamView, ThumbnailStreamView
+from .views import AllVideosListView, VideoUploadView, StartViewingView, UpdateViewingProgressView, MarkVideoAsFinishedView, GetViewingProgressView, ContinueWatchingListView, VideoStreamView, ThumbnailStreamView, AsyncVideoStreamView, AsyncThumbnailStreamView, TrickplayView, HLSStreamView, TranscodeProgressView, SignedMediaURLView, HeadCacheStatsView, GenreListView, GenreRowsView, VideoSearchView, TitleSuggestionView
+
+if settings.VIDEO_ASYNC_STREAMING:
+    video_stream_view, thumbnail_stream_view = AsyncVideoStreamView.as_view(), AsyncThumbnailStreamView.as_view()
+else:
+    video_stream_view, thumbnail_stream_view = VideoStreamView.as_view(), ThumbnailStreamView.as_view()
 
 urlpatterns = [
     path('all-videos/', AllVideosListView.as_view(), name='all-videos'),
+    path('search/', VideoSearchView.as_view(), name='video-search'),
+    path('suggest/', TitleSuggestionView.as_view(), name='title-suggestions'),
+    path('genres/', GenreListView.as_view(), name='genre-list'),
+    path('genre-rows/', GenreRowsView.as_view(), name='genre-rows'),
     path('upload/', VideoUploadView.as_view(), name='video-upload'),
+    path('progress/<int:pk>/', TranscodeProgressView.as_view(), name='transcode-progress'),
     path('viewing/start/', StartViewingView.as_view(), name='start-viewing'),
     path('viewing/progress/<int:pk>/', UpdateViewingProgressView.as_view(), name='update-viewing-progress'),
     path('viewing/finished/<int:pk>/', MarkVideoAsFinishedView.as_view(), name='mark-video-finished'),
     path('viewing/get/<int:pk>/', GetViewingProgressView.as_view(), name='get-viewing-progress'),
     path('viewing/continue-watching/', ContinueWatchingListView.as_view(), name='continue-watching-list'),
-    path('stream/<int:pk>/<str:resolution>/', VideoStreamView.as_view(), name='video-stream'),
-    path('thumbnail/<int:pk>/', ThumbnailStreamView.as_view(), name='video-thumbnail'),
+    path('head-cache/stats/', HeadCacheStatsView.as_view(), name='head-cache-stats'),
+    path('media-urls/<int:pk>/', SignedMediaURLView.as_view(), name='signed-media-urls'),
+    path('stream/<int:pk>/<str:resolution>/', video_stream_view, name='video-stream'),
+    path('thumbnail/<int:pk>/', thumbnail_stream_view, name='video-thumbnail'),
+    path('thumbnail/<int:pk>/trickplay/<str:filename>', TrickplayView.as_view(), name='video-trickplay'),
+    path('thumbnail/<int:pk>/trickplay/<str:package>/<str:filename>', TrickplayView.as_view(), name='video-trickplay-package-file'),
+    path('hls/<int:pk>/master.m3u8', HLSStreamView.as_view(), name='video-hls-master'),
+    path('hls/<int:pk>/<str:package>/<str:resolution>/<str:filename>', HLSStreamView.as_view(), name='video-hls-package-file'),
+    path('hls/<int:pk>/<str:resolution>/<str:filename>', HLSStreamView.as_view(), name='video-hls-file'),
 ]
\ No newline at end of file
@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 def sanitize_filename(filename):
@@ -17,4 +18,24 @@ def sanitize_filename(filename):
     """
     filename = filename.replace(" ", "_")
     filename = re.sub(r'[^\w.-]', '', filename)
-    return filename
\ No newline at end of file
+    return filename
+
+
+def compute_file_hash(file, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hash of a file without loading it into memory.
+
+    Reads the file in chunks through Django's File.chunks(), so uploads that
+    were spooled to a temporary file are streamed from disk.
+
+    Args:
+        file (django.core.files.File): The file to hash, e.g. an uploaded file.
+        chunk_size (int): The number of bytes read per chunk.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
\ No newline at end of file
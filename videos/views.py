@@ -1,11 +1,32 @@
 from rest_framework import generics, permissions, status
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from .serializers import VideoSerializer, VideoViewingSerializer
+from rest_framework.views import APIView
+from .serializers import GenreSerializer, VideoListSerializer, VideoSerializer, VideoViewingSerializer
 from .models import Video, VideoViewing
+from .pagination import VideoCatalogPagination, VideoSearchPagination
+from .search import search_videos
+from .suggestions import title_index
+from .catalog import get_genre_rows, get_genres_with_counts, parse_video_fields, select_video_fields
+from .catalog_cache import get_catalog_cache_entry, get_catalog_version, get_cached_catalog_page, store_catalog_page
 from .tasks import convert_video_task
-from django.http import HttpResponse, StreamingHttpResponse, HttpResponseBadRequest, HttpResponseNotFound
+from .transcoding import HLS_MASTER_PLAYLIST, TRICKPLAY_INDEX, get_rendition_path
+from .utils import compute_file_hash
+from .progress import get_progress
+from .streaming import StaleStreamFile, arun_media_io, serve_media_file, aserve_media_file, stat_stream_file
+from .stream_cache import stream_file_cache
+from .head_cache import head_cache
+from .thumbnails import InvalidThumbnailVariant, get_thumbnail_version, resolve_thumbnail
+from .permissions import HasValidMediaSignature
+from .signing import HLS_RESOLUTION, THUMBNAIL_RESOLUTION, TRICKPLAY_RESOLUTION, get_signature_query, is_media_signature_valid, sign_media_url, sign_playlist
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views import View
 import os
+import re
+import time
 from django.conf import settings
 from wsgiref.headers import Headers
 
@@ -15,11 +36,174 @@ class AllVideosListView(generics.ListAPIView):
     API view to list all videos.
 
     Accessible to authenticated users, this view retrieves and lists all available
-    videos from the database, using VideoSerializer for serialization.
+    videos from the database, using VideoListSerializer for serialization.
+    Each video has its id, title, thumbnail and genre, or the fields named in
+    the comma-separated "fields" query parameter; only their columns are
+    loaded. The list is cursor-paginated (see videos.pagination) and can be narrowed to
+    one genre by name with the "genre" query parameter. Serialized pages are cached
+    per catalog version (see videos.catalog_cache) and carry a strong ETag,
+    so repeat requests are answered with 304 without touching the database.
     """
     queryset = Video.objects.all()
+    serializer_class = VideoListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = VideoCatalogPagination
+
+    def get_queryset(self):
+        """
+        Returns the videos with the columns of the requested fields, filtered
+        by the "genre" query parameter if given.
+        """
+        queryset = super().get_queryset()
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        queryset = select_video_fields(queryset, self.video_fields, ordering)
+        genre = self.request.query_params.get('genre')
+        if genre:
+            queryset = queryset.filter(genre__name=genre)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Returns the serializer restricted to the requested fields.
+        """
+        return super().get_serializer(*args, fields=self.video_fields, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns a catalog page from the cache, or 304 if the client's copy is
+        current, or 400 if an unknown field is requested.
+        """
+        try:
+            self.video_fields = parse_video_fields(request.query_params.get('fields'))
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        list_page = super().list
+        return get_cached_catalog_response(request, lambda: list_page(request, *args, **kwargs).data)
+
+
+class VideoSearchView(generics.ListAPIView):
+    """
+    API view to search the titles and descriptions of all videos.
+
+    Accessible to authenticated users. The search text is passed in the "q"
+    query parameter; results are ordered by relevance and paginated by page
+    number. The search runs on PostgreSQL's full-text index, or on an FTS5
+    table on SQLite (see videos.search).
+    """
     serializer_class = VideoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = VideoSearchPagination
+
+    def get_queryset(self):
+        """
+        Returns the videos matching the search text, best match first.
+        """
+        return search_videos(self.request.query_params.get('q', ''), Video.objects.select_related('genre'))
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns a page of search results, or 400 if no search text is given.
+        """
+        if not request.query_params.get('q', '').strip():
+            return Response({'error': 'The search text "q" is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+
+class TitleSuggestionView(APIView):
+    """
+    API view to suggest video titles while the user types.
+
+    Accessible to authenticated users. Answers from the in-process title
+    prefix index (see videos.suggestions) without querying the database.
+    Returns up to "limit" suggestions (settings.VIDEO_SUGGEST_LIMIT by
+    default, at most settings.VIDEO_SUGGEST_MAX_LIMIT) for the text in "q".
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Returns the suggested videos' ids and titles, or 400 if the limit is invalid.
+        """
+        limit = request.query_params.get('limit', str(settings.VIDEO_SUGGEST_LIMIT))
+        if not limit.isdigit() or int(limit) < 1:
+            return Response({'error': 'The limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        title_index.ensure_current()
+        return Response(title_index.suggest(request.query_params.get('q', ''), min(int(limit), settings.VIDEO_SUGGEST_MAX_LIMIT)))
+
+
+class GenreListView(APIView):
+    """
+    API view to list the genres with the number of their videos.
+
+    Accessible to authenticated users. Cached per catalog version like the
+    catalog itself.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Returns all genres, ordered by name, with their video counts.
+        """
+        return get_cached_catalog_response(request, lambda: GenreSerializer(get_genres_with_counts(), many=True).data)
+
+
+class GenreRowsView(APIView):
+    """
+    API view to list the newest videos of every genre for the home screen.
+
+    Accessible to authenticated users. Returns one row per genre with up to
+    "limit" videos (settings.VIDEO_GENRE_ROW_SIZE by default, at most
+    settings.VIDEO_GENRE_ROW_MAX_SIZE), fetched in a single query (see
+    videos.catalog.get_genre_rows). Videos are represented like in the
+    catalog, including the "fields" query parameter. Responses are cached per catalog version
+    like the catalog itself.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Returns the genre rows, or 400 if the limit is not a positive integer
+        or an unknown field is requested.
+        """
+        limit = request.query_params.get('limit', str(settings.VIDEO_GENRE_ROW_SIZE))
+        if not limit.isdigit() or int(limit) < 1:
+            return Response({'error': 'The limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(int(limit), settings.VIDEO_GENRE_ROW_MAX_SIZE)
+        try:
+            fields = parse_video_fields(request.query_params.get('fields'))
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def get_rows():
+            return {'genres': [
+                {'genre': genre, 'videos': VideoListSerializer(videos, many=True, fields=fields, context={'request': request}).data}
+                for genre, videos in get_genre_rows(limit, fields)
+            ]}
+        return get_cached_catalog_response(request, get_rows)
+
+
+def get_cached_catalog_response(request, get_data):
+    """
+    Returns a catalog response from the cache, or 304 if the client's copy is current.
+
+    Args:
+        request (Request): The request.
+        get_data (callable): Returns the serialized data if it is not cached.
+
+    Returns:
+        HttpResponse: The response, with a strong ETag.
+    """
+    cache_key, etag = get_catalog_cache_entry(request, get_catalog_version())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data = get_cached_catalog_page(cache_key)
+        if data is None:
+            data = get_data()
+            store_catalog_page(cache_key, data)
+        response = Response(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 class VideoUploadView(generics.CreateAPIView):
@@ -28,7 +212,8 @@ class VideoUploadView(generics.CreateAPIView):
 
     Accessible only to admin users, this view allows for uploading new video files.
     It uses MultiPartParser and FormParser to handle file uploads and triggers
-    a background task (convert_video_task) to process the uploaded video.
+    a background task (convert_video_task) to process the uploaded video, unless
+    a video with the same content has already been converted.
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
@@ -39,13 +224,107 @@ class VideoUploadView(generics.CreateAPIView):
         """
         Performs video creation and triggers video conversion task.
 
-        Overrides the default perform_create to initiate the video conversion
-        task after successfully saving the video instance.
+        Overrides the default perform_create to hash the uploaded file first.
+        If an already converted video has the same content hash, the new video
+        reuses its stored file, renditions and thumbnail and no conversion is
+        started. Otherwise the video conversion task is initiated after
+        successfully saving the video instance.
         """
-        video_instance = serializer.save()
+        content_hash = compute_file_hash(serializer.validated_data['video_file'])
+        duplicate = Video.objects.filter(content_hash=content_hash, resolutions__isnull=False).first()
+        if duplicate:
+            serializer.save(content_hash=content_hash, **duplicate.get_conversion_data())
+            return
+        video_instance = serializer.save(content_hash=content_hash)
         convert_video_task.delay(video_instance.id)
 
 
+class TranscodeProgressView(APIView):
+    """
+    API view to poll the transcoding progress of a video.
+
+    Accessible only to admin users. Returns the status, percentage, encode
+    speed and ETA of every rendition as published by the Celery worker. The
+    data is read from the cache only; the Video table is not queried.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk):
+        """
+        Returns the progress of the video's current or last conversion, or
+        404 if none is known.
+        """
+        progress = get_progress(pk)
+        if progress is None:
+            return Response({'error': 'No transcoding progress available for this video.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progress)
+
+
+class HeadCacheStatsView(APIView):
+    """
+    API view to inspect the head cache of the serving process.
+
+    Accessible only to admin users. Returns the hit, miss and eviction
+    counters and the size of the cache. Every web process has its own cache,
+    so the numbers describe the process that answered the request.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """
+        Returns the counters of the head cache and whether it is enabled.
+        """
+        return Response({'enabled': settings.VIDEO_HEAD_CACHE_ENABLED, **head_cache.stats()})
+
+
+class SignedMediaURLView(APIView):
+    """
+    API view to issue signed, expiring stream and thumbnail URLs of a video.
+
+    Accessible to authenticated users. The URLs are valid for
+    settings.VIDEO_SIGNED_URL_TTL seconds and only for the requesting user,
+    the video and the resolution they were issued for. The thumbnail URL
+    also names the current version of the thumbnail, so browsers may cache
+    it as immutable; "w" and "format" can be appended to request a variant.
+    The HLS master playlist and the trickplay index URLs are signed for the
+    whole package, whose playlists pass the signature on to their files.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        Returns the signed thumbnail URL, one signed stream URL per converted
+        resolution, the signed HLS and trickplay URLs if the video has them,
+        and their expiry time as a Unix timestamp.
+        """
+        video = get_object_or_404(Video, pk=pk)
+        expires = int(time.time()) + settings.VIDEO_SIGNED_URL_TTL
+        resolutions = {
+            resolution_name: sign_media_url(
+                reverse('video-stream', kwargs={'pk': video.pk, 'resolution': resolution_name}),
+                video.pk, resolution_name, request.user.pk, expires
+            )
+            for resolution_name in (video.resolutions or {})
+        }
+        thumbnail = sign_media_url(
+            reverse('video-thumbnail', kwargs={'pk': video.pk}), video.pk, THUMBNAIL_RESOLUTION, request.user.pk, expires
+        )
+        thumbnail_path = get_thumbnail_path(video)
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            thumbnail += f'&v={get_thumbnail_version(stat_stream_file(thumbnail_path))}'
+        hls = trickplay = None
+        if video.hls_playlist:
+            hls = sign_media_url(reverse('video-hls-master', kwargs={'pk': video.pk}), video.pk, HLS_RESOLUTION, request.user.pk, expires)
+        if video.trickplay_index:
+            trickplay = sign_media_url(
+                reverse('video-trickplay', kwargs={'pk': video.pk, 'filename': TRICKPLAY_INDEX}),
+                video.pk, TRICKPLAY_RESOLUTION, request.user.pk, expires
+            )
+        return Response({
+            'resolutions': resolutions, 'thumbnail': thumbnail, 'hls': hls, 'trickplay': trickplay, 'expires': expires
+        })
+
+
 class StartViewingView(generics.CreateAPIView):
     """
     API view to start viewing a video.
@@ -155,32 +434,34 @@ class ContinueWatchingListView(generics.ListAPIView):
             '-last_viewed_at')
 
 
-def parse_byte_range(range_header):
+def get_video_path(video, resolution_name):
     """
-    Parses the HTTP Range header.
-
-    Extracts the start and end byte ranges from the HTTP Range header,
-    handling cases where start or end values are omitted.
+    Resolves the file to stream for a video and an optional resolution.
 
     Args:
-        range_header (str): The HTTP Range header string.
+        video (Video): The Video instance.
+        resolution_name (str): The requested resolution, or None for the uploaded file.
 
     Returns:
-        tuple: A tuple containing the start and end byte range as integers.
-               End range might be None if not specified in the header.
-    """
-    parts = range_header.replace('bytes=', '').split('-')
-    start = parts[0]
-    end = parts[1]
-    if start:
-        start = int(start)
-    else:
-        start = 0
-    if end:
-        end = int(end)
-    else:
-        end = None  # Until the end of the file
-    return start, end
+        tuple: The absolute path of the file and None, or None and a 400
+               response if the video has no rendition of that resolution.
+    """
+    if not resolution_name:
+        return video.video_file.path, None
+    resolutions = video.resolutions
+    if not resolutions or resolution_name not in resolutions:
+        return None, HttpResponseBadRequest(
+            f"Invalid resolution: '{resolution_name}'. Available resolutions: {list(resolutions.keys()) if resolutions else []}")
+    return get_rendition_path(resolutions[resolution_name]), None
+
+
+def get_thumbnail_path(video):
+    """
+    Returns the absolute path of a video's thumbnail, or None if it has none.
+    """
+    if not video.thumbnail:
+        return None
+    return os.path.join(settings.MEDIA_ROOT, video.thumbnail.path)
 
 
 class VideoStreamView(generics.RetrieveAPIView):
@@ -189,11 +470,16 @@ class VideoStreamView(generics.RetrieveAPIView):
 
     This view streams video content, supporting range requests for seeking and
     adaptive streaming. It can serve video in different resolutions if available,
-    or the original uploaded video file.
+    or the original uploaded video file. Conditional requests are answered
+    with 304 using the file's ETag and Last-Modified validators.
+
+    Requests must carry a signed URL issued by SignedMediaURLView. The
+    signature is verified without authentication or database access.
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
-    # permission_classes = [permissions.IsAuthenticated] 
+    authentication_classes = []
+    permission_classes = [HasValidMediaSignature]
     lookup_field = 'pk'
 
     def retrieve(self, request, *args, **kwargs):
@@ -202,84 +488,318 @@ class VideoStreamView(generics.RetrieveAPIView):
 
         Retrieves the video instance and determines the video path based on
         the requested resolution (if any). It then prepares and returns a
-        StreamingHttpResponse to stream the video content, supporting byte range
-        requests for efficient seeking and playback.
+        StreamingHttpResponse to stream the video content, supporting single,
+        multiple and suffix byte ranges as well as If-Range, so a seek only
+        transfers the requested bytes (see videos.streaming.build_file_response).
+        If settings.VIDEO_OFFLOAD_MODE is set, Django only resolves the file and
+        the reverse proxy sends it. Resolved files are kept in the stream file
+        cache, so repeated range requests do not query the Video; the cached
+        validators are checked against the opened file, and a file replaced
+        in the meantime is stat'ed and cached again. With settings.VIDEO_HEAD_CACHE_ENABLED, ranges at the head
+        or the moov atom of the file are answered from memory.
         """
-        instance = self.get_object()
         resolution_name = kwargs.get('resolution')
+        stream_file = stream_file_cache.get(kwargs['pk'], resolution_name)
+        if stream_file is None:
+            instance = self.get_object()
+            video_path, error_response = get_video_path(instance, resolution_name)
+            if error_response:
+                return error_response
+            if not os.path.exists(video_path):
+                return HttpResponseNotFound(
+                    f"Video file for resolution '{resolution_name}' not found: {video_path}")
+            stream_file = stream_file_cache.store(instance.pk, resolution_name, video_path)
 
-        if resolution_name:  
-            resolutions = instance.resolutions
-            if not resolutions or resolution_name not in resolutions:
-                return HttpResponseBadRequest(
-                    f"Invalid resolution: '{resolution_name}'. Available resolutions: {list(resolutions.keys()) if resolutions else []}")
+        try:
+            try:
+                return serve_media_file(request, stream_file.path, 'video/mp4', stream_file=stream_file, hot_start=True)
+            except StaleStreamFile:
+                stream_file_cache.invalidate(kwargs['pk'])
+                stream_file = stream_file_cache.store(kwargs['pk'], resolution_name, stream_file.path)
+                return serve_media_file(request, stream_file.path, 'video/mp4', stream_file=stream_file, hot_start=True)
+        except FileNotFoundError:
+            stream_file_cache.invalidate(kwargs['pk'])
+            return HttpResponseNotFound(f"Video file for resolution '{resolution_name}' not found.")
 
-            relative_video_path = resolutions[resolution_name]
-            video_path = os.path.normpath(os.path.join(settings.BASE_DIR, relative_video_path[1:])) # Use normpath to clean up path
 
+class ThumbnailStreamView(generics.RetrieveAPIView):
+    """
+    API view to stream thumbnail images.
 
-        else:  
-            video_path = instance.video_file.path
+    The image is sent by the reverse proxy if settings.VIDEO_OFFLOAD_MODE is
+    set, otherwise by Django. Like VideoStreamView, requests must carry a
+    signed URL. The "w" and "format" query parameters select a resized
+    WebP, AVIF or JPEG variant, rendered once and kept in a disk cache (see
+    videos.thumbnails). Responses carry an ETag and are cached as immutable
+    when the URL names the current thumbnail version.
+    """
+    queryset = Video.objects.all()
+    serializer_class = VideoSerializer
+    authentication_classes = []
+    permission_classes = [HasValidMediaSignature]
+    lookup_field = 'pk'
 
-        print(f"DEBUG: VideoStreamView - Checking for file existence at path: {video_path}")  # Debug print - Consider removing or using a proper logging setup
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        thumbnail_path_absolute = get_thumbnail_path(instance)
+        if not thumbnail_path_absolute or not os.path.exists(thumbnail_path_absolute):
+            return HttpResponseNotFound(f"Thumbnail not found at: {thumbnail_path_absolute}")
 
-        if not os.path.exists(video_path):
-            return HttpResponseNotFound(
-                f"Video file for resolution '{resolution_name}' not found: {video_path}")
+        try:
+            file_path, content_type, cache_control = resolve_thumbnail(thumbnail_path_absolute, request.GET)
+            response = serve_media_file(request, file_path, content_type)
+        except InvalidThumbnailVariant as error:
+            return HttpResponseBadRequest(str(error))
+        except IOError:
+            return HttpResponseNotFound("Could not read thumbnail file")
+        response['Cache-Control'] = cache_control
+        return response
 
-        file_size = os.path.getsize(video_path)
-        start, end = 0, file_size - 1
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Ignores the "format" query parameter during content negotiation.
 
-        chunk_size = 8192
+        DRF reads "format" as a renderer override and answers unknown values
+        with 404; here it selects the image format of the thumbnail instead.
+        """
+        return super().perform_content_negotiation(request, force=True)
 
-        def video_content_generator(file_path, start_byte, end_byte, chunk_size):
-            """
-            Generator function to yield video content in chunks.
 
-            Reads and yields chunks of video content from the file, starting from
-            start_byte up to end_byte, in specified chunk sizes.
-            """
-            with open(file_path, 'rb') as video_file:
-                video_file.seek(start_byte)
-                bytes_to_read = end_byte - start_byte + 1
+class AsyncVideoStreamView(View):
+    """
+    Asynchronous counterpart of VideoStreamView for ASGI deployments.
+
+    Answers the same requests with the same range and conditional handling,
+    but the body is read chunk by chunk in the fixed-size media I/O pool, so
+    the reads of a viewer do not hold a thread for the length of the
+    playback. Reads follow the client's pace and stop as soon as it
+    disconnects. Django's ASGI handler still keeps one idle thread per open
+    request for its synchronous signal receivers. Used for the stream endpoint
+    when settings.VIDEO_ASYNC_STREAMING is set.
+    """
 
-                while bytes_to_read > 0:
-                    chunk = video_file.read(min(chunk_size, bytes_to_read))
-                    if not chunk:
-                        break
-                    yield chunk
-                    bytes_to_read -= len(chunk)
+    async def get(self, request, pk, resolution=None):
+        """
+        Handles video streaming requests.
 
-        response = StreamingHttpResponse(
-            video_content_generator(video_path, start, end, chunk_size),
-            status=206,
-            content_type='video/mp4'
-        )
-        response['Content-Length'] = str(end - start + 1)
-        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-        response['Accept-Ranges'] = 'bytes'
+        Like VideoStreamView, files resolved earlier are served from the
+        stream file cache without a query, and a file replaced since it was
+        cached is stat'ed and cached again.
+        """
+        if not is_media_signature_valid(request.GET, pk, resolution):
+            return HttpResponseForbidden(HasValidMediaSignature.message)
+        stream_file = stream_file_cache.get(pk, resolution)
+        if stream_file is None:
+            instance = await aget_object_or_404(Video, pk=pk)
+            video_path, error_response = get_video_path(instance, resolution)
+            if error_response:
+                return error_response
+            if not await arun_media_io(os.path.exists, video_path):
+                return HttpResponseNotFound(f"Video file for resolution '{resolution}' not found: {video_path}")
+            stream_file = await arun_media_io(stream_file_cache.store, pk, resolution, video_path)
+        try:
+            try:
+                return await aserve_media_file(request, stream_file.path, 'video/mp4', stream_file, hot_start=True)
+            except StaleStreamFile:
+                stream_file_cache.invalidate(pk)
+                stream_file = await arun_media_io(stream_file_cache.store, pk, resolution, stream_file.path)
+                return await aserve_media_file(request, stream_file.path, 'video/mp4', stream_file, hot_start=True)
+        except FileNotFoundError:
+            stream_file_cache.invalidate(pk)
+            return HttpResponseNotFound(f"Video file for resolution '{resolution}' not found.")
+
+
+class AsyncThumbnailStreamView(View):
+    """
+    Asynchronous counterpart of ThumbnailStreamView for ASGI deployments.
+
+    Used for the thumbnail endpoint when settings.VIDEO_ASYNC_STREAMING is set.
+    """
+
+    async def get(self, request, pk):
+        """
+        Handles thumbnail requests.
+        """
+        if not is_media_signature_valid(request.GET, pk, THUMBNAIL_RESOLUTION):
+            return HttpResponseForbidden(HasValidMediaSignature.message)
+        instance = await aget_object_or_404(Video, pk=pk)
+        thumbnail_path = get_thumbnail_path(instance)
+        if not thumbnail_path or not await arun_media_io(os.path.exists, thumbnail_path):
+            return HttpResponseNotFound(f"Thumbnail not found at: {thumbnail_path}")
+        try:
+            file_path, content_type, cache_control = await arun_media_io(resolve_thumbnail, thumbnail_path, request.GET)
+            response = await aserve_media_file(request, file_path, content_type)
+        except InvalidThumbnailVariant as error:
+            return HttpResponseBadRequest(str(error))
+        except IOError:
+            return HttpResponseNotFound("Could not read thumbnail file")
+        response['Cache-Control'] = cache_control
         return response
-    
-class ThumbnailStreamView(generics.RetrieveAPIView):
+
+
+def serve_signed_playlist(request, file_path, content_type):
     """
-    API view to stream thumbnail images.
+    Serves an HLS playlist or trickplay index with the request's signature
+    carried into every URI it references.
+
+    The body differs per user and expiry, so it may only be cached privately
+    and must be revalidated.
+
+    Args:
+        request (HttpRequest): The signed playlist request.
+        file_path (str): The absolute path of the playlist.
+        content_type (str): The MIME type of the playlist.
+
+    Returns:
+        HttpResponse: The signed playlist.
+    """
+    with open(file_path, encoding='utf-8') as playlist:
+        content = sign_playlist(playlist.read(), get_signature_query(request.GET))
+    response = HttpResponse(content, content_type=content_type)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+TRICKPLAY_CONTENT_TYPES = {
+    '.vtt': 'text/vtt',
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+}
+TRICKPLAY_FILENAME_PATTERN = re.compile(r'^(thumbnails\.vtt|sprite_\d+\.(jpg|webp))$')
+
+
+class TrickplayView(generics.RetrieveAPIView):
+    """
+    API view to serve the trickplay previews of a video.
+
+    Serves the WebVTT index and the sprite sheets it references. Players load
+    the index once and show the tile of the hovered time from a single sprite
+    sheet, instead of range-requesting the video while seeking. Like HLS
+    files, sprite sheets are addressed by the version of their package (see
+    videos.transcoding.get_package_dir), so those of the current package are
+    cached as immutable for settings.VIDEO_HLS_CACHE_MAX_AGE while those of
+    a replaced package are gone. Unversioned sprite URLs of indexes written
+    before versioning are revalidated on every request.
+
+    Like VideoStreamView, requests must carry a signed URL. The trickplay
+    URL issued by SignedMediaURLView is signed for the whole directory, and
+    the served index passes its signature on to the sprite URIs.
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
-    # permission_classes = [permissions.IsAuthenticated] # Optional: Aktivieren Sie dies, wenn Thumbnails geschützt sein sollen
+    authentication_classes = []
+    permission_classes = [HasValidMediaSignature]
+    signed_resolution = TRICKPLAY_RESOLUTION
     lookup_field = 'pk'
 
     def retrieve(self, request, *args, **kwargs):
+        """
+        Handles trickplay index and sprite sheet requests.
+
+        Resolves the requested file inside the video's current trickplay
+        package and returns it, sent by Django or the reverse proxy. The index
+        carries the request's signature and is revalidated; sprite sheets of
+        a versioned URL are cached as immutable.
+        """
         instance = self.get_object()
-        thumbnail_path_relative = instance.thumbnail.path 
-        thumbnail_path_absolute = os.path.join(settings.MEDIA_ROOT, thumbnail_path_relative)
-        print(f"DEBUG: ThumbnailStreamView - Checking for thumbnail at path: {thumbnail_path_absolute}") 
+        package = kwargs.get('package')
+        filename = kwargs.get('filename', TRICKPLAY_INDEX)
+
+        if not instance.trickplay_index:
+            return HttpResponseNotFound("No trickplay previews available for this video.")
+        trickplay_dir = os.path.dirname(os.path.join(settings.MEDIA_ROOT, instance.trickplay_index))
+        if package and package != os.path.basename(trickplay_dir):
+            return HttpResponseNotFound(f"Trickplay package '{package}' has been replaced.")
+        if not TRICKPLAY_FILENAME_PATTERN.match(filename):
+            return HttpResponseBadRequest(f"Invalid trickplay file name: '{filename}'")
+        file_path = os.path.join(trickplay_dir, filename)
+
+        if not os.path.exists(file_path):
+            return HttpResponseNotFound(f"Trickplay file not found: {filename}")
+
+        extension = os.path.splitext(filename)[1]
+        if extension == '.vtt':
+            return serve_signed_playlist(request, file_path, TRICKPLAY_CONTENT_TYPES[extension])
+        response = serve_media_file(request, file_path, TRICKPLAY_CONTENT_TYPES[extension])
+        if package:
+            response['Cache-Control'] = f'public, max-age={settings.VIDEO_HLS_CACHE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, no-cache'
+        return response
 
-        if not os.path.exists(thumbnail_path_absolute):
-            return HttpResponseNotFound(f"Thumbnail not found at: {thumbnail_path_absolute}")
 
-        try:
-            with open(thumbnail_path_absolute, 'rb') as f:
-                return HttpResponse(f.read(), content_type="image/jpeg") 
-        except IOError:
-            return HttpResponseNotFound("Could not read thumbnail file")
\ No newline at end of file
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+}
+HLS_FILENAME_PATTERN = re.compile(r'^[\w-]+\.(m3u8|m4s|mp4)$')
+
+
+class HLSStreamView(generics.RetrieveAPIView):
+    """
+    API view to serve the HLS package of a video.
+
+    Serves the master playlist when no resolution is given, otherwise the
+    media playlist, init segment or media segments of that resolution.
+    Files are addressed by the version of their package (see
+    videos.transcoding.get_package_dir), so segments of the current
+    package are immutable and cached for settings.VIDEO_HLS_CACHE_MAX_AGE,
+    while files of a replaced package are gone. Unversioned URLs of packages
+    written before versioning are revalidated on every request.
+
+    Like VideoStreamView, requests must carry a signed URL. The master
+    playlist URL issued by SignedMediaURLView is signed for the whole
+    package, and every served playlist passes its signature on to the
+    playlists and segments it references.
+    """
+    queryset = Video.objects.all()
+    serializer_class = VideoSerializer
+    authentication_classes = []
+    permission_classes = [HasValidMediaSignature]
+    signed_resolution = HLS_RESOLUTION
+    lookup_field = 'pk'
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Handles HLS playlist and segment requests.
+
+        Resolves the requested file inside the video's current HLS package and
+        returns it, sent by Django or the reverse proxy. Playlists carry the
+        request's signature and are revalidated; segments of a versioned URL
+        are cached as immutable.
+        """
+        instance = self.get_object()
+        resolution_name = kwargs.get('resolution')
+        package = kwargs.get('package')
+        filename = kwargs.get('filename', HLS_MASTER_PLAYLIST)
+
+        if not instance.hls_playlist:
+            return HttpResponseNotFound("No HLS package available for this video.")
+        hls_dir = os.path.dirname(os.path.join(settings.MEDIA_ROOT, instance.hls_playlist))
+        if package and package != os.path.basename(hls_dir):
+            return HttpResponseNotFound(f"HLS package '{package}' has been replaced.")
+
+        if resolution_name:
+            resolutions = instance.resolutions
+            if not resolutions or resolution_name not in resolutions:
+                return HttpResponseBadRequest(
+                    f"Invalid resolution: '{resolution_name}'. Available resolutions: {list(resolutions.keys()) if resolutions else []}")
+            if not HLS_FILENAME_PATTERN.match(filename):
+                return HttpResponseBadRequest(f"Invalid HLS file name: '{filename}'")
+            file_path = os.path.join(hls_dir, resolution_name, filename)
+        else:
+            file_path = os.path.join(hls_dir, HLS_MASTER_PLAYLIST)
+
+        if not os.path.exists(file_path):
+            return HttpResponseNotFound(f"HLS file not found: {filename}")
+
+        extension = os.path.splitext(filename)[1]
+        if extension == '.m3u8':
+            return serve_signed_playlist(request, file_path, HLS_CONTENT_TYPES[extension])
+        response = serve_media_file(request, file_path, HLS_CONTENT_TYPES[extension])
+        if package:
+            response['Cache-Control'] = f'public, max-age={settings.VIDEO_HLS_CACHE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, no-cache'
+        return response